@@ -5,7 +5,7 @@ Chart Generation Agent - Core Utility Functions
 - 统一的 API 客户端管理（支持 OpenAI、Qwen、GLM、DeepSeek、Kimi）
 - 数据加载与预处理
 - 多模态图像调用
-- 代码执行与格式化
+- 代码执行与格式化（执行前静态检查 + 定向修复）
 - Jupyter Notebook 美化输出
 
 Design Philosophy:
@@ -17,11 +17,16 @@ Design Philosophy:
 # === Standard Library ===
 import os
 import re
+import ast
 import json
+import difflib
 import base64
+import hashlib
 import mimetypes
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Tuple, Optional
+from typing import Any, Dict, Iterable, List, Tuple, Optional
 
 # === Third-Party ===
 import pandas as pd
@@ -52,13 +57,20 @@ zhipu_base_url = os.getenv("ZHIPU_BASE_URL", "https://open.bigmodel.cn/api/paas/
 deepseek_base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
 moonshot_base_url = os.getenv("MOONSHOT_BASE_URL", "https://api.moonshot.cn/v1")
 
+# 重试与超时：429 / 5xx / 超时由 SDK 自动重试（指数退避 + 抖动，遵循 Retry-After）
+# 与 agent_refactor/core 使用同一组环境变量；本目录是独立的单文件项目，不提供 hedging
+_client_options = {
+    "max_retries": int(os.getenv("LLM_MAX_RETRIES", 3)),
+    "timeout": float(os.getenv("LLM_TIMEOUT", 60)),
+}
+
 # 客户端初始化（容错设计：缺失 Key 时返回 None）
-openai_client = OpenAI(api_key=openai_api_key) if openai_api_key else None
-anthropic_client = Anthropic(api_key=anthropic_api_key) if anthropic_api_key else None
-qwen_client = OpenAI(api_key=qwen_api_key, base_url=qwen_base_url) if qwen_api_key else None
-zhipu_client = OpenAI(api_key=zhipu_api_key, base_url=zhipu_base_url) if zhipu_api_key else None
-deepseek_client = OpenAI(api_key=deepseek_api_key, base_url=deepseek_base_url) if deepseek_api_key else None
-kimi_client = OpenAI(api_key=moonshot_api_key, base_url=moonshot_base_url) if moonshot_api_key else None
+openai_client = OpenAI(api_key=openai_api_key, **_client_options) if openai_api_key else None
+anthropic_client = Anthropic(api_key=anthropic_api_key, **_client_options) if anthropic_api_key else None
+qwen_client = OpenAI(api_key=qwen_api_key, base_url=qwen_base_url, **_client_options) if qwen_api_key else None
+zhipu_client = OpenAI(api_key=zhipu_api_key, base_url=zhipu_base_url, **_client_options) if zhipu_api_key else None
+deepseek_client = OpenAI(api_key=deepseek_api_key, base_url=deepseek_base_url, **_client_options) if deepseek_api_key else None
+kimi_client = OpenAI(api_key=moonshot_api_key, base_url=moonshot_base_url, **_client_options) if moonshot_api_key else None
 
 
 # ============================================================================
@@ -152,9 +164,57 @@ def encode_image_b64(path: str) -> Tuple[str, str]:
     """
     mime, _ = mimetypes.guess_type(path)
     media_type = mime or "image/png"
+    return media_type, image_to_base64(path)
+
+
+# 图像编码缓存：同一张图在反思调用、print_html 与对比展示中只读取并编码一次
+# - 按 (绝对路径, mtime, 文件大小) 命中，文件被重写后自动失效
+# - 按内容 SHA-256 去重，相同字节的不同路径共享一份
+# - 只保存 Base64 字符串（调用方只需要它），原始字节读完即丢弃
+# - LRU 淘汰，Base64 总长度上限由 LLM_BLOB_CACHE_MB 控制（默认 64MB）
+_IMAGE_CACHE_MAX_BYTES = int(float(os.getenv("LLM_BLOB_CACHE_MB", 64)) * 1024 * 1024)
+_image_blobs: "OrderedDict[str, str]" = OrderedDict()  # digest -> b64
+_image_digests: Dict[Tuple[str, int, int], str] = {}                 # (path, mtime, size) -> digest
+_image_cache_bytes = 0
+_image_cache_lock = threading.Lock()
+
+
+def image_to_base64(path: str) -> str:
+    """
+    读取图片并返回 Base64 字符串（带进程级内容寻址缓存）
+    
+    Args:
+        path: 图片文件路径
+    
+    Returns:
+        base64_string
+    """
+    global _image_cache_bytes
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    with _image_cache_lock:
+        digest = _image_digests.get(key)
+        if digest in _image_blobs:
+            _image_blobs.move_to_end(digest)
+            return _image_blobs[digest]
+    
     with open(path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
-    return media_type, b64
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    with _image_cache_lock:
+        if digest not in _image_blobs:
+            b64 = base64.b64encode(raw).decode("utf-8")
+            _image_blobs[digest] = b64
+            _image_cache_bytes += len(b64)
+        _image_blobs.move_to_end(digest)
+        _image_digests[key] = digest
+        # LRU 淘汰（至少保留当前这一张）
+        while _image_cache_bytes > _IMAGE_CACHE_MAX_BYTES and len(_image_blobs) > 1:
+            old_digest, old_b64 = _image_blobs.popitem(last=False)
+            _image_cache_bytes -= len(old_b64)
+            for stale in [k for k, d in _image_digests.items() if d == old_digest]:
+                del _image_digests[stale]
+        return _image_blobs[digest]
 
 
 def image_anthropic_call(model_name: str, prompt: str, media_type: str, b64: str) -> str:
@@ -333,6 +393,164 @@ def extract_code_from_tags(text: str) -> Optional[str]:
     return None
 
 
+# 禁止的调用 -> 原因 (点号全名；import 别名会先解析，如 p.show -> matplotlib.pyplot.show)
+FORBIDDEN_CALLS = {
+    "plt.show": "plt.show() blocks headless runs; save the figure and call plt.close()",
+    "matplotlib.pyplot.show": "plt.show() blocks headless runs; save the figure and call plt.close()",
+    "open": "file access is not allowed; use the existing df",
+    "input": "interactive input is not available",
+    "eval": "dynamic code execution is not allowed",
+    "exec": "dynamic code execution is not allowed",
+    "__import__": "dynamic imports are not allowed",
+}
+_FORBIDDEN_MODULES = ("os", "subprocess", "shutil", "sys")
+# 绘图代码常用的安全系统调用：创建输出目录、拼接路径
+_ALLOWED_CALLS = ("os.makedirs", "os.getcwd")
+_ALLOWED_PREFIXES = ("os.path.",)
+_FILE_READERS = ("read_text", "read_bytes", "loadtxt", "genfromtxt", "fromfile", "imread")
+
+
+def _dotted_name(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Call):
+        # 链式调用：pathlib.Path('d.csv').read_text -> "pathlib.Path().read_text"
+        base = _dotted_name(node.func)
+        return f"{base}()" if base else None
+    if isinstance(node, ast.Attribute):
+        base = _dotted_name(node.value)
+        return f"{base}.{node.attr}" if base else None
+    return None
+
+
+def _string_keys(node: ast.AST) -> List[str]:
+    # df['a'] / df[['a', 'b']]；其他写法 (切片、布尔索引、变量) 不检查
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [e.value for e in node.elts if isinstance(e, ast.Constant) and isinstance(e.value, str)]
+    return []
+
+
+def _forbidden_reason(name: str) -> Optional[str]:
+    if name in FORBIDDEN_CALLS:
+        return FORBIDDEN_CALLS[name]
+    last = name.rsplit(".", 1)[-1]
+    if last == "open":
+        # io.open / codecs.open / Path(...).open
+        return FORBIDDEN_CALLS["open"]
+    if last.startswith("read_") or last in _FILE_READERS:
+        return "reads a file; df already exists"
+    if name in _ALLOWED_CALLS or name.startswith(_ALLOWED_PREFIXES):
+        return None
+    if "." in name and name.split(".", 1)[0] in _FORBIDDEN_MODULES:
+        return "system / file operations are not allowed"
+    return None
+
+
+def columns_from_schema(schema_text: str) -> List[str]:
+    """
+    从 make_schema_text 的输出 ("- col: dtype" 每行一个) 中取回列名
+    """
+    return [line[2:].rsplit(":", 1)[0] for line in schema_text.splitlines() if line.startswith("- ")]
+
+
+def validate_chart_code(code: Optional[str], columns: Iterable[str], out_path: Optional[str] = None) -> List[str]:
+    """
+    执行前对生成的绘图代码做静态检查 (只解析 AST，不运行任何代码)
+    
+    检查项：
+    1. 语法：ast.parse 能否通过
+    2. 列名：df['col'] / df[['a', 'b']] / df.col 是否在数据中 (代码里新建的列也算；
+       df 被重新赋值之后的引用不再检查)
+    3. 禁止调用：plt.show、open / io.open / pd.read_* / Path(...).read_text 等文件读取、os / subprocess 等系统调用
+       (os.makedirs、os.getcwd、os.path.* 除外)
+    4. 保存路径：savefig 的目标是否为 out_path (out_path 为 None 时跳过)
+    
+    Args:
+        code: 提取出的 Python 代码
+        columns: df 的列名 (df.columns 或 columns_from_schema(schema_text))
+        out_path: 期望的图片保存路径
+    
+    Returns:
+        问题列表 ("kind (line N): detail")，为空表示通过
+    """
+    if not code or not code.strip():
+        return ["no_code: the reply contains no code"]
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [f"syntax_error (line {e.lineno}): {e.msg}"]
+    
+    columns = [str(c) for c in columns]
+    issues: List[Tuple[int, str]] = []
+    
+    # import 别名：import matplotlib.pyplot as p -> p.show 视为 matplotlib.pyplot.show
+    aliases = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            aliases.update({a.asname: a.name for a in node.names if a.asname})
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            aliases.update({a.asname or a.name: f"{node.module}.{a.name}" for a in node.names})
+    
+    # df 被重新赋值 (groupby / pivot 结果等) 后列集合会变，只检查此前的引用
+    rebound_at = min(
+        (node.lineno for node in ast.walk(tree)
+         if isinstance(node, ast.Name) and node.id == "df" and isinstance(node.ctx, ast.Store)),
+        default=float("inf"),
+    )
+    created, references, saves, constants = set(), [], [], {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == "df":
+            keys = _string_keys(node.slice)
+            if isinstance(node.ctx, ast.Store):
+                created.update(keys)
+            else:
+                references.extend((node.lineno, key, f"df[{key!r}]") for key in keys)
+        elif (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "df"
+              and isinstance(node.ctx, ast.Load) and not hasattr(pd.DataFrame, node.attr)):
+            references.append((node.lineno, node.attr, f"df.{node.attr}"))
+        elif isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name) \
+                and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            constants[node.targets[0].id] = node.value.value
+        elif isinstance(node, ast.Call):
+            name = _dotted_name(node.func)
+            if name is None:
+                continue
+            head, _, rest = name.partition(".")
+            resolved = f"{aliases[head]}.{rest}".rstrip(".") if head in aliases else name
+            if name == "df.assign":
+                created.update(kw.arg for kw in node.keywords if kw.arg)
+            reason = _forbidden_reason(name) or _forbidden_reason(resolved)
+            if reason:
+                issues.append((node.lineno, f"forbidden_call (line {node.lineno}): {name}() - {reason}"))
+            if name.rsplit(".", 1)[-1] == "savefig":
+                saves.append(node)
+    
+    known = set(columns) | created
+    for lineno, key, ref in sorted(references):
+        if key in known or lineno >= rebound_at:
+            continue
+        match = difflib.get_close_matches(key, columns, n=1)
+        hint = f" (did you mean {match[0]!r}?)" if match else ""
+        issues.append((lineno, f"unknown_column (line {lineno}): {ref} is not a column of df{hint}"))
+    
+    if out_path is not None:
+        if not saves:
+            issues.append((0, f"missing_savefig: the figure is never saved to '{out_path}'"))
+        for call in saves:
+            target = call.args[0] if call.args else next((kw.value for kw in call.keywords if kw.arg == "fname"), None)
+            if isinstance(target, ast.Name):
+                target = constants.get(target.id)
+            elif isinstance(target, ast.Constant):
+                target = target.value
+            # f-string 等无法静态求值的目标放行，交给执行后的文件存在性检查
+            if isinstance(target, str) and os.path.normpath(target) != os.path.normpath(out_path):
+                issues.append((call.lineno, f"wrong_savefig_target (line {call.lineno}): "
+                                            f"saves to '{target}' instead of '{out_path}'"))
+    return [issue for _, issue in sorted(issues)]
+
+
 # ============================================================================
 # 6. Jupyter Notebook 美化输出（简易沙盒 UI）
 # ============================================================================
@@ -359,10 +577,6 @@ def print_html(content: Any, title: Optional[str] = None, is_image: bool = False
         >>> print_html("chart_v1.png", title="📊 Chart V1", is_image=True)
         >>> print_html(df.head(), title="📋 Data Preview")
     """
-    def image_to_base64(image_path: str) -> str:
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode("utf-8")
-    
     # 渲染内容
     if is_image and isinstance(content, str):
         b64 = image_to_base64(content)
@@ -599,6 +813,72 @@ Instruction:
     return feedback, refined_code
 
 
+CODE_REPAIR_PROMPT_TEMPLATE = """Static checks rejected the chart code below before it was run.
+
+Code:
+{code}
+
+Problems found:
+{issues}
+
+Fix ONLY these problems and keep everything else unchanged.
+- Use only the columns listed below; df already exists, do not read from files.
+- Save to '{out_path}' with dpi=300, call plt.close() at the end, never plt.show().
+- Include all necessary import statements.
+
+Schema (columns available in df):
+{schema_text}
+
+Return ONLY the fixed code wrapped in <execute_python> tags.
+"""
+
+
+def ensure_valid_chart_code(
+    code: Optional[str],
+    df: pd.DataFrame,
+    out_path: str,
+    schema_text: str,
+    model: str,
+    max_repairs: int = 2,
+    verbose: bool = False
+) -> Tuple[Optional[str], List[str]]:
+    """
+    静态检查代码；不通过时直接发定向修复提示词，而不是先执行注定失败的代码
+    
+    Args:
+        code: 待检查的代码
+        df: 数据 (用于列名检查)
+        out_path: 期望的图片保存路径
+        schema_text: 数据 Schema (写进修复提示词)
+        model: 修复用的模型
+        max_repairs: 最多修复轮数
+        verbose: 是否打印检查结果
+    
+    Returns:
+        (code, issues) 元组，issues 为空表示已通过检查
+    """
+    issues = validate_chart_code(code, df.columns, out_path)
+    for attempt in range(1, max_repairs + 1):
+        if not issues:
+            break
+        if verbose:
+            print(f"   🔧 静态检查未通过，定向修复 ({attempt}/{max_repairs}):")
+            for issue in issues:
+                print(f"      - {issue}")
+        prompt = CODE_REPAIR_PROMPT_TEMPLATE.format(
+            code=code or "",
+            issues="\n".join(f"- {issue}" for issue in issues),
+            out_path=out_path,
+            schema_text=schema_text
+        )
+        repaired = extract_code_from_tags(ensure_execute_python_tags(get_response(model, prompt)))
+        if not repaired:
+            break
+        code = repaired
+        issues = validate_chart_code(code, df.columns, out_path)
+    return code, issues
+
+
 def run_workflow(
     dataset_path: str,
     user_instruction: str,
@@ -616,6 +896,7 @@ def run_workflow(
     3. 执行代码生成图表 V1
     4. 使用多模态模型反思图表质量
     5. 根据反馈生成改进代码 (V2)
+    (每份代码执行前先做静态检查，不通过时直接定向修复)
     6. 执行改进代码生成图表 V2
     
     Args:
@@ -672,6 +953,16 @@ def run_workflow(
             result["errors"] = errors
             return result
         
+        # 执行前静态检查：不通过直接定向修复，不执行注定失败的代码
+        code_v1, issues = ensure_valid_chart_code(
+            code_v1, df, out_path_v1, schema_text, generation_model, verbose=verbose
+        )
+        result["code_v1"] = code_v1
+        if issues:
+            errors.append("代码 V1 未通过静态检查: " + "; ".join(issues))
+            result["errors"] = errors
+            return result
+        
         if verbose:
             print("   ✅ 代码生成成功")
             print_html(code_v1, title="📝 生成的代码 (V1)")
@@ -704,8 +995,13 @@ def run_workflow(
                 reflection_model, out_path_v2, code_v1
             )
             result["feedback"] = feedback
-            result["code_v2"] = code_v2
             result["chart_v2"] = out_path_v2
+            code_v2, issues = ensure_valid_chart_code(
+                code_v2, df, out_path_v2, schema_text, generation_model, verbose=verbose
+            )
+            result["code_v2"] = code_v2
+            if issues:
+                raise ValueError("代码 V2 未通过静态检查: " + "; ".join(issues))
             
             if verbose:
                 print("   ✅ 反思完成")
@@ -745,13 +1041,7 @@ def run_workflow(
             print("="*60)
             # 对比展示
             if Path(out_path_v1).exists() and Path(out_path_v2).exists():
-                from IPython.display import HTML, display
-                import base64
-                
-                def image_to_base64(path):
-                    with open(path, "rb") as f:
-                        return base64.b64encode(f.read()).decode()
-                
+                # 复用模块级缓存：反思阶段已编码过的图片不再重复读取
                 b64_v1 = image_to_base64(out_path_v1)
                 b64_v2 = image_to_base64(out_path_v2)
                 
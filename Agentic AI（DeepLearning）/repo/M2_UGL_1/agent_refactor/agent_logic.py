@@ -4,27 +4,35 @@ Chart Generation Agent Logic
 This module contains the business logic for the Chart Generation Agent, including:
 1. System Prompts
 2. Data Processing Tools
-3. Code Generation & Reflection Logic
+3. Static Code Checks (before exec)
+4. Code Generation, Repair & Reflection Logic
 """
 
-import json
+import os
+import ast
+import difflib
 import pandas as pd
 import matplotlib.pyplot as plt
-from typing import Tuple, Optional, Any
+from typing import Tuple, Optional, Any, Iterable, List
 from core import (
     get_response, 
+    stream_response,
     image_anthropic_call, 
     image_openai_call, 
-    encode_image_b64,
+    prepare_image,
     ensure_execute_python_tags,
-    extract_code_from_tags
+    extract_code_from_tags,
+    extract_code_from_stream,
+    find_json
 )
 
 # ============================================================================
 # 1. System Prompts
 # ============================================================================
 
-GENERATOR_PROMPT_TEMPLATE = """You are a data visualization expert.
+# Stable part of the generator prompt, sent as the system prompt so providers can
+# serve it from their prompt-prefix cache on repeated calls
+GENERATOR_SYSTEM_PROMPT = """You are a data visualization expert.
 
 Return your answer *strictly* in this format:
 
@@ -34,16 +42,11 @@ Return your answer *strictly* in this format:
 
 Do not add explanations, only the tags and the code.
 
-The code should create a visualization from a DataFrame 'df' with these columns:
-{schema_text}
-
-User instruction: {instruction}
-
 Requirements for the code:
 1. Assume the DataFrame is already loaded as 'df'.
 2. Use matplotlib for plotting.
 3. Add clear title, axis labels, and legend if needed.
-4. Save the figure as '{out_path}' with dpi=300.
+4. Save the figure to the output path given by the user with dpi=300.
 5. Do not call plt.show().
 6. Close all plots with plt.close().
 7. Add all necessary import python statements
@@ -51,6 +54,14 @@ Requirements for the code:
 Return ONLY the code wrapped in <execute_python> tags.
 """
 
+GENERATOR_PROMPT_TEMPLATE = """The code should create a visualization from a DataFrame 'df' with these columns:
+{schema_text}
+
+User instruction: {instruction}
+
+Output path: '{out_path}'
+"""
+
 REFLECTOR_PROMPT_TEMPLATE = """You are a data visualization expert.
 Your task: critique the attached chart and the original code against the given instruction,
 then return improved matplotlib code.
@@ -84,6 +95,25 @@ Instruction:
 {instruction}
 """
 
+CODE_REPAIR_PROMPT_TEMPLATE = """Static checks rejected the chart code below before it was run.
+
+Code:
+{code}
+
+Problems found:
+{issues}
+
+Fix ONLY these problems and keep everything else unchanged.
+- Use only the columns listed below; df already exists, do not read from files.
+- Save to '{out_path}' with dpi=300, call plt.close() at the end, never plt.show().
+- Include all necessary import statements.
+
+Schema (columns available in df):
+{schema_text}
+
+Return ONLY the fixed code wrapped in <execute_python> tags.
+"""
+
 # ============================================================================
 # 2. Data Tools
 # ============================================================================
@@ -111,7 +141,179 @@ def make_schema_text(df: pd.DataFrame) -> str:
     return "\n".join(f"- {c}: {dt}" for c, dt in df.dtypes.items())
 
 # ============================================================================
-# 3. Agent Logic Functions
+# 3. Static Code Checks
+# ============================================================================
+
+# 禁止的调用 -> 原因 (点号全名；import 别名会先解析，如 p.show -> matplotlib.pyplot.show)
+FORBIDDEN_CALLS = {
+    "plt.show": "plt.show() blocks headless runs; save the figure and call plt.close()",
+    "matplotlib.pyplot.show": "plt.show() blocks headless runs; save the figure and call plt.close()",
+    "open": "file access is not allowed; use the existing df",
+    "input": "interactive input is not available",
+    "eval": "dynamic code execution is not allowed",
+    "exec": "dynamic code execution is not allowed",
+    "__import__": "dynamic imports are not allowed",
+}
+_FORBIDDEN_MODULES = ("os", "subprocess", "shutil", "sys")
+# 绘图代码常用的安全系统调用：创建输出目录、拼接路径
+_ALLOWED_CALLS = ("os.makedirs", "os.getcwd")
+_ALLOWED_PREFIXES = ("os.path.",)
+_FILE_READERS = ("read_text", "read_bytes", "loadtxt", "genfromtxt", "fromfile", "imread")
+
+
+class ChartCodeError(ValueError):
+    """
+    execute_chart_code 拒绝执行未通过静态检查的代码
+    """
+
+    def __init__(self, issues: List[str]):
+        super().__init__("Chart code failed static checks:\n" + "\n".join(f"- {i}" for i in issues))
+        self.issues = issues
+
+
+def _dotted_name(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Call):
+        # 链式调用：pathlib.Path('d.csv').read_text -> "pathlib.Path().read_text"
+        base = _dotted_name(node.func)
+        return f"{base}()" if base else None
+    if isinstance(node, ast.Attribute):
+        base = _dotted_name(node.value)
+        return f"{base}.{node.attr}" if base else None
+    return None
+
+
+def _string_keys(node: ast.AST) -> List[str]:
+    # df['a'] / df[['a', 'b']]；其他写法 (切片、布尔索引、变量) 不检查
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [e.value for e in node.elts if isinstance(e, ast.Constant) and isinstance(e.value, str)]
+    return []
+
+
+def _forbidden_reason(name: str) -> Optional[str]:
+    if name in FORBIDDEN_CALLS:
+        return FORBIDDEN_CALLS[name]
+    last = name.rsplit(".", 1)[-1]
+    if last == "open":
+        # io.open / codecs.open / Path(...).open
+        return FORBIDDEN_CALLS["open"]
+    if last.startswith("read_") or last in _FILE_READERS:
+        return "reads a file; df already exists"
+    if name in _ALLOWED_CALLS or name.startswith(_ALLOWED_PREFIXES):
+        return None
+    if "." in name and name.split(".", 1)[0] in _FORBIDDEN_MODULES:
+        return "system / file operations are not allowed"
+    return None
+
+
+def columns_from_schema(schema_text: str) -> List[str]:
+    """
+    从 make_schema_text 的输出 ("- col: dtype" 每行一个) 中取回列名
+    """
+    return [line[2:].rsplit(":", 1)[0] for line in schema_text.splitlines() if line.startswith("- ")]
+
+
+def validate_chart_code(code: Optional[str], columns: Iterable[str], out_path: Optional[str] = None) -> List[str]:
+    """
+    执行前对生成的绘图代码做静态检查 (只解析 AST，不运行任何代码)
+    
+    检查项：
+    1. 语法：ast.parse 能否通过
+    2. 列名：df['col'] / df[['a', 'b']] / df.col 是否在数据中 (代码里新建的列也算；
+       df 被重新赋值之后的引用不再检查)
+    3. 禁止调用：plt.show、open / io.open / pd.read_* / Path(...).read_text 等文件读取、os / subprocess 等系统调用
+       (os.makedirs、os.getcwd、os.path.* 除外)
+    4. 保存路径：savefig 的目标是否为 out_path (out_path 为 None 时跳过)
+    
+    Args:
+        code: 提取出的 Python 代码
+        columns: df 的列名 (df.columns 或 columns_from_schema(schema_text))
+        out_path: 期望的图片保存路径
+    
+    Returns:
+        问题列表 ("kind (line N): detail")，为空表示通过
+    """
+    if not code or not code.strip():
+        return ["no_code: the reply contains no code"]
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [f"syntax_error (line {e.lineno}): {e.msg}"]
+    
+    columns = [str(c) for c in columns]
+    issues: List[Tuple[int, str]] = []
+    
+    # import 别名：import matplotlib.pyplot as p -> p.show 视为 matplotlib.pyplot.show
+    aliases = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            aliases.update({a.asname: a.name for a in node.names if a.asname})
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            aliases.update({a.asname or a.name: f"{node.module}.{a.name}" for a in node.names})
+    
+    # df 被重新赋值 (groupby / pivot 结果等) 后列集合会变，只检查此前的引用
+    rebound_at = min(
+        (node.lineno for node in ast.walk(tree)
+         if isinstance(node, ast.Name) and node.id == "df" and isinstance(node.ctx, ast.Store)),
+        default=float("inf"),
+    )
+    created, references, saves, constants = set(), [], [], {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == "df":
+            keys = _string_keys(node.slice)
+            if isinstance(node.ctx, ast.Store):
+                created.update(keys)
+            else:
+                references.extend((node.lineno, key, f"df[{key!r}]") for key in keys)
+        elif (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "df"
+              and isinstance(node.ctx, ast.Load) and not hasattr(pd.DataFrame, node.attr)):
+            references.append((node.lineno, node.attr, f"df.{node.attr}"))
+        elif isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name) \
+                and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            constants[node.targets[0].id] = node.value.value
+        elif isinstance(node, ast.Call):
+            name = _dotted_name(node.func)
+            if name is None:
+                continue
+            head, _, rest = name.partition(".")
+            resolved = f"{aliases[head]}.{rest}".rstrip(".") if head in aliases else name
+            if name == "df.assign":
+                created.update(kw.arg for kw in node.keywords if kw.arg)
+            reason = _forbidden_reason(name) or _forbidden_reason(resolved)
+            if reason:
+                issues.append((node.lineno, f"forbidden_call (line {node.lineno}): {name}() - {reason}"))
+            if name.rsplit(".", 1)[-1] == "savefig":
+                saves.append(node)
+    
+    known = set(columns) | created
+    for lineno, key, ref in sorted(references):
+        if key in known or lineno >= rebound_at:
+            continue
+        match = difflib.get_close_matches(key, columns, n=1)
+        hint = f" (did you mean {match[0]!r}?)" if match else ""
+        issues.append((lineno, f"unknown_column (line {lineno}): {ref} is not a column of df{hint}"))
+    
+    if out_path is not None:
+        if not saves:
+            issues.append((0, f"missing_savefig: the figure is never saved to '{out_path}'"))
+        for call in saves:
+            target = call.args[0] if call.args else next((kw.value for kw in call.keywords if kw.arg == "fname"), None)
+            if isinstance(target, ast.Name):
+                target = constants.get(target.id)
+            elif isinstance(target, ast.Constant):
+                target = target.value
+            # f-string 等无法静态求值的目标放行，交给执行后的文件存在性检查
+            if isinstance(target, str) and os.path.normpath(target) != os.path.normpath(out_path):
+                issues.append((call.lineno, f"wrong_savefig_target (line {call.lineno}): "
+                                            f"saves to '{target}' instead of '{out_path}'"))
+    return [issue for _, issue in sorted(issues)]
+
+
+# ============================================================================
+# 4. Agent Logic Functions
 # ============================================================================
 
 def generate_chart_code(
@@ -119,10 +321,14 @@ def generate_chart_code(
     schema_text: str,
     model: str,
     out_path: str,
-    temperature: float = 0
+    temperature: float = 0,
+    stream: bool = False
 ) -> str:
     """
     生成初始图表代码
+    
+    stream=True 时以流式方式接收回复，</execute_python> 一到就关闭连接，
+    不再等待（也不再为）代码块后面的多余文字付费；返回值格式不变。
     """
     prompt = GENERATOR_PROMPT_TEMPLATE.format(
         schema_text=schema_text,
@@ -130,7 +336,15 @@ def generate_chart_code(
         out_path=out_path
     )
     
-    return get_response(model, prompt, temperature=temperature)
+    if stream:
+        result = extract_code_from_stream(
+            stream_response(model, prompt, temperature=temperature, system=GENERATOR_SYSTEM_PROMPT)
+        )
+        if result["code"] is None:
+            return result["text"]
+        return f"<execute_python>\n{result['code']}\n</execute_python>"
+    
+    return get_response(model, prompt, temperature=temperature, system=GENERATOR_SYSTEM_PROMPT)
 
 
 def reflect_on_image_and_regenerate(
@@ -139,13 +353,21 @@ def reflect_on_image_and_regenerate(
     schema_text: str,
     model_name: str,
     out_path_v2: str,
-    code_v1: str
+    code_v1: str,
+    verbose: bool = False
 ) -> Tuple[str, str]:
     """
     基于图片反思并重新生成代码
+    
+    上传前按反思模型的配置对图片预处理（缩放 / 调色板量化或 JPEG/WebP 重编码 / 去元数据），
+    可通过 core.configure_image_profile 或 LLM_IMAGE_* 环境变量调整质量与延迟的权衡。
     """
-    # 编码图片
-    media_type, b64 = encode_image_b64(chart_path)
+    # 预处理并编码图片
+    prepared = prepare_image(chart_path, model=model_name)
+    media_type, b64 = prepared.media_type, prepared.b64
+    if verbose:
+        print(f"🖼️ 图片预处理: {prepared.original_bytes / 1024:.0f} KB -> {prepared.prepared_bytes / 1024:.0f} KB "
+              f"(节省 {prepared.bytes_saved / 1024:.0f} KB, {prepared.elapsed_ms:.0f} ms)")
     
     # 构建 Prompt
     prompt = REFLECTOR_PROMPT_TEMPLATE.format(
@@ -161,26 +383,89 @@ def reflect_on_image_and_regenerate(
     else:
         response = image_openai_call(model_name, prompt, media_type, b64)
     
-    # 解析响应
-    lines = response.strip().split('\n', 1)
-    feedback_line = lines[0].strip()
-    
-    try:
-        feedback_json = json.loads(feedback_line)
+    # 解析响应：feedback JSON 不一定在第一行（模型常加前言或代码围栏），
+    # 用括号平衡扫描找到第一个 JSON 对象，代码取其后的部分
+    found = find_json(response, openers="{", expect=dict)
+    if found:
+        feedback_json, _, json_end = found
         feedback = feedback_json.get("feedback", "No feedback provided")
-    except:
-        feedback = feedback_line
+        remaining_text = response[json_end:]
+    else:
+        lines = response.strip().split('\n', 1)
+        feedback = lines[0].strip()
+        remaining_text = lines[1] if len(lines) > 1 else response
     
-    remaining_text = lines[1] if len(lines) > 1 else response
-    remaining_text = ensure_execute_python_tags(remaining_text)
-    refined_code = extract_code_from_tags(remaining_text)
+    refined_code = extract_code_from_tags(response) or extract_code_from_tags(
+        ensure_execute_python_tags(remaining_text)
+    )
     
     return feedback, refined_code
 
-def execute_chart_code(code: str, df: pd.DataFrame) -> None:
+def repair_chart_code(
+    code: str,
+    issues: List[str],
+    schema_text: str,
+    model: str,
+    out_path: str,
+    temperature: float = 0
+) -> Optional[str]:
+    """
+    把静态检查发现的问题交给模型做定向修复 (只改这些问题，不重新设计图表)
+    
+    Returns:
+        修复后的代码，未能提取到代码时返回 None
+    """
+    prompt = CODE_REPAIR_PROMPT_TEMPLATE.format(
+        code=code or "",
+        issues="\n".join(f"- {issue}" for issue in issues),
+        out_path=out_path,
+        schema_text=schema_text
+    )
+    response = get_response(model, prompt, temperature=temperature, system=GENERATOR_SYSTEM_PROMPT)
+    return extract_code_from_tags(response) or extract_code_from_tags(ensure_execute_python_tags(response))
+
+
+def ensure_valid_chart_code(
+    code: Optional[str],
+    df: pd.DataFrame,
+    out_path: str,
+    schema_text: str,
+    model: str,
+    max_repairs: int = 2,
+    verbose: bool = False
+) -> Tuple[Optional[str], List[str]]:
+    """
+    静态检查代码；不通过时直接发定向修复提示词，而不是先执行注定失败的代码
+    再进入一整轮反思。
+    
+    Returns:
+        (code, issues)：issues 为空表示代码已通过检查，可以交给 execute_chart_code
+    """
+    issues = validate_chart_code(code, df.columns, out_path)
+    for attempt in range(1, max_repairs + 1):
+        if not issues:
+            break
+        if verbose:
+            print(f"🔧 静态检查未通过，定向修复 ({attempt}/{max_repairs}):\n" + "\n".join(f"  - {i}" for i in issues))
+        repaired = repair_chart_code(code, issues, schema_text, model, out_path)
+        if not repaired:
+            break
+        code = repaired
+        issues = validate_chart_code(code, df.columns, out_path)
+    return code, issues
+
+
+def execute_chart_code(code: str, df: pd.DataFrame, out_path: Optional[str] = None) -> None:
     """
     安全执行绘图代码
+    
+    执行前先做静态检查 (validate_chart_code)，不通过时抛出 ChartCodeError 而不执行；
+    传入 out_path 时同时检查 savefig 的目标。
     """
+    issues = validate_chart_code(code, df.columns, out_path)
+    if issues:
+        raise ChartCodeError(issues)
+    
     # 提供必要的上下文
     exec_globals = {"df": df, "pd": pd, "plt": plt}
     exec(code, exec_globals)
@@ -1,10 +1,20 @@
 from .llm_client import (
     get_client_for_model,
     get_response,
+    stream_response,
     image_anthropic_call,
     image_openai_call,
     check_api_keys,
     encode_image_b64
 )
-from .ui_utils import print_html
-from .safe_parsing import ensure_execute_python_tags, extract_code_from_tags
+from .resilience import configure_retries, configure_hedging, hedge_stats
+from .ui_utils import print_html, use_ui_sink, set_ui_sink, get_ui_sink
+from .safe_parsing import (
+    ensure_execute_python_tags,
+    extract_code_from_tags,
+    extract_code_from_stream,
+    find_json,
+    extract_json,
+    extract_python_list,
+)
+from .image_prep import prepare_image, configure_image_profile
@@ -0,0 +1,172 @@
+"""
+Content-Addressed Image Blob Cache
+
+Charts and screenshots are sent to vision models and rendered in notebooks several
+times per workflow. This cache reads and base64-encodes each artifact once per process.
+
+It handles:
+1. Lookup by (path, mtime, size), so a rewritten file is picked up immediately
+2. Content addressing by SHA-256, so identical bytes under different paths share one entry
+3. Memory-bounded LRU eviction over raw + base64 bytes (LLM_BLOB_CACHE_MB, default 64)
+"""
+
+import os
+import base64
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+PathKey = Tuple[str, int, int]  # (absolute path, mtime_ns, size)
+
+
+class Blob:
+    """
+    Raw bytes of one artifact plus its (lazily computed) base64 form.
+    """
+
+    __slots__ = ("digest", "raw", "b64")
+
+    def __init__(self, digest: str, raw: bytes):
+        self.digest = digest
+        self.raw = raw
+        self.b64: Optional[str] = None
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.raw) + (len(self.b64) if self.b64 is not None else 0)
+
+
+class BlobCache:
+    """
+    Thread-safe LRU of Blob objects keyed by content digest.
+
+    Use the module-level `blob_cache` instance.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("LLM_BLOB_CACHE_MB", 64)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._blobs: "OrderedDict[str, Blob]" = OrderedDict()
+        self._by_path: Dict[PathKey, str] = {}
+        self._paths_of: Dict[str, Set[PathKey]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _path_key(path: str) -> PathKey:
+        st = os.stat(path)
+        return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+    def get(self, path: str) -> Blob:
+        """
+        Returns the Blob for an image file, reading it only on the first request.
+        """
+        key = self._path_key(path)
+        with self._lock:
+            digest = self._by_path.get(key)
+            blob = self._blobs.get(digest) if digest else None
+            if blob is not None:
+                self._blobs.move_to_end(digest)
+                self.hits += 1
+                return blob
+
+        with open(path, "rb") as f:
+            raw = f.read()
+        blob = self.put_bytes(raw)
+        with self._lock:
+            self.misses += 1
+            if blob.digest in self._blobs:
+                self._by_path[key] = blob.digest
+                self._paths_of.setdefault(blob.digest, set()).add(key)
+        return blob
+
+    def put_bytes(self, raw: bytes) -> Blob:
+        """
+        Adds in-memory bytes (e.g. a re-encoded image) and returns the shared Blob.
+        """
+        import hashlib
+
+        digest = hashlib.sha256(raw).hexdigest()
+        with self._lock:
+            blob = self._blobs.get(digest)
+            if blob is not None:
+                self._blobs.move_to_end(digest)
+                return blob
+            blob = self._blobs[digest] = Blob(digest, raw)
+            self._bytes += blob.nbytes
+            self._evict()
+            return blob
+
+    def lookup(self, digest: str) -> Optional[Blob]:
+        """
+        Returns the Blob with this content digest if it is still cached.
+        """
+        with self._lock:
+            blob = self._blobs.get(digest)
+            if blob is not None:
+                self._blobs.move_to_end(digest)
+                self.hits += 1
+            return blob
+
+    def b64(self, path: str) -> str:
+        """
+        Returns the base64 encoding of an image file (encoded once per content).
+        """
+        return self.encode(self.get(path))
+
+    def encode(self, blob: Blob) -> str:
+        if blob.b64 is None:
+            b64 = base64.b64encode(blob.raw).decode("utf-8")
+            with self._lock:
+                if blob.b64 is None:
+                    blob.b64 = b64
+                    if blob.digest in self._blobs:
+                        self._bytes += len(b64)
+                        self._evict(keep=blob.digest)
+        return blob.b64
+
+    # ------------------------------------------------------------------
+    # Eviction / introspection
+    # ------------------------------------------------------------------
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        # Called with the lock held; never evicts the entry being returned
+        while self._bytes > self.max_bytes and len(self._blobs) > 1:
+            digest, blob = next(iter(self._blobs.items()))
+            if digest == keep:
+                self._blobs.move_to_end(digest)
+                digest, blob = next(iter(self._blobs.items()))
+            del self._blobs[digest]
+            self._bytes -= blob.nbytes
+            for key in self._paths_of.pop(digest, ()):
+                self._by_path.pop(key, None)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._blobs),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._blobs.clear()
+            self._by_path.clear()
+            self._paths_of.clear()
+            self._bytes = 0
+
+
+blob_cache = BlobCache()
@@ -10,15 +10,22 @@ It handles:
 3. Transparent proxying based on model names
 4. Unified text generation interface
 5. Unified multimodal (image) interface
+6. Streaming text generation (text deltas; stop early by closing the generator)
+
+Every provider request goes through resilience.py: 429 / 5xx / timeouts are retried
+with exponential backoff + jitter (Retry-After wins), and configure_hedging() can
+duplicate a call that outlives the model's p95 latency. SDK-level retries are
+disabled so there is a single retry layer.
 """
 
 import os
 import base64
 import mimetypes
-from typing import Optional, Tuple
+from typing import Iterator, Optional, Tuple
 from dotenv import load_dotenv
 from openai import OpenAI
 from anthropic import Anthropic
+from .resilience import call_with_retry, resilient_call
 
 # ============================================================================
 # 1. Initialization & Configuration
@@ -40,13 +47,13 @@ zhipu_base_url = os.getenv("ZHIPU_BASE_URL", "https://open.bigmodel.cn/api/paas/
 deepseek_base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
 moonshot_base_url = os.getenv("MOONSHOT_BASE_URL", "https://api.moonshot.cn/v1")
 
-# Client Initialization (Fault Tolerant)
-openai_client = OpenAI(api_key=openai_api_key) if openai_api_key else None
-anthropic_client = Anthropic(api_key=anthropic_api_key) if anthropic_api_key else None
-qwen_client = OpenAI(api_key=qwen_api_key, base_url=qwen_base_url) if qwen_api_key else None
-zhipu_client = OpenAI(api_key=zhipu_api_key, base_url=zhipu_base_url) if zhipu_api_key else None
-deepseek_client = OpenAI(api_key=deepseek_api_key, base_url=deepseek_base_url) if deepseek_api_key else None
-kimi_client = OpenAI(api_key=moonshot_api_key, base_url=moonshot_base_url) if moonshot_api_key else None
+# Client Initialization (Fault Tolerant); retries are handled by resilience.py
+openai_client = OpenAI(api_key=openai_api_key, max_retries=0) if openai_api_key else None
+anthropic_client = Anthropic(api_key=anthropic_api_key, max_retries=0) if anthropic_api_key else None
+qwen_client = OpenAI(api_key=qwen_api_key, base_url=qwen_base_url, max_retries=0) if qwen_api_key else None
+zhipu_client = OpenAI(api_key=zhipu_api_key, base_url=zhipu_base_url, max_retries=0) if zhipu_api_key else None
+deepseek_client = OpenAI(api_key=deepseek_api_key, base_url=deepseek_base_url, max_retries=0) if deepseek_api_key else None
+kimi_client = OpenAI(api_key=moonshot_api_key, base_url=moonshot_base_url, max_retries=0) if moonshot_api_key else None
 
 
 # ============================================================================
@@ -100,7 +107,7 @@ def check_api_keys():
 # 3. Unified Text Generation
 # ============================================================================
 
-def get_response(model: str, prompt: str, temperature: float = 0) -> str:
+def get_response(model: str, prompt: str, temperature: float = 0, system: Optional[str] = None) -> str:
     """
     Unified interface for text generation across all providers.
     
@@ -108,6 +115,9 @@ def get_response(model: str, prompt: str, temperature: float = 0) -> str:
         model: Model name
         prompt: User prompt
         temperature: Temperature (0-1)
+        system: Stable instructions sent ahead of the prompt. Claude gets a
+            cache_control breakpoint on it; OpenAI-compatible vendors cache the
+            repeated prefix automatically
     
     Returns:
         Generated text content
@@ -117,12 +127,16 @@ def get_response(model: str, prompt: str, temperature: float = 0) -> str:
         if not anthropic_client:
             return f"Error: Anthropic client not initialized. Check ANTHROPIC_API_KEY."
         
-        message = anthropic_client.messages.create(
+        kwargs = {}
+        if system:
+            kwargs["system"] = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+        message = resilient_call(model, lambda: anthropic_client.messages.create(
             model=model,
             max_tokens=2000,
             temperature=temperature,
             messages=[{"role": "user", "content": [{"type": "text", "text": prompt}]}],
-        )
+            **kwargs
+        ))
         return message.content[0].text
     
     else:
@@ -131,14 +145,71 @@ def get_response(model: str, prompt: str, temperature: float = 0) -> str:
         if not client:
             return f"Error: Client for model '{model}' not initialized. Check API keys in .env file."
         
-        response = client.chat.completions.create(
+        messages = [{"role": "system", "content": system}] if system else []
+        response = resilient_call(model, lambda: client.chat.completions.create(
             model=model,
             temperature=temperature,
-            messages=[{"role": "user", "content": prompt}],
-        )
+            messages=messages + [{"role": "user", "content": prompt}],
+        ))
         return response.choices[0].message.content
 
 
+def stream_response(model: str, prompt: str, temperature: float = 0, system: Optional[str] = None) -> Iterator[str]:
+    """
+    Streams the reply as text deltas (same arguments as get_response).
+    
+    Closing the generator (e.g. breaking out of the loop, or
+    safe_parsing.extract_code_from_stream) closes the HTTP stream, so the
+    provider stops generating. Opening the stream is retried but never hedged
+    (a duplicate stream could not be closed).
+    
+    Yields:
+        Text deltas
+    """
+    if "claude" in model.lower() or "anthropic" in model.lower():
+        if not anthropic_client:
+            yield "Error: Anthropic client not initialized. Check ANTHROPIC_API_KEY."
+            return
+        
+        kwargs = {}
+        if system:
+            kwargs["system"] = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+        stream = call_with_retry(lambda: anthropic_client.messages.create(
+            model=model,
+            max_tokens=2000,
+            temperature=temperature,
+            messages=[{"role": "user", "content": [{"type": "text", "text": prompt}]}],
+            stream=True,
+            **kwargs
+        ))
+        try:
+            for event in stream:
+                if event.type == "content_block_delta" and getattr(event.delta, "text", None):
+                    yield event.delta.text
+        finally:
+            stream.close()
+    
+    else:
+        client = get_client_for_model(model)
+        if not client:
+            yield f"Error: Client for model '{model}' not initialized. Check API keys in .env file."
+            return
+        
+        messages = [{"role": "system", "content": system}] if system else []
+        stream = call_with_retry(lambda: client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=messages + [{"role": "user", "content": prompt}],
+            stream=True,
+        ))
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+
+
 # ============================================================================
 # 4. Unified Multimodal (Image) Generation
 # ============================================================================
@@ -167,7 +238,7 @@ def image_anthropic_call(model_name: str, prompt: str, media_type: str, b64: str
     if not anthropic_client:
         return "Error: Anthropic client not initialized."
     
-    msg = anthropic_client.messages.create(
+    msg = resilient_call(model_name, lambda: anthropic_client.messages.create(
         model=model_name,
         max_tokens=2000,
         temperature=0,
@@ -182,7 +253,7 @@ def image_anthropic_call(model_name: str, prompt: str, media_type: str, b64: str
                 {"type": "image", "source": {"type": "base64", "media_type": media_type, "data": b64}},
             ],
         }],
-    )
+    ))
     
     parts = []
     for block in (msg.content or []):
@@ -200,7 +271,7 @@ def image_openai_call(model_name: str, prompt: str, media_type: str, b64: str) -
         return f"Error: Client for model '{model_name}' not initialized."
     
     data_url = f"data:{media_type};base64,{b64}"
-    resp = client.chat.completions.create(
+    resp = resilient_call(model_name, lambda: client.chat.completions.create(
         model=model_name,
         messages=[
             {
@@ -211,6 +282,6 @@ def image_openai_call(model_name: str, prompt: str, media_type: str, b64: str) -
                 ],
             }
         ],
-    )
+    ))
     content = resp.choices[0].message.content
     return (content or "").strip()
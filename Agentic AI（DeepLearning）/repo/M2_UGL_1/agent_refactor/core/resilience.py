@@ -0,0 +1,397 @@
+"""
+Resilience Utilities for LLM Calls
+
+This module keeps a single slow or rate-limited provider call from stalling a whole
+agent episode.
+
+It handles:
+1. Retries with exponential backoff + jitter (honoring Retry-After headers)
+2. Per-model latency tracking (rolling window, percentile estimates)
+3. Hedged requests: once a call outlives the model's p95 latency, a duplicate is
+   fired and whichever answers first wins (async losers are cancelled)
+
+SDK exceptions are classified by status code / class name so that neither the
+openai nor the anthropic package has to be imported here.
+"""
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Network-level failures (no HTTP status) that are always worth retrying
+_RETRYABLE_ERROR_NAMES = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "ConnectError",
+    "ConnectTimeout",
+    "ReadTimeout",
+    "RemoteProtocolError",
+    "TimeoutError",
+    "ConnectionError",
+}
+
+
+# ============================================================================
+# 1. Retry Policy
+# ============================================================================
+
+@dataclass
+class RetryPolicy:
+    """
+    Exponential backoff configuration.
+
+    The delay before retry n (0-based) is drawn from
+    [backoff / 2, backoff] with backoff = min(max_delay, base_delay * 2**n),
+    unless the server sent Retry-After, which always wins (capped by max_retry_after).
+    """
+    max_retries: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+    max_retry_after: float = 60.0
+    retry_on_status: Tuple[int, ...] = (408, 409, 429, 500, 502, 503, 504, 529)
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", 3)),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5)),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", 20)),
+        )
+
+
+_retry_policy: Optional[RetryPolicy] = None
+
+
+def get_retry_policy() -> RetryPolicy:
+    """
+    Returns the process-wide retry policy (built from LLM_* env vars on first use).
+    """
+    global _retry_policy
+    if _retry_policy is None:
+        _retry_policy = RetryPolicy.from_env()
+    return _retry_policy
+
+
+def configure_retries(**kwargs: Any) -> RetryPolicy:
+    """
+    Updates the process-wide retry policy.
+
+    Examples:
+        >>> configure_retries(max_retries=5, base_delay=1.0)
+        >>> configure_retries(max_retries=0)  # disable retries
+    """
+    global _retry_policy
+    policy = get_retry_policy()
+    for key, value in kwargs.items():
+        if not hasattr(policy, key):
+            raise ValueError(f"Unknown retry option: {key}")
+        setattr(policy, key, value)
+    _retry_policy = policy
+    return policy
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(exc: BaseException, policy: Optional[RetryPolicy] = None) -> bool:
+    """
+    Returns True for rate limits, overloads, 5xx and connection/timeout errors.
+    """
+    policy = policy or get_retry_policy()
+    status = _status_code(exc)
+    if status is not None:
+        return status in policy.retry_on_status
+    return type(exc).__name__ in _RETRYABLE_ERROR_NAMES
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """
+    Extracts the server-requested wait from `retry-after-ms` / `retry-after` headers.
+    """
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        # HTTP-date form
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def compute_delay(attempt: int, exc: BaseException, policy: RetryPolicy) -> float:
+    """
+    Returns how long to sleep before retry number `attempt` (0-based).
+    """
+    retry_after = retry_after_seconds(exc)
+    if retry_after is not None:
+        return min(retry_after, policy.max_retry_after)
+    backoff = min(policy.max_delay, policy.base_delay * (2 ** attempt))
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+def call_with_retry(fn: Callable[[], T], policy: Optional[RetryPolicy] = None) -> T:
+    """
+    Calls fn(), retrying retryable failures according to the policy.
+    """
+    policy = policy or get_retry_policy()
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= policy.max_retries or not is_retryable(e, policy):
+                raise
+            time.sleep(compute_delay(attempt, e, policy))
+            attempt += 1
+
+
+async def acall_with_retry(fn: Callable[[], Awaitable[T]], policy: Optional[RetryPolicy] = None) -> T:
+    """
+    Async counterpart of call_with_retry (fn returns a fresh awaitable per attempt).
+    """
+    import asyncio
+
+    policy = policy or get_retry_policy()
+    attempt = 0
+    while True:
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt >= policy.max_retries or not is_retryable(e, policy):
+                raise
+            await asyncio.sleep(compute_delay(attempt, e, policy))
+            attempt += 1
+
+
+# ============================================================================
+# 2. Latency Tracking
+# ============================================================================
+
+class LatencyTracker:
+    """
+    Rolling window of recent successful call latencies per key (e.g. model name).
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, key: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """
+        Returns the q-th percentile (0-100) or None with fewer than min_samples samples.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+latency_tracker = LatencyTracker()
+
+
+# ============================================================================
+# 3. Hedged Requests
+# ============================================================================
+
+@dataclass
+class HedgingConfig:
+    enabled: bool = False
+    percentile: float = 95.0
+    min_samples: int = 20     # No hedging until the model has this much history
+    min_delay: float = 0.05   # Never hedge faster than this (seconds)
+
+
+hedging = HedgingConfig(enabled=os.getenv("LLM_HEDGING", "").lower() in ("1", "true", "yes"))
+
+# Counters for observability (updated under _hedge_stats_lock; callers on many threads hedge at once).
+# Sync hedging cannot stop the losing request: "hedge_abandoned" counts losers left running
+# in the background and "hedge_abandoned_running" how many of them have not finished yet
+hedge_stats = {"hedged": 0, "hedge_won": 0, "hedge_abandoned": 0, "hedge_abandoned_running": 0}
+_hedge_stats_lock = threading.Lock()
+
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
+
+def configure_hedging(**kwargs: Any) -> HedgingConfig:
+    """
+    Updates the hedging configuration.
+
+    Examples:
+        >>> configure_hedging(enabled=True, percentile=95, min_samples=20)
+    """
+    for key, value in kwargs.items():
+        if not hasattr(hedging, key):
+            raise ValueError(f"Unknown hedging option: {key}")
+        setattr(hedging, key, value)
+    return hedging
+
+
+def hedge_delay(key: str) -> Optional[float]:
+    """
+    Returns the hedging threshold for key, or None when hedging does not apply.
+    """
+    if not hedging.enabled:
+        return None
+    threshold = latency_tracker.percentile(key, hedging.percentile, hedging.min_samples)
+    if threshold is None:
+        return None
+    return max(hedging.min_delay, threshold)
+
+
+def _count_hedge(key: str, delta: int = 1) -> None:
+    with _hedge_stats_lock:
+        hedge_stats[key] += delta
+
+
+def _get_hedge_pool():
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+        return _hedge_pool
+
+
+def hedged_call(fn: Callable[[], T], delay: float) -> T:
+    """
+    Runs fn(); if it has not finished after `delay` seconds, runs a duplicate and
+    returns whichever succeeds first.
+
+    Blocking SDK calls cannot be interrupted, so a losing request that has already
+    started is abandoned (its result is discarded) rather than cancelled; it keeps
+    a hedge-pool thread and its provider request until it finishes. Such losers are
+    counted in hedge_stats["hedge_abandoned"] / ["hedge_abandoned_running"].
+    """
+    from concurrent.futures import FIRST_COMPLETED, wait
+
+    pool = _get_hedge_pool()
+    primary = pool.submit(fn)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    _count_hedge("hedged")
+    backup = pool.submit(fn)
+    pending = {primary, backup}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for loser in pending:
+                    if not loser.cancel():
+                        _count_hedge("hedge_abandoned")
+                        _count_hedge("hedge_abandoned_running")
+                        loser.add_done_callback(lambda _: _count_hedge("hedge_abandoned_running", -1))
+                if future is backup:
+                    _count_hedge("hedge_won")
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+async def ahedged_call(fn: Callable[[], Awaitable[T]], delay: float) -> T:
+    """
+    Async counterpart of hedged_call; the losing request is cancelled.
+    """
+    import asyncio
+
+    primary = asyncio.ensure_future(fn())
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        
+        _count_hedge("hedged")
+        backup = asyncio.ensure_future(fn())
+        tasks.add(backup)
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is backup:
+                        _count_hedge("hedge_won")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # Cancel whichever request lost (or everything, if we were cancelled ourselves)
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+# ============================================================================
+# 4. Combined Entry Points
+# ============================================================================
+
+def resilient_call(key: str, fn: Callable[[], T]) -> T:
+    """
+    Retry + (optional) hedging around a blocking provider call.
+
+    Args:
+        key: Latency bucket, usually the model name
+        fn: Zero-argument callable performing one provider request
+    """
+    def attempt() -> T:
+        delay = hedge_delay(key)
+        start = time.perf_counter()
+        result = hedged_call(fn, delay) if delay is not None else fn()
+        latency_tracker.record(key, time.perf_counter() - start)
+        return result
+
+    return call_with_retry(attempt)
+
+
+async def aresilient_call(key: str, fn: Callable[[], Awaitable[T]]) -> T:
+    """
+    Async counterpart of resilient_call.
+    """
+    async def attempt() -> T:
+        delay = hedge_delay(key)
+        start = time.perf_counter()
+        result = await (ahedged_call(fn, delay) if delay is not None else fn())
+        latency_tracker.record(key, time.perf_counter() - start)
+        return result
+
+    return await acall_with_retry(attempt)
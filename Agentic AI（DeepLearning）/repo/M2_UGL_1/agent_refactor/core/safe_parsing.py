@@ -3,10 +3,17 @@ Safe Parsing Utilities
 
 This module provides robust functions for parsing and cleaning LLM outputs.
 It handles common issues like Markdown code fences, missing tags, and JSON formatting.
+
+Every agent parser locates JSON objects / arrays and Python list literals with
+the same linear-time, string-aware BalancedScanner (see find_json,
+extract_json, extract_python_list), on finished replies or on streams.
 """
 
 import re
-from typing import Optional
+import json
+import itertools
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 def ensure_execute_python_tags(text: str) -> str:
     """
@@ -48,3 +55,714 @@ def extract_code_from_tags(text: str) -> Optional[str]:
     if match:
         return match.group(1).strip()
     return None
+
+
+# ============================================================================
+# Incremental (Streaming) Extraction
+# ============================================================================
+
+_OPEN_TAG = "<execute_python>"
+_CLOSE_TAG = "</execute_python>"
+_FENCE = "```"
+_CODE_FENCE_LANGS = ("", "python", "py", "python3")
+
+
+def _clean_block(body: str) -> str:
+    # A fence may wrap the tags or the tags may wrap a fence; unwrap both
+    if _OPEN_TAG in body:
+        body = body.split(_OPEN_TAG, 1)[1].split(_CLOSE_TAG, 1)[0]
+    return re.sub(r"^```(?:python)?\s*|\s*```$", "", body.strip(), flags=re.MULTILINE).strip()
+
+
+class CodeStreamExtractor:
+    """
+    Incremental counterpart of ensure_execute_python_tags + extract_code_from_tags.
+    
+    Feed it streamed text deltas; it finds the opening <execute_python> tag (or a
+    ```python fence), returns the code body as soon as the closing tag arrives and
+    flags prose that follows the block. Each delta is scanned once, with a small
+    overlap for tags split across deltas.
+    
+    Examples:
+        >>> extractor = CodeStreamExtractor()
+        >>> for delta in stream_response(model, prompt):
+        ...     if extractor.feed(delta.text) is not None:
+        ...         break                      # closes the HTTP stream
+        >>> code = extractor.finish()
+    """
+    
+    def __init__(self):
+        self.text = ""
+        self.code: Optional[str] = None
+        self.prose_after = False
+        self._state = "search"        # search -> skip_fence? -> tag | fence -> done
+        self._scan = 0
+        self._body_start = 0
+        self._block_end = 0
+    
+    @property
+    def done(self) -> bool:
+        """
+        True once a complete code block has been seen.
+        """
+        return self.code is not None
+    
+    def feed(self, delta: str) -> Optional[str]:
+        """
+        Consumes one delta. Returns the code the first time the block closes, else None.
+        """
+        self.text += delta
+        if self._state == "done":
+            self._check_prose()
+            return None
+        while self._step():
+            pass
+        if self._state == "done":
+            self._check_prose()
+            return self.code
+        return None
+    
+    def finish(self) -> Optional[str]:
+        """
+        Ends the stream. Falls back to whole-text parsing when no closed block was
+        seen (e.g. bare code without tags, or a truncated reply).
+        """
+        if self.code is None:
+            self.code = extract_code_from_tags(ensure_execute_python_tags(self.text))
+        return self.code
+    
+    def _step(self) -> bool:
+        # Advances the state machine once; False when more text is needed
+        text = self.text
+        if self._state == "search":
+            tag = text.find(_OPEN_TAG, self._scan)
+            fence = text.find(_FENCE, self._scan)
+            if tag == -1 and fence == -1:
+                self._scan = max(self._scan, len(text) - len(_OPEN_TAG) + 1)
+                return False
+            if tag != -1 and (fence == -1 or tag < fence):
+                self._state, self._body_start = "tag", tag + len(_OPEN_TAG)
+                self._scan = self._body_start
+                return True
+            if fence > 0 and text[fence - 1] != "\n":
+                # Inline backticks in prose, not a fence
+                self._scan = fence + len(_FENCE)
+                return True
+            newline = text.find("\n", fence)
+            if newline == -1:
+                self._scan = fence
+                return False
+            lang = text[fence + len(_FENCE):newline].strip().lower()
+            self._state = "fence" if lang in _CODE_FENCE_LANGS else "skip_fence"
+            self._body_start = self._scan = newline + 1
+            return True
+        
+        closing = _CLOSE_TAG if self._state == "tag" else _FENCE
+        end = text.find(closing, self._scan)
+        if end == -1:
+            self._scan = max(self._scan, len(text) - len(closing) + 1)
+            return False
+        if self._state == "skip_fence":
+            # A non-code fence (e.g. ```json feedback); keep looking after it
+            self._state, self._scan = "search", end + len(_FENCE)
+            return True
+        self.code = _clean_block(text[self._body_start:end])
+        self._state, self._block_end = "done", end + len(closing)
+        return False
+    
+    def _check_prose(self) -> None:
+        if not self.prose_after and self.text[self._block_end:].strip().strip("`").strip():
+            self.prose_after = True
+
+
+def extract_code_from_stream(deltas: Iterable[Any], stop_early: bool = True) -> Dict[str, Any]:
+    """
+    Reads code from a streamed reply, stopping as soon as the block is complete.
+    
+    Args:
+        deltas: Iterable of text chunks or StreamDelta objects (e.g. stream_response(...))
+        stop_early: Stop reading (and close the stream) once the closing tag arrives,
+            so trailing tokens are neither waited for nor generated
+    
+    Returns:
+        {"code", "text" (everything read), "stopped_early", "prose_after"}
+    """
+    extractor = CodeStreamExtractor()
+    stopped_early = False
+    for delta in deltas:
+        extractor.feed(getattr(delta, "text", delta))
+        if stop_early and extractor.done:
+            stopped_early = True
+            break
+    if stopped_early and hasattr(deltas, "close"):
+        deltas.close()
+    return {
+        "code": extractor.finish(),
+        "text": extractor.text,
+        "stopped_early": stopped_early,
+        "prose_after": extractor.prose_after,
+    }
+
+
+# ============================================================================
+# Balanced JSON / List Extraction
+# ============================================================================
+
+_CLOSERS = {"{": "}", "[": "]"}
+# Inside a candidate every bracket nests (a list of dicts, a dict of lists), but only
+# `openers` can start a top-level candidate
+_STRUCTURE_RE = {
+    quotes: re.compile("[{}\\[\\]" + re.escape(quotes) + "]") for quotes in ('"', "\"'")
+}
+_STRING_END_RE = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\\n]")}
+# A top-level candidate must look like the start of a value: `{'a': 1}` in code, or
+# `[note]` / `{ the answer` in prose, is stepped over instead of being nested into.
+# A top-level JSON object must start with a key (an empty `{}` is never the answer).
+# Only the match start is used, so patterns may consume; a one-character lookahead
+# first rejects most brackets in code and prose cheaply
+_VALUE_START = {
+    '"': {"{": r'\{\s*"', "[": r'\[(?=[-\d"{\[\]tfn\s])(?=\s*[-\d"{\[\]tfn])'},
+    "\"'": {"{": r"\{(?=[-+\d'\"{\[()}TFN\s])(?=\s*(?:[-+\d'\"{\[()}]|True|False|None))",
+            "[": r"\[(?=[-+\d'\"{\[\]()TFN\s])(?=\s*(?:[-+\d'\"{\[\]()]|True|False|None))"},
+}
+# Object-only JSON scans jump between double quotes instead (see BalancedScanner._next_opener);
+# after this many quotes that do not follow a `{`, the regex takes over
+_ANCHOR_TRIES = 64
+
+
+class BalancedScanner:
+    """
+    Single-pass, string-aware scanner for balanced {...} / [...] spans.
+    
+    Text is fed in one piece or as streamed deltas; every character is examined
+    at most once (regex jumps between structural characters), so the cost is
+    linear in the reply length. Scans for JSON objects only look at the double
+    quotes of the reply until a candidate is found (str.find, no per-bracket
+    work), so long code or prose full of brackets before the value costs little. Brackets inside string literals are ignored, brackets that
+    cannot start a value (`[note]`, `{'a': 1}` when scanning for JSON) and stray
+    closers are skipped, and spans completed inside a never-closed outer bracket are still
+    reported by leftovers() at the end of the input.
+    
+    Args:
+        openers: Characters that may start a top-level span ("{[", "{" or "[")
+        quotes: String delimiters ('"' for JSON, "\"'" for Python literals)
+    """
+    
+    def __init__(self, openers: str = "{[", quotes: str = '"'):
+        self.text = ""
+        self._open_re = re.compile("|".join(_VALUE_START[quotes][opener] for opener in openers))
+        self._openers = openers
+        self._anchored = openers == "{" and quotes == '"'
+        self._struct_re = _STRUCTURE_RE[quotes]
+        self._quotes = quotes
+        self._pos = 0
+        self._quote: Optional[str] = None
+        self._escape = False
+        # Open brackets: [closer, start, completed child spans]
+        self._stack: List[List[Any]] = []
+    
+    def feed(self, delta: str, first: bool = False) -> List[Tuple[int, int]]:
+        """
+        Consumes more text and returns the top-level spans (start, end) it completed.
+        
+        With first=True scanning pauses after the first completed span; feed("")
+        resumes from there, so callers that stop at the first valid value never
+        scan the rest of a long reply.
+        """
+        self.text += delta
+        text, pos, n = self.text, self._pos, len(self.text)
+        stack = self._stack
+        spans: List[Tuple[int, int]] = []
+        while pos < n:
+            if self._escape:
+                self._escape, pos = False, pos + 1
+                continue
+            if self._quote is not None:
+                m = _STRING_END_RE[self._quote].search(text, pos)
+                if m is None:
+                    pos = n
+                    break
+                ch, pos = m.group(), m.end()
+                if ch == "\\":
+                    self._escape = True
+                else:
+                    self._quote = None          # closing quote, or newline ending a '...' string
+                continue
+            if not stack:
+                start = self._next_opener(text, pos)
+                if start < 0:
+                    pos = self._pending_start(text, pos)
+                    break
+                stack.append([_CLOSERS[text[start]], start, []])
+                pos = start + 1
+                continue
+            m = self._struct_re.search(text, pos)
+            if m is None:
+                pos = n
+                break
+            ch, pos = m.group(), m.end()
+            if ch in self._quotes:
+                self._quote = ch
+            elif ch in _CLOSERS:
+                stack.append([_CLOSERS[ch], m.start(), []])
+            elif ch == stack[-1][0]:
+                _, start, _ = stack.pop()
+                if stack:
+                    stack[-1][2].append((start, pos))
+                else:
+                    spans.append((start, pos))
+                    if first:
+                        break
+            # else: a stray closer; skip it
+        self._pos = pos
+        return spans
+    
+    def _next_opener(self, text: str, pos: int) -> int:
+        """
+        Position of the next bracket at or after pos that can start a value, or -1.
+        """
+        if self._anchored:
+            # Every candidate is `{` + whitespace + `"`: find the quote (memchr-fast) and
+            # look back for the brace; quote-heavy text falls through to the regex
+            for _ in range(_ANCHOR_TRIES):
+                quote = text.find('"', pos)
+                if quote == -1:
+                    return -1
+                before = quote - 1
+                while before >= pos and text[before].isspace():
+                    before -= 1
+                if before >= pos and text[before] == "{":
+                    return before
+                pos = quote + 1
+        m = self._open_re.search(text, pos)
+        return m.start() if m else -1
+    
+    def _pending_start(self, text: str, pos: int) -> int:
+        # An opener followed only by whitespace at the end of a delta cannot be judged
+        # until more text arrives; scanning resumes there
+        end = len(text)
+        while end > pos and text[end - 1].isspace():
+            end -= 1
+        return end - 1 if end > pos and text[end - 1] in self._openers else len(text)
+    
+    def leftovers(self) -> List[Tuple[int, int]]:
+        """
+        Complete spans nested in brackets that never closed (call at end of input).
+        """
+        return sorted(span for frame in self._stack for span in frame[2])
+
+
+def _first_value(text: str, spans: Iterable[Tuple[int, int]], parse: Any,
+                 expect: Optional[Any]) -> Optional[Tuple[Any, int, int]]:
+    for start, end in spans:
+        try:
+            value = parse(text[start:end])
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            continue
+        if expect is None or isinstance(value, expect):
+            return value, start, end
+    return None
+
+
+def _json_loads(text: str) -> Any:
+    # strict=False accepts raw newlines / tabs inside strings, which LLMs often emit
+    return json.loads(text, strict=False)
+
+
+def find_json(text: str, openers: str = "{[", expect: Optional[Any] = None) -> Optional[Tuple[Any, int, int]]:
+    """
+    Locates the first complete JSON object / array in text (fences and prose around it are fine).
+    
+    Args:
+        text: LLM reply
+        openers: "{[" for objects or arrays, "{" for objects only, "[" for arrays only
+        expect: Optional type (or tuple of types) the value must have, e.g. dict
+    
+    Returns:
+        (value, start, end) with text[start:end] the JSON source, or None
+    """
+    return _find_first(BalancedScanner(openers), text, _json_loads, expect)
+
+
+def _find_first(scanner: BalancedScanner, text: str, parse: Any, expect: Optional[Any],
+                nested: bool = True) -> Optional[Tuple[Any, int, int]]:
+    spans = scanner.feed(text, first=True)
+    while spans:
+        found = _first_value(text, spans, parse, expect)
+        if found:
+            return found
+        spans = scanner.feed("", first=True)
+    return _first_value(text, scanner.leftovers(), parse, expect) if nested else None
+
+
+def extract_json(text: str, openers: str = "{[", expect: Optional[Any] = None) -> Optional[Any]:
+    """
+    Returns the first complete JSON value in text (see find_json), or None.
+    """
+    found = find_json(text, openers, expect)
+    return found[0] if found else None
+
+
+def extract_python_list(text: str) -> Optional[list]:
+    """
+    Returns the first Python list literal in text (e.g. a ```python [...]``` plan), or None.
+    
+    Uses ast.literal_eval, so single-quoted strings, tuples and trailing commas work
+    and nothing is executed.
+    """
+    import ast
+    
+    found = _find_first(BalancedScanner("[", quotes="\"'"), text, ast.literal_eval, list)
+    return found[0] if found else None
+
+
+def extract_json_from_stream(deltas: Iterable[Any], openers: str = "{[", expect: Optional[Any] = None,
+                             stop_early: bool = True) -> Dict[str, Any]:
+    """
+    Reads streamed deltas until the first complete JSON value has arrived.
+    
+    Args:
+        deltas: Iterable of text chunks or StreamDelta objects
+        openers / expect: As for find_json
+        stop_early: Stop reading (and close the stream) once the value is complete
+    
+    Returns:
+        {"value" (None if nothing parsed), "text" (everything read), "stopped_early"}
+    """
+    scanner = BalancedScanner(openers)
+    found = None
+    stopped_early = False
+    for delta in deltas:
+        spans = scanner.feed(getattr(delta, "text", delta))
+        found = found or _first_value(scanner.text, spans, _json_loads, expect)
+        if found and stop_early:
+            stopped_early = True
+            break
+    if stopped_early and hasattr(deltas, "close"):
+        deltas.close()
+    if found is None:
+        found = _first_value(scanner.text, scanner.leftovers(), _json_loads, expect)
+    return {"value": found[0] if found else None, "text": scanner.text, "stopped_early": stopped_early}
+
+
+# ============================================================================
+# JSON Repair
+# ============================================================================
+
+# A malformed JSON action otherwise costs a whole extra LLM step ("output was not
+# valid JSON, try again"); these deterministic fixes cover the usual defects.
+REPAIR_KINDS = (
+    "single_quotes",        # {'a': 'b'}
+    "python_literals",      # True / False / None
+    "unquoted_keys",        # {name: "Search"}
+    "trailing_commas",      # [1, 2,] / {"a": 1,}
+    "missing_commas",       # {"a": 1 "b": 2}
+    "inner_quotes",         # "he said "hi" twice"
+    "control_chars",        # raw tabs / newlines / control characters in strings
+    "invalid_escapes",      # "C:\dir" / \'
+    "comments",             # // ... , /* ... */ , # ...
+    "mismatched_brackets",  # {"a": [1, 2}
+    "missing_closers",      # {"a": {"b": 1}   (reply cut off after a complete value)
+)
+
+_BARE_RE = re.compile(r"[^\s,:\[\]{}\"']+")
+_NUMBER_TOKEN_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?\Z")
+_NEXT_TOKEN_RE = re.compile(r"\s*(.?)", re.DOTALL)
+_LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_MAX_REPAIR_CANDIDATES = 8
+
+
+class _Unrepairable(Exception):
+    pass
+
+
+class _JsonRepairer:
+    """
+    Rewrites one JSON-like value starting at an opening bracket into strict JSON.
+    
+    Works token by token in a single pass. Anything that would need guessing
+    content (an unterminated string, a bare word value, a key without a value)
+    raises _Unrepairable, so a repaired reply never contains invented text.
+    """
+    
+    def __init__(self, text: str, start: int):
+        self.text = text
+        self.pos = start
+        self.out: List[str] = []
+        self.stack: List[str] = []      # expected closers
+        self.last: Optional[str] = None  # "open", "key", "colon", "value" or "comma"
+        self.fixes: List[str] = []
+    
+    def fix(self, kind: str) -> None:
+        if kind not in self.fixes:
+            self.fixes.append(kind)
+    
+    def expecting_key(self) -> bool:
+        return bool(self.stack) and self.stack[-1] == "}" and self.last in ("open", "comma")
+    
+    def begin_value(self) -> None:
+        # A value right after another value inside a container: the comma is missing
+        if self.stack and self.last == "value":
+            self.out.append(",")
+            self.last = "comma"
+            self.fix("missing_commas")
+    
+    def run(self) -> Tuple[str, List[str]]:
+        text, n = self.text, len(self.text)
+        while self.pos < n:
+            ch = text[self.pos]
+            if ch.isspace():
+                self.pos += 1
+            elif ch in "\"'":
+                self.string(ch)
+            elif ch in "{[":
+                self.begin_value()
+                self.stack.append(_CLOSERS[ch])
+                self.out.append(ch)
+                self.last = "open"
+                self.pos += 1
+            elif ch in "}]":
+                self.close(ch)
+                if not self.stack:
+                    return "".join(self.out), self.fixes
+            elif ch == ",":
+                if self.last in ("open", "comma"):
+                    self.fix("trailing_commas")
+                else:
+                    self.out.append(",")
+                    self.last = "comma"
+                self.pos += 1
+            elif ch == ":":
+                if self.last != "key":
+                    raise _Unrepairable("unexpected ':'")
+                self.out.append(":")
+                self.last = "colon"
+                self.pos += 1
+            elif text.startswith("/*", self.pos):
+                end = text.find("*/", self.pos + 2)
+                self.pos = n if end == -1 else end + 2
+                self.fix("comments")
+            elif ch == "#" or text.startswith("//", self.pos):
+                end = text.find("\n", self.pos)
+                self.pos = n if end == -1 else end
+                self.fix("comments")
+            else:
+                self.bare()
+        return self.finish()
+    
+    def string(self, quote: str) -> None:
+        text, n = self.text, len(self.text)
+        self.begin_value()
+        key = self.expecting_key()
+        buf: List[str] = []
+        j = self.pos + 1
+        while True:
+            if j >= n:
+                raise _Unrepairable("unterminated string")
+            c = text[j]
+            if c == "\\":
+                nxt = text[j + 1:j + 2]
+                if nxt and nxt in '"\\/bfnrtu':
+                    buf.append(c + nxt)
+                else:
+                    buf.append("'" if nxt == "'" else "\\\\" + nxt)
+                    self.fix("invalid_escapes")
+                j += 2
+            elif c == quote:
+                if self.string_ends(j + 1, key):
+                    break
+                buf.append('\\"' if c == '"' else c)
+                self.fix("inner_quotes")
+                j += 1
+            else:
+                if c == '"':
+                    buf.append('\\"')
+                elif c < " ":
+                    buf.append(_CONTROL_ESCAPES.get(c, "\\u%04x" % ord(c)))
+                    self.fix("control_chars")
+                else:
+                    buf.append(c)
+                j += 1
+        if quote == "'":
+            self.fix("single_quotes")
+        self.out.append('"' + "".join(buf) + '"')
+        self.last = "key" if key else "value"
+        self.pos = j + 1
+    
+    def string_ends(self, k: int, key: bool) -> bool:
+        """
+        Whether the quote before text[k] closes the string (judged by what follows it).
+        """
+        m = _NEXT_TOKEN_RE.match(self.text, k)
+        nxt = m.group(1)
+        if key:
+            return nxt in (":", "")
+        if nxt in ("", ",", "}", "]", "#", "/"):
+            return True
+        # A string followed on the next line by another string: a missing comma
+        return nxt in ('"', "'") and "\n" in m.group()
+    
+    def bare(self) -> None:
+        m = _BARE_RE.match(self.text, self.pos)
+        token = m.group()
+        self.begin_value()
+        if self.expecting_key():
+            if not re.match(r"[A-Za-z_]\w*\Z", token):
+                raise _Unrepairable(f"bad key {token!r}")
+            self.out.append(f'"{token}"')
+            self.last = "key"
+            self.fix("unquoted_keys")
+        elif self.last not in ("open", "colon", "comma"):
+            raise _Unrepairable(f"unexpected {token!r}")
+        elif token in _LITERALS:
+            self.out.append(_LITERALS[token])
+            self.last = "value"
+            if token != _LITERALS[token]:
+                self.fix("python_literals")
+        elif _NUMBER_TOKEN_RE.match(token):
+            self.out.append(token)
+            self.last = "value"
+        else:
+            raise _Unrepairable(f"bare word {token!r}")
+        self.pos = m.end()
+    
+    def close(self, ch: str) -> None:
+        if self.last in ("key", "colon"):
+            raise _Unrepairable("key without value")
+        if ch not in self.stack:
+            # A stray closer
+            self.fix("mismatched_brackets")
+            self.pos += 1
+            return
+        if self.last == "comma":
+            self.out.pop()
+            self.fix("trailing_commas")
+        while self.stack[-1] != ch:
+            self.out.append(self.stack.pop())
+            self.fix("mismatched_brackets")
+        self.out.append(self.stack.pop())
+        self.last = "value"
+        self.pos += 1
+    
+    def finish(self) -> Tuple[str, List[str]]:
+        # End of reply with brackets still open: close them if the last token was complete
+        if self.last in ("open", "key", "colon"):
+            raise _Unrepairable("truncated inside a key/value pair")
+        if self.last == "comma":
+            self.out.pop()
+        self.out.extend(reversed(self.stack))
+        self.fix("missing_closers")
+        return "".join(self.out), self.fixes
+
+
+def _repair_first(text: str, openers: str, expect: Optional[Any],
+                  stop: Optional[int] = None) -> Optional[Tuple[Any, List[str], int]]:
+    """
+    Repairs candidates starting before `stop`; returns (value, fixes, end) for the first that parses.
+    """
+    starts = re.compile("[" + re.escape(openers) + "]").finditer(text, 0, len(text) if stop is None else stop)
+    for m in itertools.islice(starts, _MAX_REPAIR_CANDIDATES):
+        repairer = _JsonRepairer(text, m.start())
+        try:
+            source, fixes = repairer.run()
+            value = json.loads(source)
+        except (_Unrepairable, ValueError, RecursionError):
+            continue
+        if expect is None or isinstance(value, expect):
+            return value, fixes, repairer.pos
+    return None
+
+
+def repair_json(text: str, openers: str = "{[", expect: Optional[Any] = None) -> Optional[Tuple[Any, List[str]]]:
+    """
+    Deterministically repairs the first JSON-like value in text (see REPAIR_KINDS).
+    
+    Meant for replies find_json could not parse: trailing commas, single quotes,
+    Python literals, unescaped newlines / quotes, comments and missing closing
+    braces are fixed locally instead of asking the model again.
+    
+    Args:
+        text: LLM reply
+        openers / expect: As for find_json
+    
+    Returns:
+        (value, fixes) with fixes the REPAIR_KINDS applied, or None
+    """
+    repaired = _repair_first(text, openers, expect)
+    return repaired[:2] if repaired else None
+
+
+class RepairStats:
+    """
+    Per-agent counts of JSON replies that parsed cleanly, needed a local repair
+    (one LLM round-trip saved each) or could not be used at all.
+    
+    Use the module-level `repair_stats` instance.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, Any]] = {}
+    
+    def record(self, agent: str, ok: bool, fixes: List[str]) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(agent, {"parsed": 0, "clean": 0, "repaired": 0, "failed": 0, "fixes": {}})
+            counts["parsed"] += 1
+            if not ok:
+                counts["failed"] += 1
+            elif fixes:
+                counts["repaired"] += 1
+                for kind in fixes:
+                    counts["fixes"][kind] = counts["fixes"].get(kind, 0) + 1
+            else:
+                counts["clean"] += 1
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        {agent: {"parsed", "clean", "repaired", "failed", "fixes": {kind: n}, "round_trips_saved"}}
+        """
+        with self._lock:
+            return {
+                agent: dict(counts, fixes=dict(counts["fixes"]), round_trips_saved=counts["repaired"])
+                for agent, counts in self._counts.items()
+            }
+    
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+repair_stats = RepairStats()
+
+
+def extract_json_with_repair(text: str, openers: str = "{[", expect: Optional[Any] = None,
+                             agent: Optional[str] = None) -> Tuple[Optional[Any], List[str]]:
+    """
+    extract_json plus the local repair pass (repair_json) for malformed replies.
+    
+    A repaired value is preferred when it encloses the first value that parses
+    as-is (e.g. `{}` inside a single-quoted action), so fragments of a broken
+    reply are never mistaken for the answer.
+    
+    Args:
+        text: LLM reply
+        openers / expect: As for find_json
+        agent: Name to count the outcome under in repair_stats (None = not counted)
+    
+    Returns:
+        (value or None, fixes applied; [] when the reply was already valid)
+    """
+    scanner = BalancedScanner(openers)
+    found = _find_first(scanner, text, _json_loads, expect, nested=False)
+    # Brackets the scanner stepped over before the value ({'a': ...}) or a reply cut off
+    # before its closing braces: a repaired outer value beats a fragment nested in it
+    repaired = _repair_first(text, openers, expect, stop=found[1] if found else None)
+    if repaired is not None and (found is None or repaired[2] >= found[2]):
+        value, fixes = repaired[:2]
+    else:
+        found = found or _first_value(text, scanner.leftovers(), _json_loads, expect)
+        value, fixes = (found[0], []) if found else (None, [])
+    if agent:
+        repair_stats.record(agent, value is not None, fixes)
+    return value, fixes
@@ -0,0 +1,103 @@
+"""
+validate_chart_code 静态检查的测试 (在 agent_refactor/ 目录下运行: python -m pytest -q)
+"""
+
+from agent_logic import validate_chart_code
+
+COLUMNS = ["date", "coffee_name", "price"]
+OUT_PATH = "charts/chart_v1.png"
+
+
+def test_makedirs_for_output_dir_passes():
+    code = (
+        "import os\n"
+        "import matplotlib.pyplot as plt\n"
+        "os.makedirs(os.path.dirname(out_path), exist_ok=True)\n"
+        "plt.bar(df['coffee_name'], df['price'])\n"
+        "plt.savefig('charts/chart_v1.png', dpi=300)\n"
+        "plt.close()\n"
+    )
+    assert validate_chart_code(code, COLUMNS, OUT_PATH) == []
+
+
+def test_allowed_os_calls_via_alias_pass():
+    code = (
+        "from os import makedirs, getcwd\n"
+        "import os.path as osp\n"
+        "makedirs(osp.join(getcwd(), 'charts'), exist_ok=True)\n"
+    )
+    assert validate_chart_code(code, COLUMNS) == []
+
+
+def test_other_system_calls_are_rejected():
+    code = "import os\nimport subprocess\nos.remove('data.csv')\nsubprocess.run(['ls'])\n"
+    issues = validate_chart_code(code, COLUMNS)
+    assert len(issues) == 2
+    assert all(issue.startswith("forbidden_call") for issue in issues)
+
+
+def test_pathlib_and_io_readers_are_rejected():
+    code = (
+        "import io\n"
+        "import pathlib\n"
+        "from pathlib import Path\n"
+        "text = pathlib.Path('d.csv').read_text()\n"
+        "data = io.open('d.csv').read()\n"
+        "raw = Path('d.csv').open().read()\n"
+    )
+    issues = validate_chart_code(code, COLUMNS)
+    assert issues == [
+        "forbidden_call (line 4): pathlib.Path().read_text() - reads a file; df already exists",
+        "forbidden_call (line 5): io.open() - file access is not allowed; use the existing df",
+        "forbidden_call (line 6): Path().open() - file access is not allowed; use the existing df",
+    ]
+
+
+def test_unknown_columns_are_reported_with_hint():
+    code = (
+        "a = df['coffe_name']\n"
+        "b = df[['date', 'prices']]\n"
+        "c = df.cost\n"
+        "d = df['price']\n"
+    )
+    assert validate_chart_code(code, COLUMNS) == [
+        "unknown_column (line 1): df['coffe_name'] is not a column of df (did you mean 'coffee_name'?)",
+        "unknown_column (line 2): df['prices'] is not a column of df (did you mean 'price'?)",
+        "unknown_column (line 3): df.cost is not a column of df",
+    ]
+
+
+def test_columns_created_in_code_are_known():
+    code = (
+        "df['month'] = df['date']\n"
+        "df = df.assign(total=1)\n"
+        "x = df['month']\n"
+        "y = df['anything_after_rebinding']\n"
+    )
+    assert validate_chart_code(code, COLUMNS) == []
+
+
+def test_savefig_target_must_match_out_path():
+    code = (
+        "import matplotlib.pyplot as plt\n"
+        "out = 'charts/other.png'\n"
+        "plt.savefig(out)\n"
+        "plt.gcf().savefig('chart.png')\n"
+        "plt.savefig('charts/./chart_v1.png')\n"
+    )
+    assert validate_chart_code(code, COLUMNS, OUT_PATH) == [
+        "wrong_savefig_target (line 3): saves to 'charts/other.png' instead of 'charts/chart_v1.png'",
+        "wrong_savefig_target (line 4): saves to 'chart.png' instead of 'charts/chart_v1.png'",
+    ]
+
+
+def test_missing_savefig_is_reported():
+    assert validate_chart_code("x = df['price']\n", COLUMNS, OUT_PATH) == [
+        "missing_savefig: the figure is never saved to 'charts/chart_v1.png'"
+    ]
+
+
+def test_syntax_error_and_empty_code():
+    issues = validate_chart_code("plt.bar(df['price']\n", COLUMNS)
+    assert len(issues) == 1 and issues[0].startswith("syntax_error (line 1)")
+    assert validate_chart_code("   ", COLUMNS) == ["no_code: the reply contains no code"]
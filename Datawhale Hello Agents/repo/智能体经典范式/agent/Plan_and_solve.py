@@ -1,4 +1,3 @@
-import ast
 import json
 import os
 import sys
@@ -6,8 +5,9 @@ from typing import List, Optional
 
 from dotenv import load_dotenv
 
-from llm_client import HelloAgentsLLM
+from llm_client import HelloAgentsLLM, LLMCallError
 from ui_utils import print_html
+from safe_parsing import extract_python_list
 
 # --- 1. 规划器 (Planner) 定义 ---
 PLANNER_PROMPT_TEMPLATE = """
@@ -29,23 +29,8 @@ class Planner:
 
     def _parse_plan(self, response_text: str) -> List[str]:
         """从 LLM 响应中解析计划列表"""
-        try:
-            # 尝试提取 markdown 代码块中的内容
-            if "```python" in response_text:
-                plan_str = response_text.split("```python")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                plan_str = response_text.split("```")[1].split("```")[0].strip()
-            else:
-                plan_str = response_text.strip()
-            
-            # 使用 ast.literal_eval 安全地解析 Python 列表
-            plan = ast.literal_eval(plan_str)
-            
-            if isinstance(plan, list):
-                return plan
-            return []
-        except (ValueError, SyntaxError, IndexError):
-            return []
+        # 括号平衡扫描定位第一个 Python 列表，再用 ast.literal_eval 安全解析
+        return extract_python_list(response_text) or []
 
     def plan(self, question: str) -> List[str]:
         """
@@ -125,6 +110,14 @@ class PlanAndSolveAgent:
         self.executor = Executor(self.llm_client)
 
     def run(self, question: str):
+        try:
+            return self._run(question)
+        except LLMCallError as e:
+            # 重试用尽：终止任务，而不是把错误文本当作计划或答案继续执行
+            print_html(f"LLM 调用失败，任务终止: {e}", title="🛑 Task Aborted")
+            return None
+
+    def _run(self, question: str):
         print_html(question, title="🏁 Task Start")
         
         # 1. 规划
@@ -137,6 +130,7 @@ class PlanAndSolveAgent:
         final_answer = self.executor.execute(question, plan)
         
         print_html(final_answer, title="🎉 Final Answer")
+        return final_answer
 
 # --- 4. 主函数入口 ---
 if __name__ == '__main__':
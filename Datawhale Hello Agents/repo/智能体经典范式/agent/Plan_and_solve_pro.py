@@ -1,13 +1,12 @@
-import ast
-import json
 import os
 import sys
 from typing import List, Tuple
 
 from dotenv import load_dotenv
 
-from llm_client import HelloAgentsLLM
+from llm_client import HelloAgentsLLM, LLMCallError
 from ui_utils import print_html
+from safe_parsing import extract_json, extract_python_list
 
 # --- Prompts ---
 PLANNER_PROMPT_TEMPLATE = """
@@ -84,6 +83,16 @@ EVAL_PROMPT_TEMPLATE = """
 ```
 """
 
+# 原生 JSON 模式使用的评估结果结构
+EVAL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "success": {"type": "boolean"},
+        "reason": {"type": "string"}
+    },
+    "required": ["success", "reason"]
+}
+
 # --- Classes ---
 
 class ReplanningPlanner:
@@ -91,20 +100,8 @@ class ReplanningPlanner:
         self.llm_client = llm_client
 
     def _parse_plan(self, response_text: str) -> list[str]:
-        try:
-            if "```python" in response_text:
-                plan_str = response_text.split("```python")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                plan_str = response_text.split("```")[1].split("```")[0].strip()
-            else:
-                plan_str = response_text.strip()
-            
-            plan = ast.literal_eval(plan_str)
-            if isinstance(plan, list):
-                return plan
-            return []
-        except Exception:
-            return []
+        # 第一个完整的 Python 列表 (ast.literal_eval 解析，有无代码围栏均可)
+        return extract_python_list(response_text) or []
 
     def plan(self, question: str) -> list[str]:
         prompt = PLANNER_PROMPT_TEMPLATE.format(question=question)
@@ -157,32 +154,44 @@ class ReplanningExecutor:
         messages = [{"role": "user", "content": prompt}]
         
         # print_html("正在评估执行结果...", title="⚖️ Critic Evaluating") 
-        response = self.llm_client.think(messages=messages) or "{}"
+        response = self.llm_client.think(messages=messages, schema=EVAL_SCHEMA) or "{}"
         
-        try:
-            json_str = response
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                json_str = response.split("```")[1].split("```")[0].strip()
-            else:
-                json_str = response.strip()
-                
-            eval_result = json.loads(json_str)
-            return eval_result.get("success", False), eval_result.get("reason", "Unknown reason")
-        except Exception as e:
-            print(f"Critic parse error: {e}")
+        eval_result = extract_json(response, openers="{", expect=dict)
+        if eval_result is None:
+            print(f"Critic parse error: no JSON object in response: {response[:200]}")
             return True, "Critic failed to parse, assuming success."
+        return eval_result.get("success", False), eval_result.get("reason", "Unknown reason")
 
 class ReplanningAgent:
-    def __init__(self, llm_client: HelloAgentsLLM):
+    def __init__(self, llm_client: HelloAgentsLLM, semantic_cache=None, semantic_cache_ttl: float = None):
         self.llm_client = llm_client
         self.planner = ReplanningPlanner(self.llm_client)
         self.executor = ReplanningExecutor(self.llm_client)
+        # 可选：语义缓存 (如 template/core 的 core.semantic_cache.SemanticCache)，相似问题跳过规划与执行
+        # 答案由工具结果得出，必须显式给出较短的 semantic_cache_ttl (秒)，避免默认 24 小时复用过期答案
+        if semantic_cache is not None and not semantic_cache_ttl:
+            raise ValueError("semantic_cache requires an explicit short semantic_cache_ttl (seconds) for tool-derived answers")
+        self.semantic_cache = semantic_cache
+        self.semantic_cache_ttl = semantic_cache_ttl
 
     def run(self, question: str):
+        try:
+            return self._run(question)
+        except LLMCallError as e:
+            # 重试用尽：终止任务，而不是把错误文本交给 Critic 或写入语义缓存
+            print_html(f"LLM 调用失败，任务终止: {e}", title="🛑 Stop")
+            return None
+
+    def _run(self, question: str):
         print_html(question, title="🏁 Task Start (Pro Agent)")
         
+        cache_namespace = f"plan_and_solve:{self.llm_client.model}"
+        if self.semantic_cache is not None:
+            cached_answer = self.semantic_cache.get(cache_namespace, question)
+            if cached_answer is not None:
+                print_html(cached_answer, title="🎉 Final Answer (语义缓存命中)")
+                return cached_answer
+
         plan = self.planner.plan(question)
         if not plan:
             return
@@ -214,6 +223,9 @@ class ReplanningAgent:
                     return
 
         print_html(final_answer, title="🎉 Final Answer")
+        if self.semantic_cache is not None and final_answer:
+            self.semantic_cache.set(cache_namespace, question, final_answer, ttl_seconds=self.semantic_cache_ttl)
+        return final_answer
 
 if __name__ == "__main__":
     load_dotenv()
@@ -1,5 +1,4 @@
 import json
-import re
 import sys
 import os
 
@@ -7,9 +6,10 @@ import os
 sys.path.append(os.path.abspath(".."))
 
 from typing import Dict, Any, Tuple, Optional
-from llm_client import HelloAgentsLLM
+from llm_client import HelloAgentsLLM, LLMCallError
 from tools import ToolExecutor, search
 from ui_utils import print_html  # 导入 UI 工具
+from safe_parsing import extract_json_with_repair, repair_stats  # 与 template/core 共用的 JSON 扫描 / 修复
 
 # 1. 优化后的 Prompt 模板，使用 JSON 格式输出
 REACT_JSON_PROMPT_TEMPLATE = """
@@ -40,12 +40,41 @@ Question: {question}
 History: {history}
 """
 
+# 原生 JSON 模式使用的输出结构 (与上面的提示词格式一致)
+REACT_ACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "thought": {"type": "string"},
+        "action": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string"},
+                "args": {"type": "object"}
+            },
+            "required": ["name", "args"]
+        }
+    },
+    "required": ["thought", "action"]
+}
+
 class ReActAgent:
-    def __init__(self, llm_client: HelloAgentsLLM, tool_executor: ToolExecutor, max_steps: int = 5):
+    def __init__(self, llm_client: HelloAgentsLLM, tool_executor: ToolExecutor, max_steps: int = 5,
+                 semantic_cache=None, semantic_cache_ttl: float = None):
         self.llm_client = llm_client
         self.tool_executor = tool_executor
         self.max_steps = max_steps
         self.history = []
+        # 可选：语义缓存 (如 template/core 的 core.semantic_cache.SemanticCache，或任何实现
+        # get(namespace, text) / set(namespace, text, value, ttl_seconds=...) 的对象)
+        # 换个说法问同一个问题时直接返回之前的最终答案，跳过整个多步推理
+        # 最终答案来自工具的实时结果 (天气、搜索等)，必须显式给出较短的 semantic_cache_ttl (秒)
+        if semantic_cache is not None and not semantic_cache_ttl:
+            raise ValueError("semantic_cache requires an explicit short semantic_cache_ttl (seconds) for tool-derived answers")
+        self.semantic_cache = semantic_cache
+        self.semantic_cache_ttl = semantic_cache_ttl
+        # JSON 解析统计按智能体名称归类 (repair_stats.snapshot()[agent_name])，子类各自计数
+        self.agent_name = type(self).__name__
+        self.last_repairs = []
 
     def run(self, question: str):
         self.history = []
@@ -54,6 +83,14 @@ class ReActAgent:
         # 使用 print_html 渲染开始状态
         print_html(f"🚀 开始任务: {question}", title="System Start")
 
+        # 按模型隔离缓存：不同模型的答案互不复用
+        cache_namespace = f"react:{self.llm_client.model}"
+        if self.semantic_cache is not None:
+            cached_answer = self.semantic_cache.get(cache_namespace, question)
+            if cached_answer is not None:
+                print_html(cached_answer, title="🎉 Final Answer (语义缓存命中)")
+                return cached_answer
+
         while current_step < self.max_steps:
             current_step += 1
             
@@ -68,7 +105,11 @@ class ReActAgent:
 
             # 2. LLM 思考
             messages = [{"role": "user", "content": prompt}]
-            response_text = self.llm_client.think(messages=messages)
+            try:
+                response_text = self.llm_client.think(messages=messages, schema=REACT_ACTION_SCHEMA)
+            except LLMCallError as e:
+                print_html(f"LLM 调用失败，任务终止: {e}", title="❌ Error")
+                return None
             
             if not response_text:
                 print_html("LLM未能返回有效响应。", title="❌ Error")
@@ -80,6 +121,9 @@ class ReActAgent:
             # 渲染思考过程 (无论解析是否成功，先展示思考)
             if thought:
                 print_html(thought, title=f"Step {current_step}: 🤔 Thought")
+            if tool_name and self.last_repairs:
+                print_html(f"已在本地修复输出格式问题 ({', '.join(self.last_repairs)})，无需重新请求模型。",
+                           title=f"Step {current_step}: 🩹 JSON Repaired")
             
             if not tool_name:
                 print_html(f"未能解析出有效的 Action。\n原始响应: {response_text}", title="⚠️ Warning")
@@ -90,6 +134,8 @@ class ReActAgent:
             if tool_name.lower() == "finish":
                 final_answer = tool_args.get("answer", str(tool_args))
                 print_html(final_answer, title="🎉 Final Answer")
+                if self.semantic_cache is not None:
+                    self.semantic_cache.set(cache_namespace, question, final_answer, ttl_seconds=self.semantic_cache_ttl)
                 return final_answer
 
             # 5. 执行工具
@@ -125,36 +171,32 @@ class ReActAgent:
         print_html("已达到最大步数，流程终止。", title="🛑 Stop")
         return None
 
-    def _parse_json_output(self, text: str) -> Tuple[Optional[str], Optional[str], Optional[Dict]]:
-        try:
-            clean_text = text.strip()
-            if "```" in clean_text:
-                match = re.search(r"```(?:json)?\s*(.*?)\s*```", clean_text, re.DOTALL)
-                if match:
-                    clean_text = match.group(1)
-            
-            start_idx = clean_text.find('{')
-            end_idx = clean_text.rfind('}')
-            
-            if start_idx != -1 and end_idx != -1:
-                json_str = clean_text[start_idx : end_idx + 1]
-                data = json.loads(json_str)
-                
-                thought = data.get("thought")
-                action = data.get("action", {})
-                
-                if isinstance(action, dict):
-                    tool_name = action.get("name")
-                    tool_args = action.get("args", {})
-                else:
-                    tool_name = None
-                    tool_args = {}
-                    
-                return thought, tool_name, tool_args
-            return None, None, None
+    def repair_report(self) -> Dict[str, Any]:
+        """
+        本智能体的 JSON 解析统计: clean / repaired / failed 次数、各类修复次数，
+        以及 round_trips_saved (本地修复省下的 LLM 调用次数)
+        """
+        return repair_stats.snapshot().get(self.agent_name, {})
 
-        except json.JSONDecodeError:
+    def _parse_json_output(self, text: str) -> Tuple[Optional[str], Optional[str], Optional[Dict]]:
+        # 定位第一个完整的 JSON 对象 (忽略代码围栏、前后的说明文字以及字符串里的括号)；
+        # 解析失败时先在本地修复常见格式错误 (尾逗号、单引号、未转义换行、缺少右括号等)，
+        # 修不好才让模型重新输出
+        data, self.last_repairs = extract_json_with_repair(text, openers="{", expect=dict, agent=self.agent_name)
+        if data is None:
             return None, None, None
+        
+        thought = data.get("thought")
+        action = data.get("action", {})
+        
+        if isinstance(action, dict):
+            tool_name = action.get("name")
+            tool_args = action.get("args", {})
+        else:
+            tool_name = None
+            tool_args = {}
+            
+        return thought, tool_name, tool_args
 
 # --- 运行演示 ---
 if __name__ == '__main__':
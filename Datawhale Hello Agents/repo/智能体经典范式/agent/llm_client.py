@@ -1,21 +1,49 @@
 # 增加模型选择功能，默认使用 Mimo-V2-flash
 # 为流式响应增加了安全检查逻辑，避免 `choices` 为空导致的空响应；增加非流式响应支持，默认关闭
+# 增加原生 JSON 输出 (response_format) 支持：think(..., schema=...) 时由服务端保证 JSON 合法
+# 重试用尽后抛出 LLMCallError (不再返回 "Error calling LLM" 字符串)；可选 hedging：非流式调用超过近期 p95 延迟时补发一份请求
 
 import os
+import json
+import time
+import threading
+from collections import deque
+from urllib.parse import urlparse
 from openai import OpenAI
 from dotenv import load_dotenv
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
+from safe_parsing import find_json
 
 # 加载 .env 文件 (确保能读取到根目录的 .env)
 # 假设当前运行目录在项目根目录，或者显式指定 .env 路径
 load_dotenv() 
 
+# JSON 输出模式: json_schema (OpenAI) / json_object (通义、DeepSeek、智谱等兼容接口) / none (仅靠提示词)
+JSON_MODES = ("json_schema", "json_object", "none")
+
+# Hedging：至少积累这么多次成功调用的延迟后才会按 p95 补发请求
+HEDGE_MIN_SAMPLES = 20
+
+
+class LLMCallError(RuntimeError):
+    """
+    think 在 SDK 重试用尽后仍然失败时抛出；智能体据此终止任务，而不是把错误文本当作模型回复
+    """
+
+    def __init__(self, model: str, error: Exception):
+        super().__init__(f"调用 {model} 失败 ({type(error).__name__}): {error}")
+        self.model = model
+        self.error_type = type(error).__name__
+        self.status_code = getattr(error, "status_code", None)
+
+
 class HelloAgentsLLM:
     """
     适配 Datawhale Hello Agents 教程的 LLM 客户端。
     支持自动加载 .env 中的通用配置，也支持传入特定参数。
     """
-    def __init__(self, model: str = None, apiKey: str = None, baseUrl: str = None, timeout: int = None):
+    def __init__(self, model: str = None, apiKey: str = None, baseUrl: str = None, timeout: int = None, maxRetries: int = None, metrics=None, cassette=None, jsonMode: str = None,
+                 hedging: bool = None):
         # 1. 尝试使用传入参数
         # 2. 尝试读取教程标准的通用环境变量 (LLM_*)
         # 3. 兜底：尝试读取项目中已有的特定厂商环境变量 (如 QWEN_*) 以方便直接使用
@@ -26,6 +54,27 @@ class HelloAgentsLLM:
         self.api_key = apiKey or os.getenv("LLM_API_KEY")
         self.base_url = baseUrl or os.getenv("LLM_BASE_URL")
         self.timeout = timeout or int(os.getenv("LLM_TIMEOUT", 60))
+        # 429 / 5xx / 超时自动重试：SDK 内置指数退避 + 抖动，并遵循 Retry-After
+        self.max_retries = maxRetries if maxRetries is not None else int(os.getenv("LLM_MAX_RETRIES", 3))
+        # 可选：指标记录器 (如 template/core 的 core.metrics.metrics，或任何实现 record_call 的对象)
+        # 用于统计每次 think 调用的耗时、首 token 时间、token 用量与错误类型
+        self.metrics = metrics
+        # 可选：录制/回放磁带 (如 template/core 的 core.cassette.Cassette，或任何实现 play(kind, request, fn) 的对象)
+        # 录制一次真实对话后即可离线毫秒级回放，用于分析解析、工具调用与渲染的开销
+        self.cassette = cassette
+        # 传入 schema 时使用的原生 JSON 模式；服务端不支持 (400) 时自动降级为 none
+        self.json_mode = jsonMode or os.getenv("LLM_JSON_MODE", "json_object")
+        if self.json_mode not in JSON_MODES:
+            raise ValueError(f"jsonMode 必须是 {JSON_MODES} 之一，当前为: {self.json_mode}")
+        # 结构化调用统计：调用次数与 JSON 解析失败次数 (衡量节省的重试)
+        self.json_stats = {"calls": 0, "parse_failures": 0}
+        # 可选 hedging (或 LLM_HEDGING=1)：非流式调用超过近期 p95 延迟仍未返回时补发一份，取先返回者
+        # 同步 SDK 调用无法中断，落败的请求在后台跑完后丢弃，计入 hedge_stats["hedge_abandoned"]
+        self.hedging = hedging if hedging is not None else os.getenv("LLM_HEDGING", "").lower() in ("1", "true", "yes")
+        self.hedge_stats = {"hedged": 0, "hedge_won": 0, "hedge_abandoned": 0}
+        self._latencies = deque(maxlen=200)
+        self._hedge_lock = threading.Lock()
+        self._hedge_pool = None
         
         # 如果没有通用的 LLM_API_KEY，尝试自动通过模型名匹配已有的 Key (可选优化)
         if not self.api_key:
@@ -44,26 +93,152 @@ class HelloAgentsLLM:
         self.client = OpenAI(
             api_key=self.api_key,
             base_url=self.base_url,
-            timeout=self.timeout
+            timeout=self.timeout,
+            max_retries=self.max_retries
         )
 
-    def think(self, messages: List[Dict[str, str]], temperature: float = 0.7, stream: bool = False) -> str:
+    def think(self, messages: List[Dict[str, str]], temperature: float = 0.7, stream: bool = False,
+              schema: Optional[Dict[str, Any]] = None) -> str:
         """
         核心方法：发送消息历史并获取回复
         :param stream: 是否开启流式输出 (打印到控制台)
+        :param schema: 期望的 JSON Schema；提供时启用原生 JSON 模式，返回内容为 JSON 字符串
+        :raises LLMCallError: SDK 重试 (指数退避，遵循 Retry-After) 用尽后仍然失败
+        """
+        if self.cassette is not None:
+            request = {"model": self.model, "messages": messages, "temperature": temperature, "stream": stream}
+            if schema is not None:
+                request["schema"] = schema
+            text = self.cassette.play("think", request, lambda: self._think(messages, temperature, stream, schema))
+        else:
+            text = self._think(messages, temperature, stream, schema)
+        if schema is not None:
+            self._record_json_result(text)
+        return text
+
+    def json_failure_rate(self) -> float:
+        """
+        结构化调用中 JSON 解析失败的比例
+        """
+        calls = self.json_stats["calls"]
+        return self.json_stats["parse_failures"] / calls if calls else 0.0
+
+    def _record_json_result(self, text: str):
+        self.json_stats["calls"] += 1
+        # 与各智能体解析器使用同一个扫描器，失败率才有可比性
+        if find_json(text) is None:
+            self.json_stats["parse_failures"] += 1
+
+    def _json_request(self, messages: List[Dict[str, str]], schema: Optional[Dict[str, Any]]):
+        """
+        根据 json_mode 生成 (messages, response_format)
+        """
+        if schema is None:
+            return messages, None
+        if self.json_mode == "json_schema":
+            return messages, {"type": "json_schema", "json_schema": {"name": "response", "schema": schema}}
+        # json_object 只保证语法合法，字段要求仍需写进提示词 (且多数厂商要求提示词中出现 "JSON")
+        instruction = "请只输出一个符合以下 JSON Schema 的 JSON 对象，不要输出 Markdown 代码块或其他内容：\n" \
+                      + json.dumps(schema, ensure_ascii=False)
+        # 插在开头的 system 消息之后：部分厂商只接受开头的 system 消息，且可保留提示词前缀缓存
+        prefix = 0
+        while prefix < len(messages) and messages[prefix]["role"] == "system":
+            prefix += 1
+        messages = list(messages[:prefix]) + [{"role": "system", "content": instruction}] + list(messages[prefix:])
+        return messages, ({"type": "json_object"} if self.json_mode == "json_object" else None)
+
+    def _hedge_delay(self) -> Optional[float]:
+        """
+        近期成功调用延迟的 p95 (样本不足或未开启 hedging 时返回 None)
+        """
+        if not self.hedging:
+            return None
+        with self._hedge_lock:
+            samples = sorted(self._latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def _create(self, stream: bool, **kwargs):
+        """
+        发送一次请求；流式调用不做 hedging (重复的流无法关闭)
+        """
+        delay = None if stream else self._hedge_delay()
+        start = time.perf_counter()
+        if delay is None:
+            response = self.client.chat.completions.create(stream=stream, **kwargs)
+        else:
+            response = self._hedged(lambda: self.client.chat.completions.create(stream=stream, **kwargs), delay)
+        if not stream:
+            with self._hedge_lock:
+                self._latencies.append(time.perf_counter() - start)
+        return response
+
+    def _hedged(self, fn, delay: float):
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        with self._hedge_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="think-hedge")
+        primary = self._hedge_pool.submit(fn)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        print(f"⏱️ 超过 p95 延迟 ({delay:.1f}s)，补发一份请求")
+        backup = self._hedge_pool.submit(fn)
+        pending = {primary, backup}
+        error = None
+        with self._hedge_lock:
+            self.hedge_stats["hedged"] += 1
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    with self._hedge_lock:
+                        self.hedge_stats["hedge_won"] += future is backup
+                        self.hedge_stats["hedge_abandoned"] += sum(not loser.cancel() for loser in pending)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _think(self, messages: List[Dict[str, str]], temperature: float, stream: bool,
+               schema: Optional[Dict[str, Any]] = None) -> str:
+        """
+        实际调用模型 (think 的无磁带实现)
         """
         print(f"🧠 正在调用 {self.model} 模型...")
+        start = time.perf_counter()
+        ttft, usage, error = None, None, None
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                stream=stream 
-            )
+            request_messages, response_format = self._json_request(messages, schema)
+            extra = {"response_format": response_format} if response_format else {}
+            try:
+                response = self._create(
+                    stream,
+                    model=self.model,
+                    messages=request_messages,
+                    temperature=temperature,
+                    **extra
+                )
+            except Exception as e:
+                # 服务端不支持 response_format：降级为仅提示词模式并重试一次
+                if not response_format or getattr(e, "status_code", None) != 400:
+                    raise
+                print(f"⚠️ 模型不支持 {self.json_mode} 模式，降级为提示词约束: {e}")
+                self.json_mode = "none"
+                request_messages, _ = self._json_request(messages, schema)
+                response = self._create(
+                    stream,
+                    model=self.model,
+                    messages=request_messages,
+                    temperature=temperature
+                )
             
             if not stream:
                 # 非流式：直接返回
                 print("✅ 大语言模型响应成功!", flush=True)
+                usage = getattr(response, "usage", None)
                 return response.choices[0].message.content
             else:
                 # 流式处理逻辑
@@ -78,14 +253,37 @@ class HelloAgentsLLM:
                     content = chunk.choices[0].delta.content
                     # 3. 安全检查：如果 content 是 None（有时可能是空字符串或 None），也跳过
                     if content:
+                        if ttft is None:
+                            ttft = time.perf_counter() - start
                         print(content, end="", flush=True)
                         collected_content.append(content)
                 print()  # 在流式输出结束后换行
                 return "".join(collected_content)
 
         except Exception as e:
+            error = type(e).__name__
             print(f"❌ 调用LLM API时发生错误: {e}")
-            return f"Error calling LLM: {str(e)}"
+            raise LLMCallError(self.model, e) from e
+        finally:
+            self._record_metrics(start, ttft, usage, error)
+
+    def _record_metrics(self, start: float, ttft: Optional[float], usage, error: Optional[str]):
+        """
+        将本次调用写入指标记录器 (未配置 metrics 时不做任何事)
+        """
+        if self.metrics is None:
+            return
+        provider = urlparse(self.base_url).hostname if self.base_url else "openai"
+        self.metrics.record_call(
+            provider=provider,
+            model=self.model,
+            kind="think",
+            wall_time=time.perf_counter() - start,
+            ttft=ttft,
+            input_tokens=getattr(usage, "prompt_tokens", None),
+            output_tokens=getattr(usage, "completion_tokens", None),
+            error=error,
+        )
 
 # --- 客户端使用示例 ---
 if __name__ == '__main__':
@@ -103,5 +301,5 @@ if __name__ == '__main__':
             print("\n\n--- 完整模型响应 ---")
             print(responseText)
 
-    except ValueError as e:
+    except (ValueError, LLMCallError) as e:
         print(e)
\ No newline at end of file
@@ -1,60 +1,36 @@
 """
-UI Utilities for Jupyter Notebooks
+UI Utilities (Notebook Cards and Headless Sinks)
 
-This module provides tools for creating beautiful, card-style UIs in Jupyter Notebooks.
-It supports multimodal content rendering (images, dataframes, code) with scoped CSS.
+print_html() is called several times per agent step. Where the output goes is
+decided by a pluggable sink, so background workers do not build HTML nobody sees:
+1. NotebookSink: card-style HTML with scoped CSS (images, dataframes, code)
+2. TerminalSink: plain "── title ──" blocks on stdout
+3. JsonlSink:    one JSON record per card in a trace file
+4. NullSink:     drops everything
+
+The sink comes from use_ui_sink(...) / set_ui_sink(...) or the UI_SINK environment
+variable ("notebook", "terminal", "jsonl", "none"; default "auto" = notebook
+inside a Jupyter kernel, terminal otherwise). IPython is imported only by the
+notebook sink, and pandas is never imported here.
+
+Usage:
+    >>> with use_ui_sink("jsonl", path="traces/run.jsonl"):
+    ...     agent.run(question)
 """
 
+import os
+import sys
+import json
 import base64
-import pandas as pd
-from typing import Any, Optional
-from IPython.display import HTML, display
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Union
 from html import escape
 
-def print_html(content: Any, title: Optional[str] = None, is_image: bool = False):
-    """
-    Renders content in a beautiful card-style UI within Jupyter Notebooks.
-    
-    Features:
-    - Multimodal rendering (Images, DataFrames, Code)
-    - Scoped CSS (prevents global style pollution)
-    - Visual hierarchy with titles
-    
-    Args:
-        content: The content to display.
-            - str + is_image=True: Path to image file (embedded as Base64)
-            - pd.DataFrame/Series: Rendered as HTML table
-            - Other: Rendered as code block (<pre><code>)
-        title: Optional title for the card.
-        is_image: Set to True if content is an image file path.
-    
-    Examples:
-        >>> print_html(code, title="📝 Generated Code")
-        >>> print_html("chart.png", title="📊 Visualization", is_image=True)
-        >>> print_html(df.head(), title="📋 Data Preview")
-    """
-    def image_to_base64(image_path: str) -> str:
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode("utf-8")
-    
-    # Render content based on type
-    if is_image and isinstance(content, str):
-        try:
-            b64 = image_to_base64(content)
-            rendered = f'<img src="data:image/png;base64,{b64}" alt="Image" style="max-width:100%; height:auto; border-radius:8px;">'
-        except Exception as e:
-            rendered = f"<pre><code>Error loading image: {escape(str(e))}</code></pre>"
-    elif isinstance(content, pd.DataFrame):
-        rendered = content.to_html(classes="pretty-table", index=False, border=0, escape=False)
-    elif isinstance(content, pd.Series):
-        rendered = content.to_frame().to_html(classes="pretty-table", border=0, escape=False)
-    elif isinstance(content, str):
-        rendered = f"<pre><code>{escape(content)}</code></pre>"
-    else:
-        rendered = f"<pre><code>{escape(str(content))}</code></pre>"
-    
-    # Scoped CSS
-    css = """
+
+# Scoped CSS
+CARD_CSS = """
     <style>
     .pretty-card {
         font-family: ui-sans-serif, system-ui, -apple-system, sans-serif;
@@ -108,8 +84,247 @@ def print_html(content: Any, title: Optional[str] = None, is_image: bool = False
         font-weight: 600; 
     }
     </style>
+"""
+
+
+def _image_b64(path: str) -> str:
+    with open(path, "rb") as img_file:
+        return base64.b64encode(img_file.read()).decode("utf-8")
+
+
+def _pandas_kind(content: Any) -> Optional[str]:
+    # pandas is only consulted if the caller already imported it (keeps headless imports light)
+    pd = sys.modules.get("pandas")
+    if pd is not None and isinstance(content, pd.DataFrame):
+        return "dataframe"
+    if pd is not None and isinstance(content, pd.Series):
+        return "series"
+    return None
+
+
+def _plain_text(content: Any, is_image: bool) -> str:
+    if is_image and isinstance(content, str):
+        return f"[image] {content}"
+    if _pandas_kind(content):
+        return content.to_string()
+    return content if isinstance(content, str) else str(content)
+
+
+# ============================================================================
+# Sinks
+# ============================================================================
+
+class UISink:
+    """
+    Destination of print_html cards. Subclasses implement emit().
+    """
+    
+    name = "base"
+    
+    def emit(self, content: Any, title: Optional[str] = None, is_image: bool = False) -> None:
+        raise NotImplementedError
+    
+    def close(self) -> None:
+        pass
+
+
+class NotebookSink(UISink):
+    """
+    Card-style HTML rendered with IPython.display (the original print_html behavior).
+    """
+    
+    name = "notebook"
+    
+    def render(self, content: Any, title: Optional[str] = None, is_image: bool = False) -> str:
+        """
+        Returns the card HTML (CSS included) without displaying it.
+        """
+        kind = _pandas_kind(content)
+        if is_image and isinstance(content, str):
+            try:
+                b64 = _image_b64(content)
+                rendered = f'<img src="data:image/png;base64,{b64}" alt="Image" style="max-width:100%; height:auto; border-radius:8px;">'
+            except Exception as e:
+                rendered = f"<pre><code>Error loading image: {escape(str(e))}</code></pre>"
+        elif kind == "dataframe":
+            rendered = content.to_html(classes="pretty-table", index=False, border=0, escape=False)
+        elif kind == "series":
+            rendered = content.to_frame().to_html(classes="pretty-table", border=0, escape=False)
+        elif isinstance(content, str):
+            rendered = f"<pre><code>{escape(content)}</code></pre>"
+        else:
+            rendered = f"<pre><code>{escape(str(content))}</code></pre>"
+        
+        title_html = f'<div class="pretty-title">{title}</div>' if title else ""
+        return f'{CARD_CSS}<div class="pretty-card">{title_html}{rendered}</div>'
+    
+    def emit(self, content: Any, title: Optional[str] = None, is_image: bool = False) -> None:
+        from IPython.display import HTML, display
+        display(HTML(self.render(content, title, is_image)))
+
+
+class TerminalSink(UISink):
+    """
+    Plain-text cards for consoles and log files.
+    """
+    
+    name = "terminal"
+    
+    def __init__(self, stream: Any = None, max_chars: Optional[int] = 4000):
+        """
+        Args:
+            stream: File-like object (default: sys.stdout at the time of each card)
+            max_chars: Longer contents are truncated (None = never)
+        """
+        self.stream = stream
+        self.max_chars = max_chars
+    
+    def emit(self, content: Any, title: Optional[str] = None, is_image: bool = False) -> None:
+        text = _plain_text(content, is_image)
+        if self.max_chars is not None and len(text) > self.max_chars:
+            text = f"{text[:self.max_chars]}\n... ({len(text) - self.max_chars} more characters)"
+        header = f"── {title} ──\n" if title else ""
+        (self.stream or sys.stdout).write(f"{header}{text}\n\n")
+
+
+class JsonlSink(UISink):
     """
+    Appends one JSON record per card ({"ts", "title", "kind", "content"}) to a trace file.
     
-    title_html = f'<div class="pretty-title">{title}</div>' if title else ""
-    card = f'<div class="pretty-card">{title_html}{rendered}</div>'
-    display(HTML(css + card))
+    Thread-safe; each record is flushed as it is written, so a crashed worker
+    still leaves a complete trace.
+    """
+    
+    name = "jsonl"
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("UI_TRACE_PATH", "ui_trace.jsonl")
+        self._file = None
+        self._lock = threading.Lock()
+    
+    def emit(self, content: Any, title: Optional[str] = None, is_image: bool = False) -> None:
+        kind = "image" if is_image and isinstance(content, str) else _pandas_kind(content) or "text"
+        record = {
+            "ts": time.time(),
+            "title": title,
+            "kind": kind,
+            "content": content if kind == "image" else _plain_text(content, False),
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+    
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class NullSink(UISink):
+    """
+    Discards every card (headless runs with no trace).
+    """
+    
+    name = "none"
+    
+    def emit(self, content: Any, title: Optional[str] = None, is_image: bool = False) -> None:
+        pass
+
+
+# ============================================================================
+# Sink Selection
+# ============================================================================
+
+SINKS = {"notebook": NotebookSink, "terminal": TerminalSink, "jsonl": JsonlSink, "none": NullSink}
+
+_active: Optional[UISink] = None
+
+
+def _in_notebook() -> bool:
+    # A Jupyter kernel has already imported ipykernel; plain Python / IPython terminals have not
+    return "ipykernel" in sys.modules
+
+
+def make_ui_sink(kind: str, **kwargs: Any) -> UISink:
+    """
+    Builds a sink by name ("notebook", "terminal", "jsonl", "none" or "auto").
+    """
+    kind = kind.lower()
+    if kind == "auto":
+        kind = "notebook" if _in_notebook() else "terminal"
+    if kind not in SINKS:
+        raise ValueError(f"Unknown UI sink '{kind}' (expected one of: auto, {', '.join(SINKS)})")
+    return SINKS[kind](**kwargs)
+
+
+def get_ui_sink() -> UISink:
+    """
+    Returns the active sink, creating it from UI_SINK on first use.
+    """
+    global _active
+    if _active is None:
+        _active = make_ui_sink(os.getenv("UI_SINK", "auto"))
+    return _active
+
+
+def set_ui_sink(sink: Union[str, UISink], **kwargs: Any) -> UISink:
+    """
+    Replaces the process-wide sink (a UISink instance or a name plus sink options).
+    """
+    global _active
+    _active = make_ui_sink(sink, **kwargs) if isinstance(sink, str) else sink
+    return _active
+
+
+@contextmanager
+def use_ui_sink(sink: Union[str, UISink], **kwargs: Any) -> Iterator[UISink]:
+    """
+    Routes print_html to a sink for the duration of the block (sinks created here
+    from a name are closed afterwards).
+    """
+    global _active
+    previous = _active
+    active = set_ui_sink(sink, **kwargs)
+    try:
+        yield active
+    finally:
+        _active = previous
+        if isinstance(sink, str):
+            active.close()
+
+
+# ============================================================================
+# print_html
+# ============================================================================
+
+def print_html(content: Any, title: Optional[str] = None, is_image: bool = False):
+    """
+    Renders content in a beautiful card-style UI within Jupyter Notebooks, or
+    sends it to the active headless sink (see get_ui_sink).
+    
+    Features:
+    - Multimodal rendering (Images, DataFrames, Code)
+    - Scoped CSS (prevents global style pollution)
+    - Visual hierarchy with titles
+    
+    Args:
+        content: The content to display.
+            - str + is_image=True: Path to image file (embedded as Base64)
+            - pd.DataFrame/Series: Rendered as HTML table
+            - Other: Rendered as code block (<pre><code>)
+        title: Optional title for the card.
+        is_image: Set to True if content is an image file path.
+    
+    Examples:
+        >>> print_html(code, title="📝 Generated Code")
+        >>> print_html("chart.png", title="📊 Visualization", is_image=True)
+        >>> print_html(df.head(), title="📋 Data Preview")
+    """
+    get_ui_sink().emit(content, title, is_image)
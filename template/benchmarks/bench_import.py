@@ -0,0 +1,75 @@
+"""
+Import-Time Benchmark for `core`
+
+Measures the cold-start cost of `import core` in fresh interpreters and exits
+with status 1 when:
+1. The median import time exceeds the budget, or
+2. A provider SDK / heavy UI dependency was imported eagerly.
+
+Usage (from the template/ directory):
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --budget-ms 60 --runs 20
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+TEMPLATE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported on first use
+LAZY_MODULES = ("openai", "anthropic", "httpx", "dotenv", "pandas", "IPython")
+
+SNIPPET = f"""
+import sys, json, time
+t0 = time.perf_counter()
+import core
+elapsed_ms = (time.perf_counter() - t0) * 1000
+eager = [m for m in {LAZY_MODULES!r} if m in sys.modules]
+print(json.dumps({{"ms": elapsed_ms, "eager": eager}}))
+"""
+
+
+def measure_once() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", SNIPPET],
+        cwd=TEMPLATE_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark `import core` cold-start time.")
+    parser.add_argument("--runs", type=int, default=10, help="Number of fresh interpreters")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("CORE_IMPORT_BUDGET_MS", 100)),
+                        help="Maximum allowed median import time in milliseconds")
+    args = parser.parse_args()
+
+    samples = [measure_once() for _ in range(args.runs)]
+    times = sorted(s["ms"] for s in samples)
+    eager = sorted({m for s in samples for m in s["eager"]})
+    median = statistics.median(times)
+
+    print(f"import core: median {median:.2f} ms | min {times[0]:.2f} ms | max {times[-1]:.2f} ms "
+          f"({args.runs} runs, budget {args.budget_ms:.0f} ms)")
+
+    ok = True
+    if eager:
+        print(f"❌ Eagerly imported: {', '.join(eager)}")
+        ok = False
+    if median > args.budget_ms:
+        print(f"❌ Over budget by {median - args.budget_ms:.2f} ms")
+        ok = False
+    if ok:
+        print("✅ Within budget")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+JSON / List Extraction Benchmark for `core.safe_parsing`
+
+Checks the balanced scanner (find_json / extract_json / extract_python_list /
+extract_json_from_stream) and the local JSON repair pass (extract_json_with_repair)
+against a corpus of tricky LLM replies, fuzzes them, and times the scanner against
+the regex / split extraction paths the agents used before.
+
+It exits with status 1 when:
+1. A corpus case does not produce its expected value,
+2. Streaming the reply in random chunks gives a different value than parsing it
+   in one piece, or
+3. A randomly mutated reply makes the scanner or the repair pass raise, or
+4. The scanner returns the wrong value for one of the large timed replies.
+
+Timed replies where the scanner is slower than the previous path are listed at
+the end (a warning, not a failure). Object-only scans jump between double quotes,
+so the one expected case is a reply whose long code is full of double-quoted
+strings: the scanner falls back to one regex pass over the whole text, while the
+previous path searched only for the closing ```json fence.
+
+Usage (from the template/ directory):
+    python benchmarks/bench_json_extract.py
+    python benchmarks/bench_json_extract.py --size-kb 512 --fuzz 2000 --seed 7
+"""
+
+import os
+import re
+import sys
+import ast
+import json
+import time
+import random
+import argparse
+
+TEMPLATE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TEMPLATE_ROOT)
+
+from core.safe_parsing import (  # noqa: E402
+    extract_json,
+    extract_json_from_stream,
+    extract_json_with_repair,
+    extract_python_list,
+)
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "json_extract_corpus.jsonl")
+
+EXTRACTORS = {
+    "json": lambda text: extract_json(text),
+    "json_object": lambda text: extract_json(text, openers="{", expect=dict),
+    "list": extract_python_list,
+    "json_repair": lambda text: extract_json_with_repair(text, openers="{", expect=dict)[0],
+}
+
+
+def load_corpus() -> list:
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ============================================================================
+# Previous extraction paths (for timing only)
+# ============================================================================
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+
+
+def legacy_find_rfind(text: str):
+    """
+    structured.extract_json_text: fenced block, else first '{' to last '}'.
+    """
+    m = _FENCE_RE.search(text)
+    if m:
+        candidate = m.group(1)
+    else:
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            return None
+        candidate = text[start:end + 1]
+    try:
+        return json.loads(candidate)
+    except ValueError:
+        return None
+
+
+def legacy_fence_split(text: str):
+    """
+    ReAct._parse_json_output / evaluate_result: strip fences, then json.loads.
+    """
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0]
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0]
+    try:
+        return json.loads(text.strip())
+    except ValueError:
+        return None
+
+
+def legacy_first_line(text: str):
+    """
+    reflect_on_image_and_regenerate: JSON on the first line, code after it.
+    """
+    try:
+        return json.loads(text.strip().splitlines()[0])
+    except (ValueError, IndexError):
+        return None
+
+
+def legacy_list_split(text: str):
+    """
+    Plan_and_solve._parse_plan: ```python fence split, then ast.literal_eval.
+    """
+    try:
+        return ast.literal_eval(text.split("```python")[1].split("```")[0].strip())
+    except (ValueError, SyntaxError, IndexError):
+        return None
+
+
+# ============================================================================
+# Correctness
+# ============================================================================
+
+def check_corpus(cases: list) -> int:
+    failures = 0
+    for case in cases:
+        got = EXTRACTORS[case["kind"]](case["text"])
+        if got != case["expect"]:
+            failures += 1
+            print(f"❌ {case['name']}: expected {case['expect']!r}, got {got!r}")
+    print(f"corpus: {len(cases) - failures}/{len(cases)} cases correct")
+    return failures
+
+
+def random_chunks(text: str, rng: random.Random) -> list:
+    chunks, i = [], 0
+    while i < len(text):
+        step = rng.randint(1, 12)
+        chunks.append(text[i:i + step])
+        i += step
+    return chunks
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    chars = list(text)
+    for _ in range(rng.randint(1, 6)):
+        op = rng.random()
+        pos = rng.randint(0, len(chars))
+        if op < 0.4:
+            chars.insert(pos, rng.choice('{}[]"\'\\,:\n'))
+        elif op < 0.8 and chars:
+            del chars[min(pos, len(chars) - 1)]
+        else:
+            chars[pos:pos] = chars[:rng.randint(0, len(chars))]
+    return "".join(chars)
+
+
+def fuzz(cases: list, rounds: int, rng: random.Random) -> int:
+    """
+    Random chunkings must agree with one-piece parsing; mutations must never raise.
+    """
+    failures = 0
+    json_cases = [c for c in cases if c["kind"] != "list"]
+    for _ in range(rounds):
+        case = rng.choice(json_cases)
+        openers, expect = ("{[", None) if case["kind"] == "json" else ("{", dict)
+        text = mutate(case["text"], rng) if rng.random() < 0.5 else case["text"]
+        try:
+            batch = extract_json(text, openers=openers, expect=expect)
+            streamed = extract_json_from_stream(random_chunks(text, rng), openers=openers, expect=expect)
+            extract_python_list(text)
+            extract_json_with_repair(text, openers=openers, expect=expect)
+        except Exception as e:
+            failures += 1
+            print(f"❌ {case['name']}: {type(e).__name__}: {e} on {text!r}")
+            continue
+        if streamed["value"] != batch:
+            failures += 1
+            print(f"❌ {case['name']}: stream {streamed['value']!r} != batch {batch!r} on {text!r}")
+    print(f"fuzz: {rounds - failures}/{rounds} rounds consistent")
+    return failures
+
+
+# ============================================================================
+# Timing
+# ============================================================================
+
+def large_replies(size_kb: int) -> dict:
+    """
+    Realistic worst cases: the value sits next to a long explanation or code listing.
+    """
+    def repeat(unit: str) -> str:
+        return "".join(unit.format(i=i) for i in range(size_kb * 1024 // len(unit)))
+
+    code = repeat("row_{i} = {{'a': [1, 2]}}; plot(x[0]) # see [note]\n")
+    # Double-quoted strings everywhere: the scanner cannot jump between quotes here
+    quoted_code = repeat('plt.title("Sales {i}"); y = df["price"][0]; print(f"{{y}} done")\n')
+    prose = repeat("Step {i} of the analysis uses [brackets] and {{braces}} in prose.\n")
+    action = {"thought": "done", "action": {"name": "Finish", "args": {"answer": "42"}}}
+    plan = ["收集数据", "计算结果", "总结答案"]
+    action_json = json.dumps(action, ensure_ascii=False)
+    plan_src = json.dumps(plan, ensure_ascii=False)
+    return {
+        "json first, long code after": (action_json + "\n```python\n" + code + "```", "json_object", action, legacy_first_line),
+        "json after long code": (code + "```json\n" + action_json + "\n```", "json_object", action, legacy_find_rfind),
+        "json after quote-heavy code": (quoted_code + "```json\n" + action_json + "\n```", "json_object", action,
+                                        legacy_find_rfind),
+        "bare json between code blocks": (code + action_json + "\n" + code, "json_object", action, legacy_find_rfind),
+        "fenced json, long tail": ("```json\n" + action_json + "\n```\n" + code, "json_object", action, legacy_fence_split),
+        "plan after long prose": (prose + "```python\n" + plan_src + "\n```", "list", plan, legacy_list_split),
+    }
+
+
+def best_time(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark and fuzz the balanced JSON / list extractor.")
+    parser.add_argument("--size-kb", type=int, default=256, help="Approximate size of the large replies")
+    parser.add_argument("--repeat", type=int, default=20, help="Timing repetitions (best is reported)")
+    parser.add_argument("--fuzz", type=int, default=500, help="Number of fuzz rounds")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the fuzzer")
+    args = parser.parse_args()
+
+    cases = load_corpus()
+    failures = check_corpus(cases) + fuzz(cases, args.fuzz, random.Random(args.seed))
+
+    print(f"\n{'reply (~' + str(args.size_kb) + ' KB)':<34} {'scanner':>10} {'previous':>10} {'speedup':>8}  correct")
+    slower = []
+    for name, (text, kind, expected, legacy) in large_replies(args.size_kb).items():
+        scanner_ms = best_time(EXTRACTORS[kind], text, args.repeat)
+        legacy_ms = best_time(legacy, text, args.repeat)
+        scanner_ok = EXTRACTORS[kind](text) == expected
+        legacy_ok = legacy(text) == expected
+        failures += not scanner_ok
+        if scanner_ms > legacy_ms:
+            slower.append(name)
+        print(f"{name:<34} {scanner_ms:>8.2f}ms {legacy_ms:>8.2f}ms {legacy_ms / scanner_ms:>7.1f}x  "
+              f"{'yes' if scanner_ok else 'NO'} / {'yes' if legacy_ok else 'NO'}")
+
+    if slower:
+        # Not a failure: the scanner keeps first-value semantics and one regex pass over the
+        # text, while the previous fence / rfind paths jump straight to a fence at the end
+        # (and return the wrong value for unfenced replies)
+        print(f"\n⚠️  Scanner slower than the previous path on: {', '.join(slower)}")
+    if failures:
+        print(f"\n❌ {failures} correctness failure(s)")
+        return 1
+    print("\n✅ Corpus and fuzz checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,386 @@
+"""
+Offline Mock LLM Server
+
+A local stand-in for LLM providers that speaks both wire formats used by core:
+1. OpenAI-compatible  POST .../chat/completions   (Qwen, GLM, DeepSeek, Kimi, OpenAI)
+2. Anthropic Messages POST .../messages
+
+Both support streaming (SSE). Responses come from a script of regex rules (or an
+echo template), with configurable latency distributions and error injection, so
+agents can be load-tested without tokens or vendor latency.
+
+Usage (from the template/ directory):
+    python benchmarks/mock_llm_server.py --port 8765 --latency lognormal:-1.2,0.5 --error-rate 0.02
+
+Point the existing clients at it (any non-empty API key works):
+    QWEN_BASE_URL=http://127.0.0.1:8765/v1        QWEN_API_KEY=mock
+    ZHIPU_BASE_URL=http://127.0.0.1:8765/v1       ZHIPU_API_KEY=mock
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8765/v1    DEEPSEEK_API_KEY=mock
+    MOONSHOT_BASE_URL=http://127.0.0.1:8765/v1    MOONSHOT_API_KEY=mock
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1      OPENAI_API_KEY=mock
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765      ANTHROPIC_API_KEY=mock
+    LLM_BASE_URL=http://127.0.0.1:8765/v1         LLM_API_KEY=mock   (HelloAgentsLLM)
+
+Script file format (JSON):
+    {
+      "rules": [
+        {"match": "Search|天气", "response": "{\"thought\": \"...\", \"action\": {\"name\": \"Finish\", \"args\": {\"answer\": \"晴\"}}}"},
+        {"match": "execute_python", "response": "<execute_python>\nprint('hi')\n</execute_python>"}
+      ],
+      "default": "mock reply from {model}: {prompt}"
+    }
+Rules are tried in order against the last user message (regex search); templates may
+use {model}, {prompt} and {n} (request counter).
+"""
+
+import re
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# ============================================================================
+# 1. Behaviour Configuration
+# ============================================================================
+
+class LatencyModel:
+    """
+    Samples a delay in seconds from "fixed:S", "uniform:A,B", "normal:MU,SIGMA"
+    or "lognormal:MU,SIGMA" (parameters of the underlying normal, in log-seconds).
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            return p[0] if p else 0.0
+        if self.kind == "uniform":
+            return rng.uniform(p[0], p[1])
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(p[0], p[1]))
+        return math.exp(rng.gauss(p[0], p[1]))
+
+
+class MockBehaviour:
+    """
+    Everything the handler needs to decide what to answer and when.
+    """
+
+    def __init__(
+        self,
+        script: Optional[Dict[str, Any]] = None,
+        latency: str = "fixed:0",
+        token_interval: float = 0.0,
+        chunk_chars: int = 8,
+        error_rate: float = 0.0,
+        error_statuses: Tuple[int, ...] = (429, 500, 503),
+        retry_after: Optional[float] = 1.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            script: {"rules": [{"match", "response"}], "default": template}
+            latency: Time-to-first-byte distribution (see LatencyModel)
+            token_interval: Delay between streamed chunks (seconds)
+            chunk_chars: Characters per streamed chunk
+            error_rate: Probability of answering with an injected error
+            error_statuses: Status codes to pick from for injected errors
+            retry_after: Retry-After header (seconds) sent with 429s (None = omit)
+            seed: RNG seed for reproducible runs
+        """
+        script = script or {}
+        self.rules = [(re.compile(r["match"]), r["response"]) for r in script.get("rules", [])]
+        self.default = script.get("default", "mock reply from {model}: {prompt}")
+        self.latency = LatencyModel(latency)
+        self.token_interval = token_interval
+        self.chunk_chars = max(1, chunk_chars)
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def next_request(self) -> Tuple[int, float, Optional[int]]:
+        """
+        Returns (request_number, delay, injected_status_or_None).
+        """
+        with self._lock:
+            self.requests += 1
+            delay = self.latency.sample(self._rng)
+            status = None
+            if self.error_rate and self._rng.random() < self.error_rate:
+                status = self._rng.choice(self.error_statuses)
+                self.errors += 1
+            return self.requests, delay, status
+
+    def reply(self, model: str, prompt: str, n: int) -> str:
+        template = self.default
+        for pattern, response in self.rules:
+            if pattern.search(prompt):
+                template = response
+                break
+        # Plain replace (not str.format) so JSON braces in scripted responses survive
+        return template.replace("{model}", model).replace("{prompt}", prompt).replace("{n}", str(n))
+
+
+def _text_of(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# ============================================================================
+# 2. HTTP Handler
+# ============================================================================
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    behaviour: MockBehaviour = MockBehaviour()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:  # Keep load tests quiet
+        pass
+
+    # ------------------------------------------------------------------
+    # Plumbing
+    # ------------------------------------------------------------------
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_sse(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _sse(self, data: str, event: Optional[str] = None) -> None:
+        payload = (f"event: {event}\n" if event else "") + f"data: {data}\n\n"
+        self.wfile.write(payload.encode("utf-8"))
+        self.wfile.flush()
+
+    def _chunks(self, text: str) -> List[str]:
+        size = self.behaviour.chunk_chars
+        return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+    def _send_error(self, status: int, anthropic: bool) -> None:
+        kind = "rate_limit_error" if status == 429 else "overloaded_error" if status in (503, 529) else "api_error"
+        headers = {}
+        if status == 429 and self.behaviour.retry_after is not None:
+            headers["retry-after"] = f"{self.behaviour.retry_after:g}"
+        message = f"Injected mock error ({status})"
+        if anthropic:
+            body = {"type": "error", "error": {"type": kind, "message": message}}
+        else:
+            body = {"error": {"message": message, "type": kind, "code": str(status)}}
+        self._send_json(status, body, headers)
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/health"):
+            b = self.behaviour
+            self._send_json(200, {"status": "ok", "requests": b.requests, "errors": b.errors})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "invalid JSON body"}})
+            return
+
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            anthropic = False
+        elif path.endswith("/messages"):
+            anthropic = True
+        else:
+            self._send_json(404, {"error": {"message": f"unknown endpoint {self.path}"}})
+            return
+
+        n, delay, error_status = self.behaviour.next_request()
+        time.sleep(delay)
+        if error_status is not None:
+            self._send_error(error_status, anthropic)
+            return
+
+        model = body.get("model", "mock-model")
+        messages = body.get("messages") or [{"role": "user", "content": ""}]
+        prompt = _text_of(messages[-1].get("content"))
+        text = self.behaviour.reply(model, prompt, n)
+        input_tokens = _estimate_tokens(_text_of(body.get("system")) + "".join(_text_of(m.get("content")) for m in messages))
+        output_tokens = _estimate_tokens(text)
+
+        if anthropic:
+            self._anthropic(body, model, text, n, input_tokens, output_tokens)
+        else:
+            self._openai(body, model, text, n, input_tokens, output_tokens)
+
+    # ------------------------------------------------------------------
+    # Wire formats
+    # ------------------------------------------------------------------
+
+    def _openai(self, body: Dict[str, Any], model: str, text: str, n: int, input_tokens: int, output_tokens: int) -> None:
+        completion_id = f"chatcmpl-mock-{n}"
+        created = int(time.time())
+        usage = {"prompt_tokens": input_tokens, "completion_tokens": output_tokens,
+                 "total_tokens": input_tokens + output_tokens}
+
+        if not body.get("stream"):
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self._start_sse()
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model}
+        for i, piece in enumerate(self._chunks(text)):
+            if i:
+                time.sleep(self.behaviour.token_interval)
+            delta = {"role": "assistant", "content": piece} if i == 0 else {"content": piece}
+            self._sse(json.dumps(dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}]), ensure_ascii=False))
+        self._sse(json.dumps(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._sse(json.dumps(dict(base, choices=[], usage=usage)))
+        self._sse("[DONE]")
+
+    def _anthropic(self, body: Dict[str, Any], model: str, text: str, n: int, input_tokens: int, output_tokens: int) -> None:
+        message = {
+            "id": f"msg_mock_{n}",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+        }
+        if not body.get("stream"):
+            self._send_json(200, message)
+            return
+
+        self._start_sse()
+        start = dict(message, content=[], stop_reason=None, usage={"input_tokens": input_tokens, "output_tokens": 0})
+        self._sse(json.dumps({"type": "message_start", "message": start}), "message_start")
+        self._sse(json.dumps({"type": "content_block_start", "index": 0,
+                              "content_block": {"type": "text", "text": ""}}), "content_block_start")
+        for i, piece in enumerate(self._chunks(text)):
+            if i:
+                time.sleep(self.behaviour.token_interval)
+            self._sse(json.dumps({"type": "content_block_delta", "index": 0,
+                                  "delta": {"type": "text_delta", "text": piece}}, ensure_ascii=False),
+                      "content_block_delta")
+        self._sse(json.dumps({"type": "content_block_stop", "index": 0}), "content_block_stop")
+        self._sse(json.dumps({"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                              "usage": {"output_tokens": output_tokens}}), "message_delta")
+        self._sse(json.dumps({"type": "message_stop"}), "message_stop")
+
+
+# ============================================================================
+# 3. Entry Points
+# ============================================================================
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0,
+                      behaviour: Optional[MockBehaviour] = None) -> ThreadingHTTPServer:
+    """
+    Starts the mock server on a background thread.
+
+    Args:
+        host: Bind address
+        port: Port (0 = pick a free one; read it back from server.server_address)
+        behaviour: Response script / latency / error configuration
+
+    Returns:
+        The running server (call .shutdown() to stop it).
+    """
+    handler = type("ConfiguredMockLLMHandler", (MockLLMHandler,), {"behaviour": behaviour or MockBehaviour()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-llm-server", daemon=True).start()
+    return server
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline OpenAI/Anthropic-compatible mock LLM server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--script", help="JSON file with response rules (see module docstring)")
+    parser.add_argument("--latency", default="fixed:0",
+                        help='Time to first byte, e.g. "fixed:0.3", "uniform:0.1,0.8", "lognormal:-1.2,0.5"')
+    parser.add_argument("--token-interval", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--chunk-chars", type=int, default=8, help="Characters per streamed chunk")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of an injected error")
+    parser.add_argument("--error-statuses", default="429,500,503", help="Comma separated status codes")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429 (-1 = omit)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+
+    behaviour = MockBehaviour(
+        script=script,
+        latency=args.latency,
+        token_interval=args.token_interval,
+        chunk_chars=args.chunk_chars,
+        error_rate=args.error_rate,
+        error_statuses=tuple(int(s) for s in args.error_statuses.split(",") if s),
+        retry_after=None if args.retry_after < 0 else args.retry_after,
+        seed=args.seed,
+    )
+    handler = type("ConfiguredMockLLMHandler", (MockLLMHandler,), {"behaviour": behaviour})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    print(f"🧪 Mock LLM server listening on http://{args.host}:{args.port} "
+          f"(OpenAI: /v1/chat/completions, Anthropic: /v1/messages)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
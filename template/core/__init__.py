@@ -4,7 +4,64 @@ from .llm_client import (
     image_anthropic_call,
     image_openai_call,
     check_api_keys,
-    encode_image_b64
+    encode_image_b64,
+    aget_response,
+    aimage_anthropic_call,
+    aimage_openai_call,
+    aclose_async_clients,
+    enable_response_cache,
+    disable_response_cache,
+    get_response_cache,
+    get_responses,
+    aget_responses,
+    configure_bulkhead,
+    bulkhead_stats,
+    stream_response,
+    astream_response,
+    StreamDelta
+)
+from .resilience import RetryPolicy, configure_retries, configure_hedging
+from .router import router, configure_tiers, CircuitOpenError
+from .registry import registry
+from .bulkhead import BulkheadRejectedError
+from .metrics import metrics
+from .singleflight import singleflight
+from .cassette import Cassette, use_cassette, CassetteMissError
+from .blob_cache import blob_cache
+from .structured import parse_structured, structured_stats
+from .cascade import (
+    cascade_response,
+    acascade_response,
+    cascade_stats,
+    validate_code,
+    validate_json_action,
+    validate_plan,
+    schema_validator,
+)
+from .semantic_cache import SemanticCache, enable_semantic_cache, disable_semantic_cache, get_semantic_cache
+from .image_prep import prepare_image, configure_image_profile
+from .ui_utils import (
+    print_html,
+    use_ui_sink,
+    set_ui_sink,
+    get_ui_sink,
+    UISink,
+    NotebookSink,
+    TerminalSink,
+    JsonlSink,
+    NullSink,
+)
+from .safe_parsing import (
+    ensure_execute_python_tags,
+    extract_code_from_tags,
+    CodeStreamExtractor,
+    extract_code_from_stream,
+    BalancedScanner,
+    find_json,
+    extract_json,
+    extract_python_list,
+    extract_json_from_stream,
+    repair_json,
+    extract_json_with_repair,
+    repair_stats,
 )
-from .ui_utils import print_html
-from .safe_parsing import ensure_execute_python_tags, extract_code_from_tags
@@ -0,0 +1,143 @@
+"""
+Token Budgeting for LLM Calls
+
+Sizes every request before it is sent:
+1. Estimates prompt tokens (fast heuristic, no tokenizer download)
+2. Caps output tokens by task type (plan list, JSON action, code block, ...)
+3. Rejects prompts that cannot fit the model's context window next to the output cap
+4. Detects overruns afterwards (generation stopped by the max_tokens limit)
+"""
+
+import os
+import re
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+# Output caps per task type; pass task=... to get_response / image_*_call
+TASK_MAX_TOKENS: Dict[str, int] = {
+    "default": 2000,
+    "plan": 600,          # Python-list / numbered plan
+    "json_action": 400,   # Single ReAct-style JSON action
+    "code": 1500,         # One <execute_python> / fenced code block
+    "image_json": 2000,   # Multimodal critique returning JSON
+}
+
+# Fallback context windows (tokens), matched by substring in order; first match wins
+CONTEXT_WINDOWS = (
+    ("claude", 200_000),
+    ("gpt-4o", 128_000),
+    ("gpt-4-turbo", 128_000),
+    ("gpt-4", 8_192),
+    ("gpt-3.5", 16_385),
+    ("qwen-long", 1_000_000),
+    ("qwen", 131_072),
+    ("glm-4v", 8_192),
+    ("glm", 128_000),
+    ("deepseek", 64_000),
+    ("moonshot-v1-8k", 8_192),
+    ("moonshot-v1-32k", 32_768),
+    ("moonshot", 131_072),
+    ("kimi", 131_072),
+)
+DEFAULT_CONTEXT_WINDOW = 32_768
+
+# CJK ideographs / kana / hangul are roughly one token each; other text ~4 chars per token
+_CJK_RE = re.compile("[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate that errs on the high side for mixed Chinese/English text.
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def context_window(model: str) -> int:
+    # The model registry (config/models.json) takes precedence over the built-in table
+    from .registry import registry
+    window = registry.lookup(model).get("context_window")
+    if window:
+        return int(window)
+    model_lower = model.lower()
+    for marker, window in CONTEXT_WINDOWS:
+        if marker in model_lower:
+            return window
+    return DEFAULT_CONTEXT_WINDOW
+
+
+@dataclass
+class TokenBudget:
+    """
+    Planned token usage of one call.
+    """
+    model: str
+    task: str
+    prompt_tokens: int       # Estimated
+    max_tokens: int          # Output cap sent to the provider
+    max_prompt_tokens: int   # Largest prompt that still fits
+
+    @property
+    def fits(self) -> bool:
+        return self.prompt_tokens <= self.max_prompt_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def plan_budget(model: str, prompt: str, task: Optional[str] = None, max_tokens: Optional[int] = None) -> TokenBudget:
+    """
+    Computes the output cap and prompt limit for a call.
+
+    Args:
+        model: Resolved model name
+        prompt: Prompt text (images are not counted)
+        task: Key of TASK_MAX_TOKENS (default: "default")
+        max_tokens: Explicit output cap (overrides the task cap)
+
+    Environment:
+        LLM_MAX_PROMPT_TOKENS: Optional hard ceiling on prompt size, below the context window
+    """
+    task = task or "default"
+    if task not in TASK_MAX_TOKENS:
+        raise ValueError(f"Unknown task type '{task}'. Expected one of: {', '.join(TASK_MAX_TOKENS)}")
+    output_cap = max_tokens or TASK_MAX_TOKENS[task]
+
+    prompt_limit = context_window(model) - output_cap
+    ceiling = os.getenv("LLM_MAX_PROMPT_TOKENS")
+    if ceiling:
+        prompt_limit = min(prompt_limit, int(ceiling))
+
+    return TokenBudget(
+        model=model,
+        task=task,
+        prompt_tokens=estimate_tokens(prompt),
+        max_tokens=output_cap,
+        max_prompt_tokens=max(0, prompt_limit),
+    )
+
+
+def rejection_message(budget: TokenBudget) -> str:
+    return (
+        f"Error: Prompt of ~{budget.prompt_tokens} tokens exceeds the budget of {budget.max_prompt_tokens} "
+        f"tokens for '{budget.model}' (output reserved: {budget.max_tokens}). Shorten the prompt or its context."
+    )
+
+
+def budget_overrun(budget: TokenBudget, response: Any = None) -> Optional[str]:
+    """
+    Returns "prompt_too_large", "max_tokens" (output truncated by the cap) or None.
+    """
+    if not budget.fits:
+        return "prompt_too_large"
+    if response is None:
+        return None
+    # Anthropic: stop_reason; OpenAI-compatible: choices[0].finish_reason
+    if getattr(response, "stop_reason", None) == "max_tokens":
+        return "max_tokens"
+    choices = getattr(response, "choices", None)
+    if choices and getattr(choices[0], "finish_reason", None) == "length":
+        return "max_tokens"
+    return None
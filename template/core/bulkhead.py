@@ -0,0 +1,258 @@
+"""
+Per-Provider Bulkheads
+
+A burst of batch jobs against one vendor must not exhaust its rate limit and starve
+interactive sessions. Each provider therefore gets a bulkhead: a fixed number of
+in-flight calls plus a bounded FIFO wait queue.
+
+It handles:
+1. One limit shared by every thread and every event loop in the process
+2. Backpressure policies: reject when the queue is full (max_queue=0 = fail fast)
+   and give up after queue_timeout seconds of waiting
+3. Queue depth / in-flight gauges, wait-time histograms and rejection counters
+   (see metrics.py) for sizing concurrency per vendor
+
+Rejected calls raise BulkheadRejectedError; it is not retried, so callers see the
+backpressure instead of piling more work onto the queue.
+
+Usage:
+    >>> bulkhead = Bulkhead("qwen", limit=8, max_queue=32, queue_timeout=60)
+    >>> with bulkhead.slot():
+    ...     response = client.chat.completions.create(...)
+"""
+
+import time
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional
+
+from .metrics import metrics
+
+# Seconds; queue waits are usually far shorter than the calls themselves
+WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_KEEP: Any = object()
+
+
+class BulkheadRejectedError(RuntimeError):
+    """
+    Raised when a call is not admitted: the wait queue is full or the wait timed out.
+    """
+
+    def __init__(self, provider: str, reason: str, message: str):
+        super().__init__(message)
+        self.provider = provider
+        self.reason = reason
+
+
+class _Waiter:
+    """
+    A queued caller: a thread (event) or a coroutine (loop + future).
+    """
+
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(self, loop: Any = None):
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+        self.event = threading.Event() if loop is None else None
+        self.granted = False
+
+    def wake(self) -> bool:
+        if self.loop is None:
+            self.event.set()
+            return True
+        if self.loop.is_closed():
+            return False
+        self.loop.call_soon_threadsafe(_resolve, self.future)
+        return True
+
+
+def _resolve(future: Any) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class Bulkhead:
+    """
+    Concurrency limit + bounded FIFO queue for one provider.
+
+    Thread-safe and usable from any number of event loops at once; a released slot
+    is handed directly to the oldest waiter, so queued callers are served in order.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: Optional[int] = 64,
+                 queue_timeout: Optional[float] = 120.0):
+        """
+        Args:
+            name: Provider key (used as the metrics label)
+            limit: Maximum concurrent calls
+            max_queue: Maximum waiting callers (0 = reject as soon as all slots are
+                busy, None = unbounded)
+            queue_timeout: Maximum seconds to wait for a slot (None = wait forever)
+        """
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    # ------------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------------
+
+    def _enter(self, loop: Any = None) -> Optional[_Waiter]:
+        """
+        Takes a free slot (returns None) or enqueues a waiter; raises if the queue is full.
+        """
+        with self._lock:
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                self.admitted += 1
+                self._publish()
+                return None
+            if self.max_queue is not None and len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                self._reject_locked("queue_full")
+            waiter = _Waiter(loop)
+            self._waiters.append(waiter)
+            self._publish()
+            return waiter
+
+    def _reject_locked(self, reason: str) -> None:
+        metrics.inc("llm_bulkhead_rejections_total", {"provider": self.name, "reason": reason})
+        if reason == "queue_full":
+            message = (f"Bulkhead for provider '{self.name}' is full "
+                       f"({self._in_flight} in flight, {len(self._waiters)} queued)")
+        else:
+            message = f"Timed out after {self.queue_timeout}s waiting for a '{self.name}' slot"
+        raise BulkheadRejectedError(self.name, reason, message)
+
+    def _abandon(self, waiter: _Waiter, reason: Optional[str]) -> bool:
+        """
+        Called when a waiter stops waiting. Returns True if it was granted a slot
+        meanwhile (the caller then owns it); otherwise removes it and, for a
+        timeout, raises BulkheadRejectedError.
+        """
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self._publish()
+            if reason is not None:
+                self.timed_out += 1
+                self._reject_locked(reason)
+            return False
+
+    def _admitted(self, waited: float) -> None:
+        metrics.observe("llm_bulkhead_wait_seconds", waited, {"provider": self.name}, buckets=WAIT_BUCKETS)
+
+    def release(self) -> None:
+        """
+        Frees a slot, handing it to the oldest live waiter if there is one.
+        """
+        with self._lock:
+            self._in_flight -= 1
+            self._grant_locked()
+            self._publish()
+
+    def _grant_locked(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.wake():
+                waiter.granted = True
+                self._in_flight += 1
+                self.admitted += 1
+
+    def _publish(self) -> None:
+        labels = {"provider": self.name}
+        metrics.set_gauge("llm_bulkhead_in_flight", self._in_flight, labels)
+        metrics.set_gauge("llm_bulkhead_queue_depth", len(self._waiters), labels)
+
+    # ------------------------------------------------------------------
+    # Blocking / async entry points
+    # ------------------------------------------------------------------
+
+    def acquire(self) -> None:
+        """
+        Blocks until a slot is free (see max_queue / queue_timeout for the limits).
+        """
+        start = time.perf_counter()
+        waiter = self._enter()
+        if waiter is not None and not waiter.event.wait(self.queue_timeout):
+            self._abandon(waiter, "timeout")
+        self._admitted(time.perf_counter() - start)
+
+    async def aacquire(self) -> None:
+        """
+        Async counterpart of acquire (waits without blocking the event loop).
+        """
+        import asyncio
+
+        start = time.perf_counter()
+        waiter = self._enter(asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                done, _ = await asyncio.wait({waiter.future}, timeout=self.queue_timeout)
+            except BaseException:
+                # Cancelled while queued: give back a slot that was granted meanwhile
+                if self._abandon(waiter, None):
+                    self.release()
+                raise
+            if not done:
+                self._abandon(waiter, "timeout")
+        self._admitted(time.perf_counter() - start)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[None]:
+        await self.aacquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    # ------------------------------------------------------------------
+    # Configuration / introspection
+    # ------------------------------------------------------------------
+
+    def configure(self, limit: Optional[int] = None, max_queue: Optional[int] = _KEEP,
+                  queue_timeout: Optional[float] = _KEEP) -> None:
+        """
+        Changes the limits in place; raising the limit admits queued callers at once.
+        """
+        with self._lock:
+            if limit is not None:
+                self.limit = max(1, limit)
+            if max_queue is not _KEEP:
+                self.max_queue = max_queue
+            if queue_timeout is not _KEEP:
+                self.queue_timeout = queue_timeout
+            self._grant_locked()
+            self._publish()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "queued": len(self._waiters),
+                "max_queue": self.max_queue,
+                "queue_timeout": self.queue_timeout,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
@@ -0,0 +1,221 @@
+"""
+Persistent Response Cache
+
+This module provides an opt-in, SQLite-backed cache for deterministic LLM calls.
+
+It handles:
+1. Stable cache keys (hash of model, messages and sampling parameters)
+2. A small in-memory LRU front so repeated hits never touch the disk
+3. Size-based (LRU) and age-based (TTL) eviction
+4. Hit / miss / eviction counters
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def make_cache_key(model: str, messages: Any, **params: Any) -> str:
+    """
+    Builds a stable cache key for a request.
+
+    Args:
+        model: Model name
+        messages: Prompt string or message list (anything JSON serializable)
+        **params: Sampling parameters (temperature, max_tokens, ...)
+
+    Returns:
+        Hex SHA-256 digest of the canonical JSON payload.
+    """
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed response cache with LRU + TTL eviction.
+
+    Thread-safe; a single instance can be shared by every caller in the process.
+    """
+
+    _EVICT_EVERY = 64  # Run disk eviction once every N writes
+
+    def __init__(
+        self,
+        path: str = ".llm_cache.sqlite",
+        max_entries: int = 10000,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        memory_entries: int = 1024,
+    ):
+        """
+        Args:
+            path: SQLite file path (":memory:" for a process-local cache)
+            max_entries: Maximum number of rows kept on disk (LRU beyond that)
+            ttl_seconds: Maximum entry age in seconds (None = never expire)
+            memory_entries: Size of the in-memory LRU front
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._writes = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, value: str, created_at: float) -> None:
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached value, or None on a miss (or expired entry).
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._touched[key] = now
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._expired(row[1], now):
+                self.misses += 1
+                return None
+
+            value, created_at = row
+            self._touched[key] = now
+            self._remember(key, value, created_at)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Stores a value, evicting old entries when the cache is over budget.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._remember(key, value, now)
+            self._writes += 1
+            if self._writes % self._EVICT_EVERY == 0:
+                self._evict_locked(now)
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """
+        Applies TTL and size limits immediately.
+
+        Returns:
+            Number of rows removed.
+        """
+        with self._lock:
+            removed = self._evict_locked(time.time())
+            self._conn.commit()
+            return removed
+
+    def _evict_locked(self, now: float) -> int:
+        # Flush LRU bookkeeping from memory hits before ranking rows
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(ts, key) for key, ts in self._touched.items()],
+            )
+            self._touched.clear()
+
+        removed = 0
+        if self.ttl_seconds is not None:
+            removed += self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            removed += self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            ).rowcount
+
+        if removed:
+            self._memory.clear()
+        self.evictions += removed
+        return removed
+
+    def clear(self) -> None:
+        """
+        Removes every entry (counters are kept).
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._memory.clear()
+            self._touched.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns hit/miss counters and the current number of stored entries.
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "path": self.path,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._touched:
+                self._evict_locked(time.time())
+                self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,291 @@
+"""
+Model Cascade (Cheap Model First)
+
+Most ReAct actions, plans and critic verdicts are well within reach of a small
+fast model. cascade_response() asks the cheapest configured model first, checks
+the reply with a validator and only escalates to the next (stronger) model when
+the reply is unusable.
+
+It handles:
+1. Ordered model lists per cascade name ("default", "code", ...), configurable
+   in config/models.json under "cascades" (stages may be "tier:<name>")
+2. Validators built on the existing parsers: <execute_python> code, JSON
+   actions, Python-list plans, JSON schemas, or any callable
+3. Escalation statistics per cascade (see cascade_stats) and metrics
+
+A validator takes the reply text and returns (value, None) on success or
+(None, "<reason>: <detail>") on failure, like parse_structured.
+
+Usage:
+    >>> result = cascade_response(prompt, validate_plan)
+    >>> result["value"], result["model"], result["escalated"]
+    (['Step 1', 'Step 2'], 'glm-4-flash', False)
+"""
+
+import ast
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .metrics import metrics
+from .safe_parsing import (
+    ensure_execute_python_tags,
+    extract_code_from_tags,
+    extract_json_with_repair,
+    extract_python_list,
+)
+from .structured import extract_json_text, parse_structured, validate_schema
+
+Validation = Tuple[Any, Optional[str]]
+Validator = Callable[[str], Validation]
+
+# Cascade name -> models from cheapest to strongest
+DEFAULT_CASCADES: Dict[str, List[str]] = {
+    "default": ["glm-4-flash", "qwen-plus"],
+}
+
+_cascades: Dict[str, List[str]] = {name: list(models) for name, models in DEFAULT_CASCADES.items()}
+
+
+def configure_cascades(cascades: Dict[str, List[str]]) -> None:
+    """
+    Adds or replaces cascades (called by the registry for the "cascades" config key).
+    """
+    _cascades.update({name: list(models) for name, models in cascades.items()})
+
+
+def get_cascade(name: str) -> List[str]:
+    from .registry import registry
+    registry.load()
+    if name not in _cascades:
+        raise KeyError(f"Unknown cascade '{name}' (configured: {sorted(_cascades)})")
+    return list(_cascades[name])
+
+
+# ============================================================================
+# 1. Validators
+# ============================================================================
+
+JSON_ACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {
+            "type": "object",
+            "properties": {"name": {"type": "string"}, "args": {"type": "object"}},
+            "required": ["name"],
+        }
+    },
+    "required": ["action"],
+}
+
+
+def validate_code(text: str) -> Validation:
+    """
+    Code inside <execute_python> tags (or a bare / fenced block) that compiles.
+    """
+    code = extract_code_from_tags(text) or extract_code_from_tags(ensure_execute_python_tags(text))
+    if not code:
+        return None, "no_code: reply contains no code"
+    try:
+        ast.parse(code)
+    except SyntaxError as e:
+        return None, f"syntax_error: line {e.lineno}: {e.msg}"
+    return code, None
+
+
+def validate_json_action(text: str) -> Validation:
+    """
+    A ReAct JSON action: {"thought": ..., "action": {"name": ..., "args": {...}}}.
+    
+    Common defects (trailing commas, single quotes, missing closing braces, ...) are
+    repaired locally instead of escalating; see repair_stats["cascade"].
+    """
+    data, _ = extract_json_with_repair(text, openers="{", expect=dict, agent="cascade")
+    if data is None:
+        try:
+            data = json.loads(extract_json_text(text))
+        except ValueError as e:
+            return None, f"parse_error: {e}"
+    errors = validate_schema(data, JSON_ACTION_SCHEMA)
+    if errors:
+        return None, "schema_error: " + "; ".join(errors)
+    return data, None
+
+
+def validate_plan(text: str) -> Validation:
+    """
+    A non-empty Python list of step strings, optionally inside a ```python fence.
+    """
+    plan = extract_python_list(text)
+    if plan is None:
+        return None, "parse_error: no list literal found"
+    if not plan or not all(isinstance(step, str) for step in plan):
+        return None, "schema_error: expected a non-empty list of strings"
+    return plan, None
+
+
+def schema_validator(schema: Dict[str, Any]) -> Validator:
+    """
+    Validator for JSON replies matching a JSON schema (see structured.py).
+    """
+    def validate(text: str) -> Validation:
+        data, error = parse_structured(text, schema)
+        return (None, error) if error else (data, None)
+    return validate
+
+
+# ============================================================================
+# 2. Escalation Statistics
+# ============================================================================
+
+class CascadeStats:
+    """
+    Counts cascade calls, escalations and the model that finally served each call.
+
+    Use the module-level `cascade_stats` instance.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, cascade: str, attempts: List[Dict[str, Any]], served_by: Optional[str]) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(cascade, {"calls": 0, "escalations": 0, "failed": 0, "served_by": {}})
+            counts["calls"] += 1
+            if len(attempts) > 1:
+                counts["escalations"] += 1
+            if served_by is None:
+                counts["failed"] += 1
+            else:
+                counts["served_by"][served_by] = counts["served_by"].get(served_by, 0) + 1
+
+    def escalation_rate(self, cascade: Optional[str] = None) -> float:
+        """
+        Share of cascade calls that needed more than the first model.
+        """
+        with self._lock:
+            rows = [self._counts.get(cascade)] if cascade else list(self._counts.values())
+            calls = sum(r["calls"] for r in rows if r)
+            escalations = sum(r["escalations"] for r in rows if r)
+        return escalations / calls if calls else 0.0
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: dict(counts, served_by=dict(counts["served_by"]),
+                           escalation_rate=counts["escalations"] / counts["calls"])
+                for name, counts in self._counts.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+cascade_stats = CascadeStats()
+
+
+# ============================================================================
+# 3. Cascade Calls
+# ============================================================================
+
+def _check(text: Any, validator: Validator) -> Validation:
+    if not isinstance(text, str):
+        return None, "error: no reply"
+    if text.startswith("Error:"):
+        return None, "error: " + text[len("Error:"):].strip()
+    return validator(text)
+
+
+def _attempt_failed(cascade: str, model: str, error: str, attempts: List[Dict[str, Any]]) -> None:
+    attempts.append({"model": model, "error": error})
+    metrics.inc("llm_cascade_escalations_total", {"cascade": cascade, "model": model,
+                                                  "reason": error.split(":", 1)[0]})
+
+
+def _cascade_result(cascade: str, text: Optional[str], value: Any, attempts: List[Dict[str, Any]],
+                    served_by: Optional[str]) -> Dict[str, Any]:
+    cascade_stats.record(cascade, attempts, served_by)
+    metrics.inc("llm_cascade_calls_total", {"cascade": cascade, "served_by": served_by or "none"})
+    return {
+        "text": text,
+        "value": value,
+        "model": served_by,
+        "escalated": len(attempts) > 1,
+        "error": None if served_by else attempts[-1]["error"],
+        "attempts": attempts,
+    }
+
+
+def cascade_response(
+    prompt: Any,
+    validator: Validator,
+    models: Optional[List[str]] = None,
+    cascade: str = "default",
+    **kwargs: Any,
+) -> Dict[str, Any]:
+    """
+    Asks each model of a cascade in turn until a reply passes the validator.
+
+    Args:
+        prompt: User prompt or message list (as for get_response)
+        validator: validate_code / validate_json_action / validate_plan /
+            schema_validator(...) or any text -> (value, error) callable
+        models: Explicit stages (cheapest first); defaults to the named cascade
+        cascade: Cascade name used for configuration and statistics
+        **kwargs: Passed to get_response (temperature, system, task, max_tokens, schema,
+            ...; not return_details)
+
+    Returns:
+        {"text", "value" (validator output), "model" (None if every stage failed),
+         "escalated", "error", "attempts": [{"model", "error"}, ...]}
+    """
+    from .llm_client import get_response
+
+    stages = models or get_cascade(cascade)
+    attempts: List[Dict[str, Any]] = []
+    text = None
+    for model in stages:
+        try:
+            text = get_response(model, prompt, **kwargs)
+        except Exception as e:
+            text = None
+            _attempt_failed(cascade, model, f"error: {type(e).__name__}: {e}", attempts)
+            continue
+        value, error = _check(text, validator)
+        if error is None:
+            attempts.append({"model": model, "error": None})
+            return _cascade_result(cascade, text, value, attempts, model)
+        _attempt_failed(cascade, model, error, attempts)
+    return _cascade_result(cascade, text, None, attempts, None)
+
+
+async def acascade_response(
+    prompt: Any,
+    validator: Validator,
+    models: Optional[List[str]] = None,
+    cascade: str = "default",
+    **kwargs: Any,
+) -> Dict[str, Any]:
+    """
+    Async counterpart of cascade_response.
+    """
+    from .llm_client import aget_response
+
+    stages = models or get_cascade(cascade)
+    attempts: List[Dict[str, Any]] = []
+    text = None
+    for model in stages:
+        try:
+            text = await aget_response(model, prompt, **kwargs)
+        except Exception as e:
+            text = None
+            _attempt_failed(cascade, model, f"error: {type(e).__name__}: {e}", attempts)
+            continue
+        value, error = _check(text, validator)
+        if error is None:
+            attempts.append({"model": model, "error": None})
+            return _cascade_result(cascade, text, value, attempts, model)
+        _attempt_failed(cascade, model, error, attempts)
+    return _cascade_result(cascade, text, None, attempts, None)
@@ -0,0 +1,279 @@
+"""
+Record / Replay Cassettes for LLM Calls
+
+Records every request/response pair of an agent episode to a compact JSONL file
+(gzip when the path ends with ".gz") and serves them back later, so an episode can
+be replayed in milliseconds to profile parsing, tool calls and rendering.
+
+It handles:
+1. Modes: "record" (always call, append), "replay" (never call) and "auto" (replay
+   what is on tape, record the rest)
+2. Replay latency: "zero", "original", or a float multiplier of the recorded time
+3. Matching by request content; repeated identical requests replay in recorded order
+
+Usage:
+    >>> from core.cassette import use_cassette
+    >>> with use_cassette("episodes/chart_agent.jsonl.gz", mode="record"):
+    ...     run_episode()
+    >>> with use_cassette("episodes/chart_agent.jsonl.gz", mode="replay"):
+    ...     run_episode()   # no network, no tokens
+
+Or set LLM_CASSETTE=<path> (and optionally LLM_CASSETTE_MODE / LLM_CASSETTE_LATENCY).
+"""
+
+import os
+import json
+import time
+import inspect
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Union
+
+MODES = ("record", "replay", "auto")
+
+# Request strings longer than this (e.g. base64 images) are stored as a digest
+_INLINE_LIMIT = 4096
+
+
+class CassetteMissError(KeyError):
+    """
+    Raised in replay mode when a request was never recorded.
+    """
+
+
+def _compact(value: Any) -> Any:
+    if isinstance(value, str) and len(value) > _INLINE_LIMIT:
+        import hashlib
+        return {"sha256": hashlib.sha256(value.encode("utf-8")).hexdigest(), "chars": len(value)}
+    if isinstance(value, dict):
+        return {k: _compact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_compact(v) for v in value]
+    return value
+
+
+def request_key(kind: str, request: Dict[str, Any]) -> str:
+    import hashlib
+
+    payload = json.dumps([kind, request], sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    One tape of recorded LLM interactions.
+
+    Thread-safe: batch fan-out may record from several threads at once.
+    """
+
+    def __init__(self, path: str, mode: str = "auto", latency: Union[str, float] = "zero"):
+        """
+        Args:
+            path: JSONL file (".gz" suffix = gzip compressed)
+            mode: "record", "replay" or "auto"
+            latency: "zero", "original" or a multiplier applied to recorded timings
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._tape: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+        if mode != "record":
+            self._load()
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _open(self, mode: str):
+        if self.path.endswith(".gz"):
+            import gzip
+            return gzip.open(self.path, mode + "t", encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            if self.mode == "replay":
+                raise FileNotFoundError(f"Cassette not found: {self.path}")
+            return
+        with self._open("r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._tape.setdefault(entry["key"], deque()).append(entry)
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # "record" starts a fresh tape; "auto" extends the existing one
+            self._file = self._open("w" if self.mode == "record" else "a")
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # ------------------------------------------------------------------
+    # Record / replay
+    # ------------------------------------------------------------------
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            queue = self._tape.get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+            entry = self._last.get(key)
+            self.stats["hits" if entry else "misses"] += 1
+            return entry
+
+    def _replay_delay(self, entry: Dict[str, Any]) -> float:
+        if self.latency == "zero":
+            return 0.0
+        scale = 1.0 if self.latency == "original" else float(self.latency)
+        return entry.get("elapsed", 0.0) * scale
+
+    def _record(self, kind: str, key: str, request: Dict[str, Any], response: Any, elapsed: float) -> None:
+        entry = {"kind": kind, "key": key, "request": request, "response": response, "elapsed": round(elapsed, 4)}
+        with self._lock:
+            self._append(entry)
+            self._last[key] = entry
+            self.stats["recorded"] += 1
+
+    def _check_miss(self, kind: str, request: Dict[str, Any]) -> None:
+        if self.mode == "replay":
+            raise CassetteMissError(f"No recorded '{kind}' call for request {json.dumps(request, default=str)[:200]}")
+
+    def play(self, kind: str, request: Dict[str, Any], fn: Callable[[], Any]) -> Any:
+        """
+        Returns the recorded response for request, or calls fn() and records it.
+
+        Args:
+            kind: Entry point family (e.g. "text", "image_openai", "think")
+            request: JSON-serializable request description
+            fn: Zero-argument callable performing the real call
+        """
+        request = _compact(request)
+        key = request_key(kind, request)
+        if self.mode != "record":
+            entry = self._lookup(key)
+            if entry is not None:
+                delay = self._replay_delay(entry)
+                if delay:
+                    time.sleep(delay)
+                return entry["response"]
+            self._check_miss(kind, request)
+
+        start = time.perf_counter()
+        response = fn()
+        self._record(kind, key, request, response, time.perf_counter() - start)
+        return response
+
+    async def aplay(self, kind: str, request: Dict[str, Any], fn: Callable[[], Any]) -> Any:
+        """
+        Async counterpart of play (fn returns an awaitable).
+        """
+        import asyncio
+
+        request = _compact(request)
+        key = request_key(kind, request)
+        if self.mode != "record":
+            entry = self._lookup(key)
+            if entry is not None:
+                delay = self._replay_delay(entry)
+                if delay:
+                    await asyncio.sleep(delay)
+                return entry["response"]
+            self._check_miss(kind, request)
+
+        start = time.perf_counter()
+        response = await fn()
+        self._record(kind, key, request, response, time.perf_counter() - start)
+        return response
+
+
+# ============================================================================
+# Active Cassette
+# ============================================================================
+
+_active: Optional[Cassette] = None
+_env_checked = False
+
+
+def get_active_cassette() -> Optional[Cassette]:
+    """
+    Returns the cassette in use (from use_cassette or LLM_CASSETTE), if any.
+    """
+    global _active, _env_checked
+    if _active is None and not _env_checked:
+        _env_checked = True
+        path = os.getenv("LLM_CASSETTE")
+        if path:
+            latency = os.getenv("LLM_CASSETTE_LATENCY", "zero")
+            if latency not in ("zero", "original"):
+                latency = float(latency)
+            _active = Cassette(path, os.getenv("LLM_CASSETTE_MODE", "auto"), latency)
+    return _active
+
+
+@contextmanager
+def use_cassette(path: str, mode: str = "auto", latency: Union[str, float] = "zero") -> Iterator[Cassette]:
+    """
+    Routes every recorded entry point through a cassette for the duration of the block.
+    """
+    global _active
+    previous = _active
+    cassette = Cassette(path, mode, latency)
+    _active = cassette
+    try:
+        yield cassette
+    finally:
+        _active = previous
+        cassette.close()
+
+
+def recorded(kind: Optional[str] = None, exclude: tuple = ("use_cache",)) -> Callable:
+    """
+    Decorator that sends a sync or async entry point through the active cassette.
+
+    The request is the function's bound arguments (minus `exclude`), so replay
+    matches on the model name the caller passed, before any tier routing.
+    """
+    def decorator(fn: Callable) -> Callable:
+        name = kind or fn.__name__
+        signature = inspect.signature(fn)
+
+        def describe(args: tuple, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return {k: v for k, v in bound.arguments.items() if k not in exclude}
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                cassette = get_active_cassette()
+                if cassette is None:
+                    return await fn(*args, **kwargs)
+                return await cassette.aplay(name, describe(args, kwargs), lambda: fn(*args, **kwargs))
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            cassette = get_active_cassette()
+            if cassette is None:
+                return fn(*args, **kwargs)
+            return cassette.play(name, describe(args, kwargs), lambda: fn(*args, **kwargs))
+        return wrapper
+
+    return decorator
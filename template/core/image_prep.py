@@ -0,0 +1,234 @@
+"""
+Image Pre-Processing for Multimodal Calls
+
+Charts are saved as full-resolution (often 300-dpi) PNGs. Vision models downscale
+them anyway, so uploading the original mostly costs bandwidth and vision tokens.
+
+It handles:
+1. Downscaling to a target long edge
+2. Palette quantization or re-encoding to JPEG / WebP, stripping metadata
+3. Per-model profiles, so the quality/latency trade-off can be tuned per reflection model
+4. Reporting bytes saved per call (and in total via image_prep_stats)
+
+Pillow is optional: without it images are passed through unchanged.
+
+Usage:
+    >>> prepared = prepare_image("chart_v1.png", model="qwen-vl-plus")
+    >>> image_openai_call("qwen-vl-plus", prompt, prepared.media_type, prepared.b64)
+    >>> prepared.bytes_saved
+"""
+
+import os
+import time
+import threading
+import mimetypes
+from collections import OrderedDict
+from dataclasses import astuple, dataclass, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+from .blob_cache import blob_cache
+
+
+@dataclass(frozen=True)
+class ImageProfile:
+    """
+    How to prepare an image for one family of vision models.
+    """
+    max_edge: Optional[int] = 1568     # Long edge in pixels (None = keep size)
+    format: str = "PNG"                # "PNG", "JPEG" or "WEBP"
+    quality: int = 85                  # JPEG / WebP quality (1-95)
+    colors: Optional[int] = 256        # PNG only: quantize to this many palette colors (None = keep)
+
+
+# Matched by substring of the model name, in order; first match wins.
+# Palette PNG keeps chart text crisp and is usually smaller than JPEG for flat-color plots;
+# switch a model to JPEG / WEBP for photo-like images.
+IMAGE_PROFILES: List[Tuple[str, ImageProfile]] = [
+    ("claude", ImageProfile(max_edge=1568)),
+    ("gpt-4o", ImageProfile(max_edge=2048)),
+    ("qwen-vl", ImageProfile(max_edge=1280)),
+    ("glm-4v", ImageProfile(max_edge=1120)),
+]
+DEFAULT_PROFILE = ImageProfile()
+
+_MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+# Cumulative counters for observability
+image_prep_stats = {"calls": 0, "converted": 0, "bytes_in": 0, "bytes_out": 0, "bytes_saved": 0}
+
+# (source digest, profile) -> (prepared digest, media_type); bounded so stale charts age out
+_prepared: "OrderedDict[Tuple[str, Tuple[Any, ...]], Tuple[str, str]]" = OrderedDict()
+_prepared_lock = threading.Lock()
+_PREPARED_MAX_ENTRIES = 256
+
+
+@dataclass
+class PreparedImage:
+    """
+    Result of prepare_image; media_type/b64 go straight into image_*_call.
+    """
+    media_type: str
+    b64: str
+    original_bytes: int
+    prepared_bytes: int
+    original_size: Optional[Tuple[int, int]] = None
+    prepared_size: Optional[Tuple[int, int]] = None
+    elapsed_ms: float = 0.0
+    note: Optional[str] = None     # Why the original was passed through, if it was
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.prepared_bytes
+
+
+def profile_for(model: Optional[str]) -> ImageProfile:
+    """
+    Returns the profile for a model, with LLM_IMAGE_MAX_EDGE / LLM_IMAGE_FORMAT /
+    LLM_IMAGE_QUALITY applied on top.
+    """
+    profile = DEFAULT_PROFILE
+    model_lower = (model or "").lower()
+    for marker, candidate in IMAGE_PROFILES:
+        if marker in model_lower:
+            profile = candidate
+            break
+
+    overrides: Dict[str, Any] = {}
+    if os.getenv("LLM_IMAGE_MAX_EDGE"):
+        overrides["max_edge"] = int(os.getenv("LLM_IMAGE_MAX_EDGE")) or None
+    if os.getenv("LLM_IMAGE_FORMAT"):
+        overrides["format"] = os.getenv("LLM_IMAGE_FORMAT").upper()
+    if os.getenv("LLM_IMAGE_QUALITY"):
+        overrides["quality"] = int(os.getenv("LLM_IMAGE_QUALITY"))
+    return replace(profile, **overrides) if overrides else profile
+
+
+def configure_image_profile(marker: str, **kwargs: Any) -> ImageProfile:
+    """
+    Adds or updates the profile for models whose name contains `marker`.
+
+    Examples:
+        >>> configure_image_profile("qwen-vl", max_edge=1024, format="WEBP", quality=80)
+        >>> configure_image_profile("claude", max_edge=None, format="PNG")  # keep full detail
+    """
+    for i, (existing, profile) in enumerate(IMAGE_PROFILES):
+        if existing == marker:
+            IMAGE_PROFILES[i] = (marker, replace(profile, **kwargs))
+            return IMAGE_PROFILES[i][1]
+    profile = replace(DEFAULT_PROFILE, **kwargs)
+    IMAGE_PROFILES.insert(0, (marker, profile))
+    return profile
+
+
+def _encode(raw: bytes, profile: ImageProfile) -> Tuple[bytes, Tuple[int, int], Tuple[int, int]]:
+    import io
+    from PIL import Image
+
+    with Image.open(io.BytesIO(raw)) as img:
+        img.load()
+        original_size = img.size
+        if profile.max_edge and max(img.size) > profile.max_edge:
+            img.thumbnail((profile.max_edge, profile.max_edge), Image.LANCZOS)
+
+        fmt = profile.format.upper()
+        if fmt in ("JPEG", "WEBP") and img.mode not in ("RGB", "L"):
+            # Flatten transparency onto white (matplotlib's default facecolor)
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif fmt == "PNG" and profile.colors:
+            # Octree without dithering keeps flat chart colors flat (dithering defeats PNG compression)
+            img = img.convert("RGB").quantize(colors=profile.colors, method=Image.Quantize.FASTOCTREE,
+                                              dither=Image.Dither.NONE)
+
+        # Metadata (EXIF, PNG text chunks, ICC) is dropped because it is not passed to save()
+        out = io.BytesIO()
+        if fmt == "PNG":
+            img.save(out, format="PNG", optimize=True)
+        else:
+            img.save(out, format=fmt, quality=profile.quality, optimize=True)
+        return out.getvalue(), original_size, img.size
+
+
+def prepare_image(path: str, model: Optional[str] = None, profile: Optional[ImageProfile] = None) -> PreparedImage:
+    """
+    Downscales / re-encodes an image for a vision model.
+
+    Args:
+        path: Image file path
+        model: Vision model name (selects the profile)
+        profile: Explicit profile (overrides the model's)
+
+    Returns:
+        PreparedImage with media_type, b64 and the bytes saved. Falls back to the
+        original file when Pillow is missing, LLM_IMAGE_PREP=0, or re-encoding does
+        not make it smaller.
+    """
+    start = time.perf_counter()
+    source = blob_cache.get(path)
+    profile = profile or profile_for(model)
+    original_media_type = mimetypes.guess_type(path)[0] or "image/png"
+
+    def passthrough(note: str) -> PreparedImage:
+        _count(len(source.raw), len(source.raw), converted=False)
+        return PreparedImage(original_media_type, blob_cache.encode(source), len(source.raw), len(source.raw),
+                             elapsed_ms=(time.perf_counter() - start) * 1000, note=note)
+
+    if os.getenv("LLM_IMAGE_PREP", "1").lower() in ("0", "false", "no"):
+        return passthrough("disabled")
+
+    key = (source.digest, astuple(profile))
+    with _prepared_lock:
+        hit = _prepared.get(key)
+        if hit is not None:
+            _prepared.move_to_end(key)
+    if hit is not None:
+        digest, media_type = hit
+        if digest == source.digest:
+            return passthrough("no_gain")
+        prepared = blob_cache.lookup(digest)
+        if prepared is not None:
+            _count(len(source.raw), len(prepared.raw), converted=True)
+            return PreparedImage(media_type, blob_cache.encode(prepared), len(source.raw), len(prepared.raw),
+                                 elapsed_ms=(time.perf_counter() - start) * 1000)
+
+    try:
+        raw, original_size, prepared_size = _encode(source.raw, profile)
+    except ImportError:
+        return passthrough("pillow_missing")
+    except Exception as e:
+        return passthrough(f"{type(e).__name__}: {e}")
+
+    media_type = _MEDIA_TYPES.get(profile.format.upper(), original_media_type)
+    if len(raw) >= len(source.raw):
+        _remember(key, source.digest, original_media_type)
+        return passthrough("no_gain")
+
+    prepared = blob_cache.put_bytes(raw)
+    _remember(key, prepared.digest, media_type)
+    _count(len(source.raw), len(raw), converted=True)
+    return PreparedImage(
+        media_type=media_type,
+        b64=blob_cache.encode(prepared),
+        original_bytes=len(source.raw),
+        prepared_bytes=len(raw),
+        original_size=original_size,
+        prepared_size=prepared_size,
+        elapsed_ms=(time.perf_counter() - start) * 1000,
+    )
+
+
+def _remember(key: Tuple[str, Tuple[Any, ...]], digest: str, media_type: str) -> None:
+    with _prepared_lock:
+        _prepared[key] = (digest, media_type)
+        while len(_prepared) > _PREPARED_MAX_ENTRIES:
+            _prepared.popitem(last=False)
+
+
+def _count(bytes_in: int, bytes_out: int, converted: bool) -> None:
+    with _prepared_lock:
+        image_prep_stats["calls"] += 1
+        image_prep_stats["converted"] += int(converted)
+        image_prep_stats["bytes_in"] += bytes_in
+        image_prep_stats["bytes_out"] += bytes_out
+        image_prep_stats["bytes_saved"] += bytes_in - bytes_out
@@ -5,55 +5,183 @@ This module provides a unified interface for interacting with various LLM provid
 (OpenAI, Anthropic, Qwen, Zhipu, DeepSeek, Moonshot, etc.).
 
 It handles:
-1. Environment variable loading
-2. Client initialization (with fault tolerance)
+1. Environment variable loading (lazy, on first use)
+2. Client initialization (lazy registry, with fault tolerance)
 3. Transparent proxying based on model names
 4. Unified text generation interface
 5. Unified multimodal (image) interface
+6. Async variants backed by one pooled HTTP transport per provider
+7. Opt-in persistent response cache for deterministic calls
+8. Per-provider bulkheads (bounded queues, backpressure) and batch fan-out (see bulkhead.py)
+9. Unified streaming (text deltas with TTFT / inter-token timing)
+10. Retries with backoff and optional hedged requests (see resilience.py)
+11. Health-aware tier routing with circuit breakers (see router.py)
+12. Single-flight coalescing of identical in-flight requests (see singleflight.py)
+13. Per-call latency / token / error metrics (see metrics.py)
+14. Record / replay cassettes for offline episode replays (see cassette.py)
+15. Token budgeting: task-based output caps and prompt size checks (see budget.py)
+16. Content-addressed image encoding cache (see blob_cache.py)
+17. Native structured (JSON) output with local schema validation (see structured.py)
+18. Multi-turn messages / system prompts with provider prompt-prefix caching
+19. Config-driven model registry: routing, limits, timeouts and pricing (see registry.py)
+20. Opt-in semantic cache tier for paraphrased questions (see semantic_cache.py)
+21. Cheap-to-strong model cascades that escalate on validation failure (see cascade.py)
 """
 
 import os
-import base64
+import json
+import time
+import weakref
 import mimetypes
-from typing import Optional, Tuple
-from dotenv import load_dotenv
-from openai import OpenAI
-from anthropic import Anthropic
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+from .blob_cache import blob_cache
+from .bulkhead import Bulkhead
+from .budget import TokenBudget, budget_overrun, plan_budget, rejection_message
+from .cassette import recorded
+from .metrics import cached_input_tokens, metrics, usage_tokens
+from .registry import registry
+from .resilience import acall_with_retry, aresilient_call, call_with_retry, resilient_call
+from .router import TIER_PREFIX, router
+from .singleflight import singleflight
+from .structured import parse_structured, schema_instruction, structured_stats
+
+if TYPE_CHECKING:  # SDKs are imported lazily, on first use of a provider
+    from openai import OpenAI
+    from .cache import ResponseCache
 
 # ============================================================================
-# 1. Initialization & Configuration
+# 1. Initialization & Configuration (Lazy)
 # ============================================================================
+#
+# Nothing happens at import time: .env is read, SDKs are imported and clients are
+# built only the first time a provider is actually resolved.
+
+# Provider specs live in the model registry (registry.py + config/models.json);
+# PROVIDERS is kept as an alias of the registry's live provider table
+PROVIDERS: Dict[str, Dict[str, Any]] = registry.providers
+
+# Backwards compatible module attributes (e.g. llm_client.qwen_client)
+_LEGACY_CLIENT_NAMES = {
+    "openai_client": "openai",
+    "anthropic_client": "anthropic",
+    "qwen_client": "qwen",
+    "zhipu_client": "zhipu",
+    "deepseek_client": "deepseek",
+    "kimi_client": "kimi",
+}
+
+_env_loaded = False
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _ensure_env() -> None:
+    """
+    Loads the .env file once, on first use.
+    """
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def get_provider_settings(provider: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Returns (api_key, base_url) for a provider from the environment.
+    """
+    _ensure_env()
+    spec = registry.provider_spec(provider)
+    api_key = os.getenv(spec["api_key_env"])
+    base_url = os.getenv(spec["base_url_env"], spec["default_base_url"])
+    return api_key, base_url
+
+
+def _build_client(provider: str, asynchronous: bool = False, **kwargs: Any) -> Optional[Any]:
+    """
+    Imports the provider SDK and builds a client (None if the API key is missing).
+    """
+    api_key, base_url = get_provider_settings(provider)
+    if not api_key:
+        return None
+    
+    spec = registry.provider_spec(provider)
+    if spec["sdk"] == "anthropic":
+        import anthropic
+        cls = anthropic.AsyncAnthropic if asynchronous else anthropic.Anthropic
+    else:
+        import openai
+        cls = openai.AsyncOpenAI if asynchronous else openai.OpenAI
+    # Retries are handled by resilience.py (backoff, Retry-After, hedging), not the SDK
+    kwargs.setdefault("max_retries", 0)
+    kwargs.setdefault("timeout", float(os.getenv("LLM_TIMEOUT", spec["timeout"])))
+    return cls(api_key=api_key, base_url=base_url, **kwargs)
+
+
+def get_client(provider: str) -> Optional[Any]:
+    """
+    Returns the SDK client for a provider, building it the first time it is needed.
+    
+    Args:
+        provider: Provider key (see registry.providers)
+    
+    Returns:
+        OpenAI / Anthropic client, or None if the API key is not configured.
+    """
+    client = _clients.get(provider)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(provider)
+            if client is None:
+                client = _build_client(provider)
+                if client is not None:
+                    _clients[provider] = client
+    return client
 
-load_dotenv()
 
-# API Keys
-openai_api_key = os.getenv("OPENAI_API_KEY")
-anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
-qwen_api_key = os.getenv("QWEN_API_KEY")
-zhipu_api_key = os.getenv("ZHIPU_API_KEY")
-deepseek_api_key = os.getenv("DEEPSEEK_API_KEY")
-moonshot_api_key = os.getenv("MOONSHOT_API_KEY")
+def reset_clients() -> None:
+    """
+    Drops all cached sync clients (e.g. after changing API keys at runtime).
+    """
+    with _clients_lock:
+        _clients.clear()
 
-# Base URLs
-qwen_base_url = os.getenv("QWEN_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
-zhipu_base_url = os.getenv("ZHIPU_BASE_URL", "https://open.bigmodel.cn/api/paas/v4/")
-deepseek_base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
-moonshot_base_url = os.getenv("MOONSHOT_BASE_URL", "https://api.moonshot.cn/v1")
 
-# Client Initialization (Fault Tolerant)
-openai_client = OpenAI(api_key=openai_api_key) if openai_api_key else None
-anthropic_client = Anthropic(api_key=anthropic_api_key) if anthropic_api_key else None
-qwen_client = OpenAI(api_key=qwen_api_key, base_url=qwen_base_url) if qwen_api_key else None
-zhipu_client = OpenAI(api_key=zhipu_api_key, base_url=zhipu_base_url) if zhipu_api_key else None
-deepseek_client = OpenAI(api_key=deepseek_api_key, base_url=deepseek_base_url) if deepseek_api_key else None
-kimi_client = OpenAI(api_key=moonshot_api_key, base_url=moonshot_base_url) if moonshot_api_key else None
+def __getattr__(name: str) -> Any:
+    if name in _LEGACY_CLIENT_NAMES:
+        return get_client(_LEGACY_CLIENT_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # ============================================================================
 # 2. Client Management (Transparent Proxy)
 # ============================================================================
 
-def get_client_for_model(model: str) -> Optional[OpenAI]:
+def is_anthropic_model(model: str) -> bool:
+    """
+    Returns True if the model should be routed to the Anthropic Messages API.
+    """
+    return registry.provider_spec(resolve_provider(model))["sdk"] == "anthropic"
+
+
+def resolve_provider(model: str) -> str:
+    """
+    Maps a model name to its provider key via the model registry.
+    
+    Args:
+        model: Model name (e.g., "qwen3-max", "glm-4v", "claude-3-5-sonnet")
+    
+    Returns:
+        Provider key, e.g. "anthropic", "qwen", "zhipu", "deepseek", "kimi", "openai"
+        (memoized per model name; see registry.py for the matching rules).
+    """
+    return registry.resolve_provider(model)
+
+
+def get_client_for_model(model: str) -> Optional["OpenAI"]:
     """
     Returns the appropriate OpenAI-compatible client based on the model name.
     
@@ -63,18 +191,81 @@ def get_client_for_model(model: str) -> Optional[OpenAI]:
     Returns:
         The corresponding OpenAI client, or None if not configured.
     """
-    model_lower = model.lower()
+    provider = resolve_provider(model)
     
-    if "qwen" in model_lower:
-        return qwen_client
-    elif "glm" in model_lower:
-        return zhipu_client
-    elif "deepseek" in model_lower:
-        return deepseek_client
-    elif "kimi" in model_lower or "moonshot" in model_lower:
-        return kimi_client
-    else:
-        return openai_client
+    # Providers without an OpenAI-compatible API fall back to OpenAI itself
+    if registry.provider_spec(provider)["sdk"] != "openai":
+        provider = "openai"
+    return get_client(provider)
+
+
+def resolve_model(model: str) -> str:
+    """
+    Resolves "tier:<name>" to the healthiest configured model of that tier
+    (see router.py); plain model names are returned unchanged.
+    """
+    if model.startswith(TIER_PREFIX):
+        return router.route(model, resolve_provider, lambda provider: bool(get_provider_settings(provider)[0]))
+    return model
+
+
+def _record_call(provider: str, model: str, kind: str, start: float,
+                 response: Any = None, error: Optional[BaseException] = None) -> None:
+    input_tokens, output_tokens = usage_tokens(response)
+    cached = cached_input_tokens(response)
+    metrics.record_call(
+        provider, model, kind, time.perf_counter() - start,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        error=type(error).__name__ if error is not None else None,
+        cached_input_tokens=cached,
+    )
+    cost = registry.cost(model, input_tokens, output_tokens, cached)
+    if cost:
+        metrics.inc("llm_cost_usd_total", {"provider": provider, "model": model}, cost)
+
+
+def _provider_call(model: str, fn: Any, kind: str = "text") -> Any:
+    # The provider bulkhead admits the logical call (a slot is held across retries so
+    # backoff keeps pressure off a rate-limited vendor); retries/hedging inside it,
+    # circuit breaker + health tracking around each attempt. Metrics cover the call
+    # from admission (queue wait is reported separately as llm_bulkhead_wait_seconds)
+    provider = resolve_provider(model)
+    with get_bulkhead(provider).slot():
+        start = time.perf_counter()
+        try:
+            response = resilient_call(model, lambda: router.call(provider, fn))
+        except Exception as e:
+            _record_call(provider, model, kind, start, error=e)
+            raise
+    _record_call(provider, model, kind, start, response)
+    return response
+
+
+async def _aprovider_call(model: str, fn: Any, kind: str = "text") -> Any:
+    provider = resolve_provider(model)
+    async with get_bulkhead(provider).aslot():
+        start = time.perf_counter()
+        try:
+            response = await aresilient_call(model, lambda: router.acall(provider, fn))
+        except Exception as e:
+            _record_call(provider, model, kind, start, error=e)
+            raise
+    _record_call(provider, model, kind, start, response)
+    return response
+
+
+def _open_stream(model: str, fn: Any) -> Any:
+    # Same retry + circuit breaker path as _provider_call for opening a stream. The
+    # caller holds the bulkhead slot until the stream is closed and records metrics
+    # itself; streams are never hedged, since a duplicate stream would stay open
+    provider = resolve_provider(model)
+    return call_with_retry(lambda: router.call(provider, fn))
+
+
+async def _aopen_stream(model: str, fn: Any) -> Any:
+    provider = resolve_provider(model)
+    return await acall_with_retry(lambda: router.acall(provider, fn))
 
 
 def check_api_keys():
@@ -82,12 +273,8 @@ def check_api_keys():
     Prints the configuration status of API keys for debugging.
     """
     keys_status = {
-        "OpenAI": "✅" if openai_api_key else "❌",
-        "Anthropic": "✅" if anthropic_api_key else "❌",
-        "Qwen": "✅" if qwen_api_key else "❌",
-        "Zhipu": "✅" if zhipu_api_key else "❌",
-        "DeepSeek": "✅" if deepseek_api_key else "❌",
-        "Moonshot": "✅" if moonshot_api_key else "❌",
+        spec["label"]: "✅" if get_provider_settings(provider)[0] else "❌"
+        for provider, spec in registry.load().providers.items()
     }
     
     print("🔑 API Keys Configuration Status:")
@@ -97,46 +284,414 @@ def check_api_keys():
 
 
 # ============================================================================
-# 3. Unified Text Generation
+# 2.1 Response Cache (Opt-in)
 # ============================================================================
 
-def get_response(model: str, prompt: str, temperature: float = 0) -> str:
+# Setting LLM_CACHE_PATH enables the cache on first use; LLM_CACHE_BYPASS=1 disables lookups globally.
+_response_cache: Optional["ResponseCache"] = None
+_cache_from_env = True
+
+
+def enable_response_cache(
+    path: str = ".llm_cache.sqlite",
+    max_entries: int = 10000,
+    ttl_seconds: Optional[float] = 7 * 24 * 3600,
+) -> "ResponseCache":
     """
-    Unified interface for text generation across all providers.
+    Enables the persistent response cache for deterministic (temperature=0) calls.
     
     Args:
-        model: Model name
-        prompt: User prompt
-        temperature: Temperature (0-1)
+        path: SQLite file path (":memory:" for a process-local cache)
+        max_entries: Maximum number of cached responses (LRU eviction)
+        ttl_seconds: Maximum age of a cached response (None = never expire)
     
     Returns:
-        Generated text content
+        The active ResponseCache (use .stats() for hit/miss counters).
+    """
+    from .cache import ResponseCache
+    
+    global _response_cache
+    if _response_cache is not None:
+        _response_cache.close()
+    _response_cache = ResponseCache(path, max_entries=max_entries, ttl_seconds=ttl_seconds)
+    return _response_cache
+
+
+def disable_response_cache() -> None:
+    """
+    Disables (and closes) the response cache.
+    """
+    global _response_cache, _cache_from_env
+    if _response_cache is not None:
+        _response_cache.close()
+    _response_cache = None
+    _cache_from_env = False
+
+
+def get_response_cache() -> Optional["ResponseCache"]:
+    """
+    Returns the active response cache, or None if caching is disabled.
+    """
+    global _cache_from_env
+    if _response_cache is None and _cache_from_env:
+        _ensure_env()
+        _cache_from_env = False
+        if os.getenv("LLM_CACHE_PATH"):
+            enable_response_cache(os.getenv("LLM_CACHE_PATH"))
+    return _response_cache
+
+
+def _cache_lookup(model: str, messages: Any, use_cache: bool, **params: Any) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Returns (cache_key, cached_text). Only deterministic calls are cached.
+    """
+    if not use_cache or params.get("temperature") != 0:
+        return None, None
+    cache = get_response_cache()
+    if cache is None or os.getenv("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes"):
+        return None, None
+    
+    from .cache import make_cache_key
+    key = make_cache_key(model, messages, **params)
+    return key, cache.get(key)
+
+
+def _cache_store(cache_key: Optional[str], text: Optional[str]) -> None:
+    # Error strings are never cached
+    if cache_key and text is not None and not text.startswith("Error:") and _response_cache is not None:
+        _response_cache.set(cache_key, text)
+
+
+# (cache, namespace, question) for calls that may be answered by a near-duplicate
+SemanticSlot = Tuple[Any, str, str]
+
+
+def _semantic_lookup(model: str, messages: List[Dict[str, Any]], use_cache: bool, namespace: Optional[str],
+                     **params: Any) -> Tuple[Optional[SemanticSlot], Optional[str]]:
+    """
+    Returns (slot, cached_text) for the semantic tier (see semantic_cache.py).
+    
+    Only the latest message is compared by meaning; the model, parameters, system
+    prompt and history are folded into the namespace and must match exactly.
     """
-    if "claude" in model.lower() or "anthropic" in model.lower():
+    if namespace is None or not use_cache or params.get("temperature") != 0:
+        return None, None
+    if os.getenv("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes"):
+        return None, None
+    from .semantic_cache import get_semantic_cache
+    cache = get_semantic_cache()
+    if cache is None:
+        return None, None
+    
+    from .cache import make_cache_key
+    slot = (cache, f"{namespace}:{make_cache_key(model, messages[:-1], **params)}", messages_text(messages[-1:]))
+    cached = cache.get(slot[1], slot[2])
+    metrics.inc("llm_semantic_cache_total", {"model": model, "result": "miss" if cached is None else "hit"})
+    return slot, cached
+
+
+def _semantic_store(slot: Optional[SemanticSlot], text: Optional[str]) -> None:
+    if slot is not None and text is not None and not text.startswith("Error:"):
+        cache, namespace, question = slot
+        cache.set(namespace, question, text)
+
+
+def _flight_key(cache_key: Optional[str], model: str, messages: Any, **params: Any) -> Optional[str]:
+    """
+    Returns the single-flight key for deterministic calls (None = do not coalesce).
+    
+    Set LLM_SINGLEFLIGHT=0 to disable coalescing.
+    """
+    if params.get("temperature") != 0 or os.getenv("LLM_SINGLEFLIGHT", "1").lower() in ("0", "false", "no"):
+        return None
+    if cache_key:
+        return cache_key
+    
+    from .cache import make_cache_key
+    return make_cache_key(model, messages, **params)
+
+
+# ============================================================================
+# 3. Unified Text Generation
+# ============================================================================
+
+Prompt = Union[str, List[Dict[str, Any]]]
+
+_EPHEMERAL = {"type": "ephemeral"}
+
+
+def normalize_messages(messages: Prompt) -> List[Dict[str, Any]]:
+    """
+    Accepts a plain prompt string or an OpenAI-style message list.
+    """
+    if isinstance(messages, str):
+        return [{"role": "user", "content": messages}]
+    return list(messages)
+
+
+def build_messages(prompt: Prompt, system: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Normalizes prompt and puts the system prompt first, so the stable part of the
+    request is a common prefix across calls (what provider prompt caching keys on).
+    """
+    messages = normalize_messages(prompt)
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
+    return messages
+
+
+def messages_text(messages: List[Dict[str, Any]]) -> str:
+    """
+    Concatenated text of all messages (used for token estimates).
+    """
+    parts = []
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(block.get("text", "") for block in content if isinstance(block, dict))
+    return "\n".join(parts)
+
+
+def to_anthropic_messages(messages: List[Dict[str, Any]]) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """
+    Splits OpenAI-style messages into Anthropic's (system, messages) pair.
+    """
+    system_parts = [m["content"] for m in messages if m["role"] == "system"]
+    chat = [{"role": m["role"], "content": m["content"]} for m in messages if m["role"] != "system"]
+    return ("\n\n".join(system_parts) if system_parts else None), chat
+
+
+def prompt_cache_enabled() -> bool:
+    # LLM_PROMPT_CACHE=0 stops marking cache breakpoints (Anthropic)
+    return os.getenv("LLM_PROMPT_CACHE", "1").lower() not in ("0", "false", "no")
+
+
+def _anthropic_blocks(content: Any) -> List[Dict[str, Any]]:
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}]
+    return list(content)
+
+
+_STRUCTURED_TOOL_NAME = "respond"
+
+# Providers that rejected response_format at runtime (fall back to "prompt" mode)
+_json_mode_unsupported: set = set()
+
+
+def structured_mode(model: str) -> str:
+    """
+    Returns how a schema is enforced for model: "json_schema", "json_object", "tool" or "prompt".
+    """
+    provider = resolve_provider(model)
+    if provider in _json_mode_unsupported:
+        return "prompt"
+    return registry.provider_spec(provider).get("json_mode") or "prompt"
+
+
+def _anthropic_text_kwargs(model: str, messages: List[Dict[str, Any]], temperature: float, max_tokens: int,
+                           schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    system, chat = to_anthropic_messages(messages)
+    chat = [{"role": m["role"], "content": _anthropic_blocks(m["content"])} for m in chat]
+    cache = prompt_cache_enabled()
+    # Cache breakpoints: end of the system prompt (covers tools too, which precede it)
+    # and end of the conversation history before the latest turn
+    if cache and len(chat) > 1 and chat[-2]["content"]:
+        blocks = chat[-2]["content"]
+        blocks[-1] = dict(blocks[-1], cache_control=_EPHEMERAL)
+    kwargs = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "messages": chat,
+    }
+    if system:
+        block = {"type": "text", "text": system}
+        if cache:
+            block["cache_control"] = _EPHEMERAL
+        kwargs["system"] = [block]
+    if schema is not None:
+        # Tool forcing: the reply arrives as the tool's (schema-shaped) input
+        kwargs["tools"] = [{
+            "name": _STRUCTURED_TOOL_NAME,
+            "description": "Return the answer as structured data.",
+            "input_schema": schema,
+        }]
+        kwargs["tool_choice"] = {"type": "tool", "name": _STRUCTURED_TOOL_NAME}
+    return kwargs
+
+
+def _openai_text_kwargs(model: str, messages: List[Dict[str, Any]], temperature: float, max_tokens: int,
+                        schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # OpenAI-compatible vendors cache long shared prefixes automatically; keeping the
+    # system prompt (and schema) first is all that is needed to hit that cache
+    mode = structured_mode(model) if schema is not None else None
+    if mode in ("json_object", "prompt"):
+        # JSON mode guarantees syntax only, so the schema still goes into the prompt
+        prefix = 0
+        while prefix < len(messages) and messages[prefix]["role"] == "system":
+            prefix += 1
+        instruction = {"role": "system", "content": schema_instruction(schema).strip()}
+        messages = messages[:prefix] + [instruction] + messages[prefix:]
+    kwargs = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "messages": messages,
+    }
+    if mode == "json_schema":
+        kwargs["response_format"] = {"type": "json_schema", "json_schema": {"name": "response", "schema": schema}}
+    elif mode == "json_object":
+        kwargs["response_format"] = {"type": "json_object"}
+    return kwargs
+
+
+def _anthropic_reply_text(message: Any, structured: bool) -> str:
+    if structured:
+        for block in message.content or []:
+            if getattr(block, "type", None) == "tool_use":
+                return json.dumps(block.input, ensure_ascii=False)
+    return message.content[0].text
+
+
+def _json_mode_rejected(model: str, error: BaseException) -> bool:
+    # A 400 on a request carrying response_format: remember and retry in "prompt" mode
+    if getattr(error, "status_code", None) == 400 and structured_mode(model) in ("json_schema", "json_object"):
+        _json_mode_unsupported.add(resolve_provider(model))
+        return True
+    return False
+
+
+def _generate_text(model: str, messages: List[Dict[str, Any]], temperature: float, max_tokens: int,
+                   schema: Optional[Dict[str, Any]] = None) -> Tuple[str, Any]:
+    # Returns (text, raw response); the response is None for configuration errors
+    if is_anthropic_model(model):
         # Anthropic Claude API
+        anthropic_client = get_client("anthropic")
         if not anthropic_client:
-            return f"Error: Anthropic client not initialized. Check ANTHROPIC_API_KEY."
+            return "Error: Anthropic client not initialized. Check ANTHROPIC_API_KEY.", None
         
-        message = anthropic_client.messages.create(
-            model=model,
-            max_tokens=2000,
-            temperature=temperature,
-            messages=[{"role": "user", "content": [{"type": "text", "text": prompt}]}],
-        )
-        return message.content[0].text
+        kwargs = _anthropic_text_kwargs(model, messages, temperature, max_tokens, schema)
+        message = _provider_call(model, lambda: anthropic_client.messages.create(**kwargs))
+        return _anthropic_reply_text(message, schema is not None), message
     
     else:
         # OpenAI Compatible API
         client = get_client_for_model(model)
         if not client:
-            return f"Error: Client for model '{model}' not initialized. Check API keys in .env file."
+            return f"Error: Client for model '{model}' not initialized. Check API keys in .env file.", None
         
-        response = client.chat.completions.create(
-            model=model,
-            temperature=temperature,
-            messages=[{"role": "user", "content": prompt}],
-        )
-        return response.choices[0].message.content
+        kwargs = _openai_text_kwargs(model, messages, temperature, max_tokens, schema)
+        try:
+            response = _provider_call(model, lambda: client.chat.completions.create(**kwargs))
+        except Exception as e:
+            if schema is None or not _json_mode_rejected(model, e):
+                raise
+            kwargs = _openai_text_kwargs(model, messages, temperature, max_tokens, schema)
+            response = _provider_call(model, lambda: client.chat.completions.create(**kwargs))
+        return response.choices[0].message.content, response
+
+
+def _budget_result(text: str, budget: TokenBudget, response: Any = None,
+                   return_details: bool = False, cached: bool = False,
+                   schema: Optional[Dict[str, Any]] = None) -> Union[str, Dict[str, Any]]:
+    overrun = budget_overrun(budget, response)
+    if overrun:
+        metrics.inc("llm_budget_overruns_total", {"model": budget.model, "task": budget.task, "reason": overrun})
+    
+    data, schema_error, mode = None, None, None
+    if schema is not None and not text.startswith("Error:"):
+        mode = structured_mode(budget.model)
+        data, schema_error = parse_structured(text, schema)
+        if not cached:
+            structured_stats.record(mode, schema_error)
+            status = "ok" if schema_error is None else schema_error.split(":", 1)[0]
+            metrics.inc("llm_structured_outputs_total", {"model": budget.model, "mode": mode, "status": status})
+    
+    if not return_details:
+        return text
+    input_tokens, output_tokens = usage_tokens(response)
+    cached_tokens = cached_input_tokens(response)
+    details = {
+        "text": text,
+        "overrun": overrun,
+        "input_tokens": input_tokens,
+        "cached_input_tokens": cached_tokens,
+        "output_tokens": output_tokens,
+        "cost_usd": registry.cost(budget.model, input_tokens, output_tokens, cached_tokens),
+        "cached": cached,
+        "budget": budget.to_dict(),
+    }
+    if schema is not None:
+        details.update(data=data, schema_error=schema_error, structured_mode=mode)
+    return details
+
+
+@recorded("text")
+def get_response(
+    model: str,
+    prompt: Prompt,
+    temperature: float = 0,
+    use_cache: bool = True,
+    task: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    return_details: bool = False,
+    schema: Optional[Dict[str, Any]] = None,
+    system: Optional[str] = None,
+    semantic_namespace: Optional[str] = None,
+) -> Union[str, Dict[str, Any]]:
+    """
+    Unified interface for text generation across all providers.
+    
+    Args:
+        model: Model name, or "tier:<name>" to route to the healthiest model of a tier
+        prompt: User prompt, or an OpenAI-style message list for multi-turn calls
+        temperature: Temperature (0-1)
+        use_cache: Set to False to bypass the response cache for this call
+        task: Output budget by task type ("plan", "json_action", "code", ...; see budget.py)
+        max_tokens: Explicit output cap (overrides the task cap)
+        return_details: Return a dict with the text and budget report instead of the text
+        schema: JSON schema for the reply. Uses the provider's native JSON support
+            (response_format / Anthropic tool forcing) where available; the reply is
+            always validated locally (see structured.py)
+        system: System prompt. Sent first and marked as a prompt-cache breakpoint for
+            Claude; OpenAI-compatible vendors cache the repeated prefix automatically
+        semantic_namespace: Opt in to the semantic cache (when enabled): a paraphrase of
+            the latest message in this namespace is answered from an earlier reply.
+            Put fixed instructions in `system` so only the question is compared
+    
+    Returns:
+        Generated text content (a JSON document when schema is given), or with return_details=True:
+        {"text", "overrun" (None / "max_tokens" / "prompt_too_large"), "input_tokens",
+         "cached_input_tokens" (served from the provider's prefix cache), "output_tokens",
+         "cost_usd" (None without registry pricing), "cached", "budget"}
+        plus {"data", "schema_error", "structured_mode"} when schema is given
+    """
+    model = resolve_model(model)
+    messages = build_messages(prompt, system)
+    budget = plan_budget(model, messages_text(messages), task, max_tokens)
+    if not budget.fits:
+        # Oversized prompts are stopped before anything is sent
+        return _budget_result(rejection_message(budget), budget, return_details=return_details)
+    
+    params = {"temperature": temperature, "max_tokens": budget.max_tokens, "schema": schema}
+    cache_key, cached = _cache_lookup(model, messages, use_cache, **params)
+    if cached is None:
+        semantic, cached = _semantic_lookup(model, messages, use_cache, semantic_namespace, **params)
+    if cached is not None:
+        return _budget_result(cached, budget, return_details=return_details, cached=True, schema=schema)
+    
+    def generate() -> Tuple[str, Any]:
+        text, response = _generate_text(model, messages, temperature, budget.max_tokens, schema)
+        _cache_store(cache_key, text)
+        _semantic_store(semantic, text)
+        return text, response
+    
+    # Identical deterministic requests already in flight share one provider call
+    flight_key = _flight_key(cache_key, model, messages, **params)
+    text, response = singleflight.do(flight_key, generate) if flight_key else generate()
+    return _budget_result(text, budget, response, return_details, schema=schema)
 
 
 # ============================================================================
@@ -155,35 +710,50 @@ def encode_image_b64(path: str) -> Tuple[str, str]:
     """
     mime, _ = mimetypes.guess_type(path)
     media_type = mime or "image/png"
-    with open(path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
-    return media_type, b64
+    # Shared with print_html: each artifact is read and encoded once per process
+    return media_type, blob_cache.b64(path)
 
 
-def image_anthropic_call(model_name: str, prompt: str, media_type: str, b64: str) -> str:
-    """
-    Calls Anthropic's multimodal API.
-    """
-    if not anthropic_client:
-        return "Error: Anthropic client not initialized."
-    
-    msg = anthropic_client.messages.create(
-        model=model_name,
-        max_tokens=2000,
-        temperature=0,
-        system=(
-            "You are a careful assistant. Respond with a single valid JSON object only. "
-            "Do not include markdown, code fences, or commentary outside JSON."
-        ),
-        messages=[{
+_IMAGE_JSON_SYSTEM_PROMPT = (
+    "You are a careful assistant. Respond with a single valid JSON object only. "
+    "Do not include markdown, code fences, or commentary outside JSON."
+)
+
+
+def _anthropic_image_kwargs(model_name: str, prompt: str, media_type: str, b64: str, max_tokens: int) -> Dict[str, Any]:
+    return {
+        "model": model_name,
+        "max_tokens": max_tokens,
+        "temperature": 0,
+        "system": _IMAGE_JSON_SYSTEM_PROMPT,
+        "messages": [{
             "role": "user",
             "content": [
                 {"type": "text", "text": prompt},
                 {"type": "image", "source": {"type": "base64", "media_type": media_type, "data": b64}},
             ],
         }],
-    )
-    
+    }
+
+
+def _openai_image_kwargs(model_name: str, prompt: str, media_type: str, b64: str, max_tokens: int) -> Dict[str, Any]:
+    data_url = f"data:{media_type};base64,{b64}"
+    return {
+        "model": model_name,
+        "max_tokens": max_tokens,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {"type": "image_url", "image_url": {"url": data_url}},
+                ],
+            }
+        ],
+    }
+
+
+def _join_anthropic_text(msg: Any) -> str:
     parts = []
     for block in (msg.content or []):
         if getattr(block, "type", None) == "text":
@@ -191,26 +761,636 @@ def image_anthropic_call(model_name: str, prompt: str, media_type: str, b64: str
     return "".join(parts).strip()
 
 
-def image_openai_call(model_name: str, prompt: str, media_type: str, b64: str) -> str:
+@recorded("image_anthropic")
+def image_anthropic_call(model_name: str, prompt: str, media_type: str, b64: str,
+                         max_tokens: Optional[int] = None,
+                         return_details: bool = False) -> Union[str, Dict[str, Any]]:
+    """
+    Calls Anthropic's multimodal API.
+    
+    max_tokens defaults to the "image_json" task cap (see budget.py); return_details
+    returns the same dict as get_response.
+    """
+    model_name = resolve_model(model_name)
+    budget = plan_budget(model_name, prompt, "image_json", max_tokens)
+    if not budget.fits:
+        return _budget_result(rejection_message(budget), budget, return_details=return_details)
+    anthropic_client = get_client("anthropic")
+    if not anthropic_client:
+        return _budget_result("Error: Anthropic client not initialized.", budget, return_details=return_details)
+    
+    kwargs = _anthropic_image_kwargs(model_name, prompt, media_type, b64, budget.max_tokens)
+    msg = _provider_call(model_name, lambda: anthropic_client.messages.create(**kwargs), kind="image")
+    return _budget_result(_join_anthropic_text(msg), budget, msg, return_details)
+
+
+@recorded("image_openai")
+def image_openai_call(model_name: str, prompt: str, media_type: str, b64: str,
+                      max_tokens: Optional[int] = None,
+                      return_details: bool = False) -> Union[str, Dict[str, Any]]:
     """
     Calls OpenAI-compatible multimodal API (GPT-4V, Qwen-VL, GLM-4V).
+    
+    max_tokens defaults to the "image_json" task cap (see budget.py); return_details
+    returns the same dict as get_response.
     """
+    model_name = resolve_model(model_name)
+    budget = plan_budget(model_name, prompt, "image_json", max_tokens)
+    if not budget.fits:
+        return _budget_result(rejection_message(budget), budget, return_details=return_details)
     client = get_client_for_model(model_name)
     if not client:
-        return f"Error: Client for model '{model_name}' not initialized."
+        return _budget_result(f"Error: Client for model '{model_name}' not initialized.", budget, return_details=return_details)
     
-    data_url = f"data:{media_type};base64,{b64}"
-    resp = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": data_url}},
-                ],
-            }
-        ],
+    kwargs = _openai_image_kwargs(model_name, prompt, media_type, b64, budget.max_tokens)
+    resp = _provider_call(model_name, lambda: client.chat.completions.create(**kwargs), kind="image")
+    content = resp.choices[0].message.content
+    return _budget_result((content or "").strip(), budget, resp, return_details)
+
+
+# ============================================================================
+# 5. Async Interface (Shared Connection Pools)
+# ============================================================================
+
+# event loop -> {provider: AsyncOpenAI | AsyncAnthropic}
+# httpx pools are bound to the loop that created them, so each loop gets its own set.
+_async_clients: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+
+def get_async_client(provider: str) -> Optional[Any]:
+    """
+    Returns the async SDK client for a provider, creating it on first use.
+    
+    All requests to the same provider on the running event loop share one
+    keep-alive httpx connection pool. Pool size and timeout come from the provider's
+    registry entry ("pool_size", "timeout"), overridable with LLM_POOL_MAX_CONNECTIONS,
+    LLM_POOL_MAX_KEEPALIVE, LLM_POOL_KEEPALIVE_EXPIRY and LLM_TIMEOUT.
+    
+    Args:
+        provider: Provider key (see registry.providers / resolve_provider)
+    
+    Returns:
+        AsyncOpenAI / AsyncAnthropic client, or None if the API key is missing.
+    """
+    import asyncio
+    import httpx
+    
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    if provider in clients:
+        return clients[provider]
+    
+    if not get_provider_settings(provider)[0]:
+        return None
+    
+    spec = registry.provider_spec(provider)
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("LLM_POOL_MAX_CONNECTIONS", spec["pool_size"])),
+            max_keepalive_connections=int(os.getenv("LLM_POOL_MAX_KEEPALIVE", 20)),
+            keepalive_expiry=float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", 30)),
+        ),
+        timeout=httpx.Timeout(float(os.getenv("LLM_TIMEOUT", spec["timeout"])), connect=10.0),
     )
+    client = _build_client(provider, asynchronous=True, http_client=http_client)
+    clients[provider] = client
+    return client
+
+
+async def aclose_async_clients() -> None:
+    """
+    Closes the pooled async clients bound to the running event loop.
+    """
+    import asyncio
+    
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+
+async def _agenerate_text(model: str, messages: List[Dict[str, Any]], temperature: float, max_tokens: int,
+                          schema: Optional[Dict[str, Any]] = None) -> Tuple[str, Any]:
+    provider = resolve_provider(model)
+    client = get_async_client(provider)
+    
+    if registry.provider_spec(provider)["sdk"] == "anthropic":
+        if not client:
+            return "Error: Anthropic client not initialized. Check ANTHROPIC_API_KEY.", None
+        kwargs = _anthropic_text_kwargs(model, messages, temperature, max_tokens, schema)
+        message = await _aprovider_call(model, lambda: client.messages.create(**kwargs))
+        return _anthropic_reply_text(message, schema is not None), message
+    
+    if not client:
+        return f"Error: Client for model '{model}' not initialized. Check API keys in .env file.", None
+    kwargs = _openai_text_kwargs(model, messages, temperature, max_tokens, schema)
+    try:
+        response = await _aprovider_call(model, lambda: client.chat.completions.create(**kwargs))
+    except Exception as e:
+        if schema is None or not _json_mode_rejected(model, e):
+            raise
+        kwargs = _openai_text_kwargs(model, messages, temperature, max_tokens, schema)
+        response = await _aprovider_call(model, lambda: client.chat.completions.create(**kwargs))
+    return response.choices[0].message.content, response
+
+
+@recorded("text")
+async def aget_response(
+    model: str,
+    prompt: Prompt,
+    temperature: float = 0,
+    use_cache: bool = True,
+    task: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    return_details: bool = False,
+    schema: Optional[Dict[str, Any]] = None,
+    system: Optional[str] = None,
+    semantic_namespace: Optional[str] = None,
+) -> Union[str, Dict[str, Any]]:
+    """
+    Async counterpart of get_response (same arguments and return value).
+    """
+    model = resolve_model(model)
+    messages = build_messages(prompt, system)
+    budget = plan_budget(model, messages_text(messages), task, max_tokens)
+    if not budget.fits:
+        return _budget_result(rejection_message(budget), budget, return_details=return_details)
+    
+    params = {"temperature": temperature, "max_tokens": budget.max_tokens, "schema": schema}
+    cache_key, cached = _cache_lookup(model, messages, use_cache, **params)
+    if cached is None:
+        semantic, cached = _semantic_lookup(model, messages, use_cache, semantic_namespace, **params)
+    if cached is not None:
+        return _budget_result(cached, budget, return_details=return_details, cached=True, schema=schema)
+    
+    async def generate() -> Tuple[str, Any]:
+        text, response = await _agenerate_text(model, messages, temperature, budget.max_tokens, schema)
+        _cache_store(cache_key, text)
+        _semantic_store(semantic, text)
+        return text, response
+    
+    flight_key = _flight_key(cache_key, model, messages, **params)
+    text, response = await (singleflight.ado(flight_key, generate) if flight_key else generate())
+    return _budget_result(text, budget, response, return_details, schema=schema)
+
+
+@recorded("image_anthropic")
+async def aimage_anthropic_call(model_name: str, prompt: str, media_type: str, b64: str,
+                                max_tokens: Optional[int] = None,
+                                return_details: bool = False) -> Union[str, Dict[str, Any]]:
+    """
+    Async counterpart of image_anthropic_call.
+    """
+    model_name = resolve_model(model_name)
+    budget = plan_budget(model_name, prompt, "image_json", max_tokens)
+    if not budget.fits:
+        return _budget_result(rejection_message(budget), budget, return_details=return_details)
+    client = get_async_client("anthropic")
+    if not client:
+        return _budget_result("Error: Anthropic client not initialized.", budget, return_details=return_details)
+    
+    kwargs = _anthropic_image_kwargs(model_name, prompt, media_type, b64, budget.max_tokens)
+    msg = await _aprovider_call(model_name, lambda: client.messages.create(**kwargs), kind="image")
+    return _budget_result(_join_anthropic_text(msg), budget, msg, return_details)
+
+
+@recorded("image_openai")
+async def aimage_openai_call(model_name: str, prompt: str, media_type: str, b64: str,
+                             max_tokens: Optional[int] = None,
+                             return_details: bool = False) -> Union[str, Dict[str, Any]]:
+    """
+    Async counterpart of image_openai_call.
+    """
+    model_name = resolve_model(model_name)
+    budget = plan_budget(model_name, prompt, "image_json", max_tokens)
+    if not budget.fits:
+        return _budget_result(rejection_message(budget), budget, return_details=return_details)
+    provider = resolve_provider(model_name)
+    # Mirrors get_client_for_model: non OpenAI-compatible providers fall back to OpenAI
+    client = get_async_client("openai" if registry.provider_spec(provider)["sdk"] != "openai" else provider)
+    if not client:
+        return _budget_result(f"Error: Client for model '{model_name}' not initialized.", budget, return_details=return_details)
+    
+    kwargs = _openai_image_kwargs(model_name, prompt, media_type, b64, budget.max_tokens)
+    resp = await _aprovider_call(model_name, lambda: client.chat.completions.create(**kwargs), kind="image")
     content = resp.choices[0].message.content
-    return (content or "").strip()
+    return _budget_result((content or "").strip(), budget, resp, return_details)
+
+
+# ============================================================================
+# 6. Provider Bulkheads & Batch Generation
+# ============================================================================
+
+_bulkheads: Dict[str, Bulkhead] = {}
+
+
+def get_concurrency_limit(provider: str) -> int:
+    """
+    Returns the max number of in-flight requests allowed for a provider.
+    """
+    _ensure_env()
+    override = os.getenv(f"LLM_CONCURRENCY_{provider.upper()}")
+    return max(1, int(override)) if override else registry.provider_spec(provider)["concurrency"]
+
+
+def _queue_setting(provider: str, name: str, spec_key: str, default: Optional[float]) -> Optional[float]:
+    # LLM_BULKHEAD_<NAME>_<PROVIDER> > registry spec > LLM_BULKHEAD_<NAME> > default;
+    # "none" means unbounded
+    raw = os.getenv(f"LLM_BULKHEAD_{name}_{provider.upper()}")
+    if raw is None:
+        spec = registry.provider_spec(provider)
+        if spec_key in spec:
+            return spec[spec_key]
+        raw = os.getenv(f"LLM_BULKHEAD_{name}")
+    if raw is None:
+        return default
+    return None if raw.strip().lower() in ("", "none") else float(raw)
+
+
+def get_bulkhead(provider: str) -> Bulkhead:
+    """
+    Returns the process-wide bulkhead of a provider (shared by every thread and loop).
+    
+    Every sync, async, streaming and batch call to the provider holds one of its
+    slots, so a burst of batch jobs queues behind the limit instead of exhausting
+    the vendor's rate limit for interactive sessions.
+    """
+    bulkhead = _bulkheads.get(provider)
+    if bulkhead is not None:
+        return bulkhead
+    with _clients_lock:
+        if provider not in _bulkheads:
+            _ensure_env()
+            max_queue = _queue_setting(provider, "QUEUE", "max_queue", 64)
+            _bulkheads[provider] = Bulkhead(
+                provider,
+                get_concurrency_limit(provider),
+                max_queue=int(max_queue) if max_queue is not None else None,
+                queue_timeout=_queue_setting(provider, "TIMEOUT", "queue_timeout", 120.0),
+            )
+        return _bulkheads[provider]
+
+
+def configure_bulkhead(provider: str, limit: Optional[int] = None, **kwargs: Any) -> Dict[str, Any]:
+    """
+    Resizes a provider bulkhead at runtime.
+    
+    Args:
+        provider: Provider key (e.g. "qwen")
+        limit: Maximum concurrent calls
+        max_queue: Maximum waiting callers (0 = fail fast, None = unbounded)
+        queue_timeout: Maximum seconds to wait for a slot (None = wait forever)
+    
+    Returns:
+        The bulkhead's stats after the change
+    
+    Examples:
+        >>> configure_bulkhead("qwen", limit=4, max_queue=0)   # reject instead of queueing
+    """
+    bulkhead = get_bulkhead(provider)
+    bulkhead.configure(limit=limit, **kwargs)
+    return bulkhead.stats()
+
+
+def bulkhead_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Returns {provider: {"limit", "in_flight", "queued", "admitted", "rejected", ...}}.
+    """
+    return {provider: bulkhead.stats() for provider, bulkhead in list(_bulkheads.items())}
+
+
+def _batch_result(outputs: List[Tuple[Optional[str], Optional[str]]], elapsed: float, concurrency: int) -> Dict[str, Any]:
+    results = [text for text, _ in outputs]
+    errors = [error for _, error in outputs]
+    failed = sum(1 for error in errors if error is not None)
+    return {
+        "results": results,
+        "errors": errors,
+        "stats": {
+            "total": len(outputs),
+            "succeeded": len(outputs) - failed,
+            "failed": failed,
+            "elapsed_s": elapsed,
+            "throughput_rps": len(outputs) / elapsed if elapsed > 0 else 0.0,
+            "concurrency": concurrency,
+        },
+    }
+
+
+def _as_item_result(text: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    # get_response reports configuration problems as "Error: ..." strings
+    if text is not None and text.startswith("Error:"):
+        return None, text
+    return text, None
+
+
+def get_responses(
+    model: str,
+    prompts: List[Prompt],
+    temperature: float = 0,
+    max_concurrency: Optional[int] = None,
+    use_cache: bool = True,
+    task: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    schema: Optional[Dict[str, Any]] = None,
+    system: Optional[str] = None,
+    semantic_namespace: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Runs get_response over many prompts concurrently (thread pool, notebook friendly).
+    
+    Concurrency is capped by the provider bulkhead (see get_bulkhead), which is
+    shared with every other batch and interactive call running in the process.
+    Items refused by the bulkhead come back as "BulkheadRejectedError: ..." errors.
+    
+    Args:
+        model: Model name
+        prompts: List of user prompts (or message lists)
+        temperature: Temperature (0-1)
+        max_concurrency: Optional lower cap for this batch
+        use_cache: Set to False to bypass the response cache
+        task / max_tokens: Output budget for every prompt (see get_response)
+        schema: JSON schema every reply must follow (see get_response)
+        system: Shared system prompt; one cached prefix serves the whole batch
+        semantic_namespace: Semantic cache namespace (see get_response)
+    
+    Returns:
+        {
+            "results": [text or None, ...],   # same order as prompts
+            "errors": [None or "ErrorType: message", ...],
+            "stats": {"total", "succeeded", "failed", "elapsed_s", "throughput_rps", "concurrency"},
+        }
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    # Tiers are routed once for the whole batch
+    model = resolve_model(model)
+    provider = resolve_provider(model)
+    workers = get_concurrency_limit(provider)
+    if max_concurrency:
+        workers = min(workers, max_concurrency)
+    workers = max(1, min(workers, len(prompts)))
+    
+    def run_one(prompt: Prompt) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            return _as_item_result(get_response(model, prompt, temperature=temperature, use_cache=use_cache,
+                                                task=task, max_tokens=max_tokens, schema=schema, system=system,
+                                                semantic_namespace=semantic_namespace))
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}"
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-batch") as pool:
+        outputs = list(pool.map(run_one, prompts))
+    return _batch_result(outputs, time.perf_counter() - start, workers)
+
+
+async def aget_responses(
+    model: str,
+    prompts: List[Prompt],
+    temperature: float = 0,
+    max_concurrency: Optional[int] = None,
+    use_cache: bool = True,
+    task: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    schema: Optional[Dict[str, Any]] = None,
+    system: Optional[str] = None,
+    semantic_namespace: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Async counterpart of get_responses (same arguments and return value).
+    
+    As with the thread pool of get_responses, each batch also has its own cap:
+    at most min(provider limit, max_concurrency) of its prompts are in flight or
+    waiting for a bulkhead slot at once. The shared bulkhead still bounds the
+    whole process; the per-batch cap keeps one large batch from filling the
+    bulkhead queue (and getting its own items rejected) on its own.
+    """
+    import asyncio
+    
+    model = resolve_model(model)
+    provider = resolve_provider(model)
+    limit = get_concurrency_limit(provider)
+    concurrency = min(limit, max_concurrency) if max_concurrency else limit
+    batch_semaphore = asyncio.Semaphore(concurrency)
+    
+    async def run_one(prompt: Prompt) -> Tuple[Optional[str], Optional[str]]:
+        async with batch_semaphore:
+            try:
+                return _as_item_result(await aget_response(model, prompt, temperature=temperature, use_cache=use_cache,
+                                                           task=task, max_tokens=max_tokens, schema=schema, system=system,
+                                                           semantic_namespace=semantic_namespace))
+            except Exception as e:
+                return None, f"{type(e).__name__}: {e}"
+    
+    start = time.perf_counter()
+    outputs = await asyncio.gather(*(run_one(p) for p in prompts))
+    return _batch_result(list(outputs), time.perf_counter() - start, concurrency)
+
+
+# ============================================================================
+# 7. Unified Streaming
+# ============================================================================
+
+@dataclass
+class StreamDelta:
+    """
+    One streamed text fragment plus timing information (seconds).
+    """
+    text: str
+    index: int         # 0-based position of this delta in the stream
+    ttft: float        # Time from request start to the first token
+    elapsed: float     # Time from request start to this delta
+    since_last: float  # Gap since the previous delta (0 for the first one)
+
+
+def _stream_kwargs(model: str, messages: List[Dict[str, Any]], temperature: float, max_tokens: int) -> Dict[str, Any]:
+    if is_anthropic_model(model):
+        return dict(_anthropic_text_kwargs(model, messages, temperature, max_tokens), stream=True)
+    # include_usage adds a final chunk (empty `choices`) carrying the token counts
+    return {"model": model, "max_tokens": max_tokens, "temperature": temperature, "messages": messages,
+            "stream": True, "stream_options": {"include_usage": True}}
+
+
+def _stream_usage(event: Any, usage: Dict[str, int], anthropic: bool) -> None:
+    if not anthropic:
+        # OpenAI-compatible vendors report usage once, on the final chunk
+        if getattr(event, "usage", None) is not None:
+            usage["input"], usage["output"] = usage_tokens(event)
+            usage["cached"] = cached_input_tokens(event)
+        return
+    # Anthropic reports input tokens on message_start and output tokens on message_delta
+    event_type = getattr(event, "type", None)
+    if event_type == "message_start":
+        usage["input"] = getattr(event.message.usage, "input_tokens", 0) or 0
+        usage["cached"] = getattr(event.message.usage, "cache_read_input_tokens", 0) or 0
+    elif event_type == "message_delta" and getattr(event, "usage", None) is not None:
+        usage["output"] = getattr(event.usage, "output_tokens", 0) or 0
+
+
+def _delta_text(event: Any, anthropic: bool) -> Optional[str]:
+    if anthropic:
+        # Only content_block_delta events carry text
+        if getattr(event, "type", None) == "content_block_delta" and getattr(event.delta, "type", None) == "text_delta":
+            return event.delta.text
+        return None
+    # Some OpenAI-compatible vendors send chunks with empty `choices`
+    if not event.choices:
+        return None
+    return event.choices[0].delta.content
+
+
+class _DeltaClock:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = None
+        self.ttft = None
+        self.index = 0
+    
+    def tick(self, text: str) -> StreamDelta:
+        now = time.perf_counter()
+        if self.ttft is None:
+            self.ttft = now - self.start
+        delta = StreamDelta(
+            text=text,
+            index=self.index,
+            ttft=self.ttft,
+            elapsed=now - self.start,
+            since_last=0.0 if self.last is None else now - self.last,
+        )
+        self.last = now
+        self.index += 1
+        return delta
+
+
+def _record_stream(model: str, clock: "_DeltaClock", usage: Dict[str, int], error: Optional[BaseException]) -> None:
+    provider = resolve_provider(model)
+    metrics.record_call(
+        provider, model, "stream", time.perf_counter() - clock.start,
+        ttft=clock.ttft,
+        input_tokens=usage.get("input"),
+        output_tokens=usage.get("output"),
+        error=type(error).__name__ if error is not None else None,
+        cached_input_tokens=usage.get("cached"),
+    )
+    cost = registry.cost(model, usage.get("input"), usage.get("output"), usage.get("cached"))
+    if cost:
+        metrics.inc("llm_cost_usd_total", {"provider": provider, "model": model}, cost)
+
+
+def stream_response(
+    model: str,
+    messages: Union[str, List[Dict[str, Any]]],
+    temperature: float = 0,
+    task: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    system: Optional[str] = None,
+) -> Iterator[StreamDelta]:
+    """
+    Streams text deltas uniformly for Claude and OpenAI-compatible providers.
+    
+    Breaking out of the loop closes the underlying HTTP stream, so callers can
+    stop generation early.
+    
+    Args:
+        model: Model name
+        messages: Prompt string or OpenAI-style message list (system messages are
+            mapped to Anthropic's `system` parameter)
+        temperature: Temperature (0-1)
+        task: Output budget by task type (see budget.py), as in get_response
+        max_tokens: Explicit output cap (overrides the task cap); the planned budget is
+            sent to every provider (Anthropic requires one)
+        system: System prompt, sent first as in get_response
+    
+    Yields:
+        StreamDelta(text, index, ttft, elapsed, since_last); a single delta carrying the
+        budget rejection when the prompt does not fit the model's context
+    
+    Examples:
+        >>> for delta in stream_response("qwen-plus", "Write a haiku"):
+        ...     print(delta.text, end="", flush=True)
+    """
+    model = resolve_model(model)
+    anthropic = is_anthropic_model(model)
+    client = get_client("anthropic") if anthropic else get_client_for_model(model)
+    clock = _DeltaClock()
+    if not client:
+        yield clock.tick(f"Error: Client for model '{model}' not initialized. Check API keys in .env file.")
+        return
+    
+    messages = build_messages(messages, system)
+    budget = plan_budget(model, messages_text(messages), task, max_tokens)
+    if not budget.fits:
+        # Oversized prompts are stopped before anything is sent
+        yield clock.tick(rejection_message(budget))
+        return
+    
+    kwargs = _stream_kwargs(model, messages, temperature, budget.max_tokens)
+    usage: Dict[str, int] = {}
+    error: Optional[BaseException] = None
+    stream = None
+    # An open stream holds its provider bulkhead slot until it is closed; opening it
+    # is retried and goes through the router's circuit breaker like any other call
+    with get_bulkhead(resolve_provider(model)).slot():
+        try:
+            create = client.messages.create if anthropic else client.chat.completions.create
+            stream = _open_stream(model, lambda: create(**kwargs))
+            for event in stream:
+                _stream_usage(event, usage, anthropic)
+                text = _delta_text(event, anthropic)
+                if text:
+                    yield clock.tick(text)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if stream is not None:
+                stream.close()
+            _record_stream(model, clock, usage, error)
+
+
+async def astream_response(
+    model: str,
+    messages: Union[str, List[Dict[str, Any]]],
+    temperature: float = 0,
+    task: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    system: Optional[str] = None,
+) -> AsyncIterator[StreamDelta]:
+    """
+    Async counterpart of stream_response (uses the pooled async clients).
+    """
+    model = resolve_model(model)
+    anthropic = is_anthropic_model(model)
+    client = get_async_client(resolve_provider(model))
+    clock = _DeltaClock()
+    if not client:
+        yield clock.tick(f"Error: Client for model '{model}' not initialized. Check API keys in .env file.")
+        return
+    
+    messages = build_messages(messages, system)
+    budget = plan_budget(model, messages_text(messages), task, max_tokens)
+    if not budget.fits:
+        # Oversized prompts are stopped before anything is sent
+        yield clock.tick(rejection_message(budget))
+        return
+    
+    kwargs = _stream_kwargs(model, messages, temperature, budget.max_tokens)
+    usage: Dict[str, int] = {}
+    error: Optional[BaseException] = None
+    stream = None
+    async with get_bulkhead(resolve_provider(model)).aslot():
+        try:
+            create = client.messages.create if anthropic else client.chat.completions.create
+            stream = await _aopen_stream(model, lambda: create(**kwargs))
+            async for event in stream:
+                _stream_usage(event, usage, anthropic)
+                text = _delta_text(event, anthropic)
+                if text:
+                    yield clock.tick(text)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if stream is not None:
+                await stream.close()
+            _record_stream(model, clock, usage, error)
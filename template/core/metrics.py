@@ -0,0 +1,300 @@
+"""
+In-Process LLM Metrics Registry
+
+This module records per-call latency, token usage and errors for every provider
+request and exports them for dashboards.
+
+It handles:
+1. Counters, gauges and histograms keyed by labels (provider, model, kind, ...)
+2. Quantile estimates (p50 / p90 / p99) from a bounded sample reservoir
+3. Prometheus text exposition format and JSON snapshots
+"""
+
+import json
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers fast cached-prefix calls up to long multimodal generations
+DEFAULT_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = [
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in items
+    ]
+    return "{" + ",".join(escaped) + "}"
+
+
+def _quantile(sorted_values: Sequence[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Histogram:
+    """
+    Cumulative bucket counts plus a reservoir of recent samples for quantiles.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS, reservoir: int = 2048):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.samples: Deque[float] = deque(maxlen=reservoir)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def quantiles(self) -> Dict[str, Optional[float]]:
+        values = sorted(self.samples)
+        return {"p50": _quantile(values, 0.50), "p90": _quantile(values, 0.90), "p99": _quantile(values, 0.99)}
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of counters, gauges and histograms.
+
+    Use the module-level `metrics` instance; every core entry point records into it.
+    """
+
+    HELP = {
+        "llm_requests_total": "LLM provider calls by outcome.",
+        "llm_errors_total": "LLM provider calls that raised, by error class.",
+        "llm_input_tokens_total": "Prompt tokens reported by the provider.",
+        "llm_output_tokens_total": "Completion tokens reported by the provider.",
+        "llm_cached_input_tokens_total": "Prompt tokens served from the provider's prompt-prefix cache.",
+        "llm_semantic_cache_total": "Semantic cache lookups by result (hit / miss).",
+        "llm_cost_usd_total": "Estimated spend in USD from registry pricing (config/models.json).",
+        "llm_request_duration_seconds": "Wall time of an LLM call, including retries.",
+        "llm_time_to_first_token_seconds": "Time until the first streamed token.",
+        "llm_budget_overruns_total": "Calls rejected for prompt size or truncated by max_tokens.",
+        "llm_structured_outputs_total": "Schema-constrained calls by enforcement mode and parse outcome.",
+        "llm_cascade_calls_total": "Cascade calls by the model that produced the accepted reply.",
+        "llm_cascade_escalations_total": "Cascade stages whose reply failed validation, by reason.",
+        "llm_bulkhead_in_flight": "Provider calls currently holding a bulkhead slot.",
+        "llm_bulkhead_queue_depth": "Callers waiting for a provider bulkhead slot.",
+        "llm_bulkhead_wait_seconds": "Time spent waiting for a provider bulkhead slot.",
+        "llm_bulkhead_rejections_total": "Calls refused by a provider bulkhead (queue_full / timeout).",
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+
+    # ------------------------------------------------------------------
+    # Primitives
+    # ------------------------------------------------------------------
+
+    def inc(self, name: str, labels: Optional[Dict[str, Any]] = None, value: float = 1.0) -> None:
+        key = _label_key(labels or {})
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None) -> None:
+        key = _label_key(labels or {})
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None,
+                buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> None:
+        key = _label_key(labels or {})
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(buckets)
+            hist.observe(value)
+
+    # ------------------------------------------------------------------
+    # LLM call recording
+    # ------------------------------------------------------------------
+
+    def record_call(
+        self,
+        provider: str,
+        model: str,
+        kind: str,
+        wall_time: float,
+        ttft: Optional[float] = None,
+        input_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+        error: Optional[str] = None,
+        cached_input_tokens: Optional[int] = None,
+    ) -> None:
+        """
+        Records one LLM call.
+
+        Args:
+            provider: Provider key (e.g. "qwen")
+            model: Model name
+            kind: Entry point family ("text", "image", "stream", "think", ...)
+            wall_time: Seconds from request start to completion (or failure)
+            ttft: Seconds to the first streamed token (streaming calls only)
+            input_tokens / output_tokens: From the provider's `usage` block
+            error: Exception class name if the call failed
+            cached_input_tokens: Prompt tokens read from the provider's prefix cache
+        """
+        labels = {"provider": provider, "model": model, "kind": kind}
+        self.inc("llm_requests_total", dict(labels, status="error" if error else "ok"))
+        self.observe("llm_request_duration_seconds", wall_time, labels)
+        if ttft is not None:
+            self.observe("llm_time_to_first_token_seconds", ttft, labels)
+        if input_tokens:
+            self.inc("llm_input_tokens_total", labels, input_tokens)
+        if output_tokens:
+            self.inc("llm_output_tokens_total", labels, output_tokens)
+        if cached_input_tokens:
+            self.inc("llm_cached_input_tokens_total", labels, cached_input_tokens)
+        if error:
+            self.inc("llm_errors_total", dict(labels, error=error))
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    def export_prometheus(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {self.HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+            for name, series in sorted(self._gauges.items()):
+                lines.append(f"# HELP {name} {self.HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {self.HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in series.items():
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {hist.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns a JSON-serializable snapshot (counters, gauges + histogram quantiles).
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(key), "value": value}
+                for name, series in self._counters.items()
+                for key, value in series.items()
+            ]
+            gauges = [
+                {"name": name, "labels": dict(key), "value": value}
+                for name, series in self._gauges.items()
+                for key, value in series.items()
+            ]
+            histograms = [
+                dict({"name": name, "labels": dict(key), "count": hist.count, "sum": hist.sum}, **hist.quantiles())
+                for name, series in self._histograms.items()
+                for key, hist in series.items()
+            ]
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent)
+
+    def summary(self, name: str = "llm_request_duration_seconds",
+                group_by: Iterable[str] = ("provider",)) -> Dict[str, Dict[str, Any]]:
+        """
+        Merges histogram samples per group and returns count / p50 / p90 / p99.
+
+        Examples:
+            >>> metrics.summary()                        # latency per provider
+            >>> metrics.summary(group_by=("model",))     # latency per model
+        """
+        group_by = tuple(group_by)
+        merged: Dict[str, List[float]] = {}
+        with self._lock:
+            for key, hist in self._histograms.get(name, {}).items():
+                labels = dict(key)
+                group = "/".join(labels.get(g, "") for g in group_by)
+                merged.setdefault(group, []).extend(hist.samples)
+        result = {}
+        for group, values in merged.items():
+            values.sort()
+            result[group] = {
+                "count": len(values),
+                "p50": _quantile(values, 0.50),
+                "p90": _quantile(values, 0.90),
+                "p99": _quantile(values, 0.99),
+            }
+        return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+metrics = MetricsRegistry()
+
+
+def usage_tokens(response: Any) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Extracts (input_tokens, output_tokens) from an OpenAI or Anthropic response.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None, None
+    input_tokens = getattr(usage, "input_tokens", None)
+    if input_tokens is None:
+        input_tokens = getattr(usage, "prompt_tokens", None)
+    output_tokens = getattr(usage, "output_tokens", None)
+    if output_tokens is None:
+        output_tokens = getattr(usage, "completion_tokens", None)
+    return input_tokens, output_tokens
+
+
+def cached_input_tokens(response: Any) -> Optional[int]:
+    """
+    Extracts prompt tokens served from the provider's prefix cache.
+
+    Anthropic: usage.cache_read_input_tokens; OpenAI / Qwen / Kimi:
+    usage.prompt_tokens_details.cached_tokens; DeepSeek: usage.prompt_cache_hit_tokens.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    # Some compatible vendors echo several of these fields; take the one that is set
+    reported = [
+        getattr(usage, "cache_read_input_tokens", None),
+        getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None),
+        getattr(usage, "prompt_cache_hit_tokens", None),
+    ]
+    reported = [value for value in reported if isinstance(value, int)]
+    return max(reported) if reported else None
@@ -0,0 +1,301 @@
+"""
+Model Registry
+
+Single source of truth for "which provider serves this model, how do we connect
+to it, how many calls may run at once and what does it cost".
+
+It handles:
+1. Built-in provider specs (API key / base URL env vars, SDK family, timeout,
+   pool size, concurrency limit, native JSON mode, name markers; optional
+   bulkhead "max_queue" / "queue_timeout")
+2. A config file (config/models.json, or LLM_MODELS_CONFIG) that adds models,
+   prefixes, pricing, tiers, cascades and extra providers without code changes
+3. Memoized resolution: each model name is matched once, then served from a dict
+
+Resolution order for a model name: exact id, longest "prefix*" entry, provider
+name markers (e.g. "qwen" -> qwen), then the default provider.
+
+Usage:
+    >>> registry.resolve_provider("qwen3-max")
+    'qwen'
+    >>> registry.cost("deepseek-chat", input_tokens=12000, output_tokens=800)
+    0.00412
+    >>> registry.register_provider("local", api_key_env="LOCAL_API_KEY",
+    ...                            default_base_url="http://localhost:8000/v1", match=["llama"])
+"""
+
+import os
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+# Provider key -> connection and capacity settings. Env overrides still apply at use
+# time (LLM_CONCURRENCY_<PROVIDER>, LLM_TIMEOUT, LLM_POOL_MAX_CONNECTIONS, ...).
+# Order matters for "match": the first provider whose marker occurs in the name wins
+# (OpenAI has no markers; it is the default for everything unmatched).
+DEFAULT_PROVIDERS: Dict[str, Dict[str, Any]] = {
+    "openai": {
+        "label": "OpenAI",
+        "api_key_env": "OPENAI_API_KEY",
+        "base_url_env": "OPENAI_BASE_URL",
+        "default_base_url": None,
+        "sdk": "openai",
+        "concurrency": 16,
+        "timeout": 60.0,
+        "pool_size": 100,
+        "json_mode": "json_schema",
+        "match": [],
+    },
+    "anthropic": {
+        "label": "Anthropic",
+        "api_key_env": "ANTHROPIC_API_KEY",
+        "base_url_env": "ANTHROPIC_BASE_URL",
+        "default_base_url": None,
+        "sdk": "anthropic",
+        "concurrency": 8,
+        "timeout": 60.0,
+        "pool_size": 100,
+        "json_mode": "tool",
+        "match": ["claude", "anthropic"],
+    },
+    "qwen": {
+        "label": "Qwen",
+        "api_key_env": "QWEN_API_KEY",
+        "base_url_env": "QWEN_BASE_URL",
+        "default_base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1",
+        "sdk": "openai",
+        "concurrency": 8,
+        "timeout": 60.0,
+        "pool_size": 100,
+        "json_mode": "json_object",
+        "match": ["qwen"],
+    },
+    "zhipu": {
+        "label": "Zhipu",
+        "api_key_env": "ZHIPU_API_KEY",
+        "base_url_env": "ZHIPU_BASE_URL",
+        "default_base_url": "https://open.bigmodel.cn/api/paas/v4/",
+        "sdk": "openai",
+        "concurrency": 8,
+        "timeout": 60.0,
+        "pool_size": 100,
+        "json_mode": "json_object",
+        "match": ["glm"],
+    },
+    "deepseek": {
+        "label": "DeepSeek",
+        "api_key_env": "DEEPSEEK_API_KEY",
+        "base_url_env": "DEEPSEEK_BASE_URL",
+        "default_base_url": "https://api.deepseek.com",
+        "sdk": "openai",
+        "concurrency": 8,
+        "timeout": 60.0,
+        "pool_size": 100,
+        "json_mode": "json_object",
+        "match": ["deepseek"],
+    },
+    "kimi": {
+        "label": "Moonshot",
+        "api_key_env": "MOONSHOT_API_KEY",
+        "base_url_env": "MOONSHOT_BASE_URL",
+        "default_base_url": "https://api.moonshot.cn/v1",
+        "sdk": "openai",
+        "concurrency": 4,
+        "timeout": 60.0,
+        "pool_size": 100,
+        "json_mode": "json_object",
+        "match": ["kimi", "moonshot"],
+    },
+}
+
+DEFAULT_PROVIDER = "openai"
+
+
+def _new_provider(name: str) -> Dict[str, Any]:
+    # Template for providers added by config / register_provider: OpenAI-compatible,
+    # credentials from <NAME>_API_KEY / <NAME>_BASE_URL
+    return dict(
+        DEFAULT_PROVIDERS[DEFAULT_PROVIDER],
+        label=name,
+        api_key_env=f"{name.upper()}_API_KEY",
+        base_url_env=f"{name.upper()}_BASE_URL",
+        json_mode="json_object",
+        match=[],
+    )
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "models.json")
+
+
+class ModelRegistry:
+    """
+    Maps model names to providers, connection settings and pricing.
+
+    Use the module-level `registry` instance. The config file is read lazily, on
+    the first lookup, so importing core stays cheap.
+    """
+
+    def __init__(self, providers: Optional[Dict[str, Dict[str, Any]]] = None, path: Optional[str] = None):
+        self.providers: Dict[str, Dict[str, Any]] = {
+            name: dict(spec) for name, spec in (providers or DEFAULT_PROVIDERS).items()
+        }
+        self.default_provider = DEFAULT_PROVIDER
+        self.path = path
+        self._models: Dict[str, Dict[str, Any]] = {}
+        self._prefixes: List[str] = []
+        self._tiers: Dict[str, List[str]] = {}
+        self._cascades: Dict[str, List[str]] = {}
+        self._resolved: Dict[str, Dict[str, Any]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def load(self, path: Optional[str] = None) -> "ModelRegistry":
+        """
+        Reads the config file (once). Missing files are fine: built-ins are used.
+
+        File format:
+            {
+              "providers": {"<key>": {<provider spec fields, merged onto built-ins>}},
+              "models": {"<model id or prefix*>": {"provider", "pricing": {"input", "output",
+                         "cached_input"} (USD per 1M tokens), "context_window"}},
+              "tiers": {"<tier>": ["<model>", ...]},
+              "cascades": {"<name>": ["<cheapest model>", ..., "<strongest model>"]},
+              "default_provider": "openai"
+            }
+        """
+        with self._lock:
+            if self._loaded and path is None:
+                return self
+            path = path or self.path or os.getenv("LLM_MODELS_CONFIG") or DEFAULT_CONFIG_PATH
+            config: Dict[str, Any] = {}
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+            self.path = path
+            for name, spec in config.get("providers", {}).items():
+                self.providers[name] = dict(self.providers.get(name) or _new_provider(name), **spec)
+            self.default_provider = config.get("default_provider", self.default_provider)
+            self._models.update({k.lower(): v for k, v in config.get("models", {}).items()})
+            self._tiers.update(config.get("tiers", {}))
+            self._cascades.update(config.get("cascades", {}))
+            self._reindex()
+            self._loaded = True
+        if self._tiers:
+            from .router import configure_tiers
+            configure_tiers(self._tiers)
+        if self._cascades:
+            from .cascade import configure_cascades
+            configure_cascades(self._cascades)
+        return self
+
+    def _reindex(self) -> None:
+        # Called with the lock held
+        self._prefixes = sorted((k[:-1] for k in self._models if k.endswith("*")), key=len, reverse=True)
+        self._resolved.clear()
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    # ------------------------------------------------------------------
+    # Registration
+    # ------------------------------------------------------------------
+
+    def register_provider(self, name: str, **spec: Any) -> Dict[str, Any]:
+        """
+        Adds a provider (OpenAI-compatible unless sdk="anthropic") or updates one.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            self.providers[name] = dict(self.providers.get(name) or _new_provider(name), **spec)
+            self._resolved.clear()
+            return self.providers[name]
+
+    def register_model(self, model: str, provider: str, **fields: Any) -> None:
+        """
+        Maps a model id (or "prefix*") to a provider, with optional pricing.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            self._models[model.lower()] = dict(fields, provider=provider)
+            self._reindex()
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def lookup(self, model: str) -> Dict[str, Any]:
+        """
+        Returns {"provider", "pricing", "context_window", ...} for a model name.
+        """
+        entry = self._resolved.get(model)
+        if entry is not None:
+            return entry
+        self._ensure_loaded()
+        entry = self._match(model.lower())
+        self._resolved[model] = entry
+        return entry
+
+    def _match(self, model_lower: str) -> Dict[str, Any]:
+        entry = self._models.get(model_lower)
+        if entry is None:
+            prefix = next((p for p in self._prefixes if model_lower.startswith(p)), None)
+            entry = self._models[prefix + "*"] if prefix is not None else None
+        if entry is not None and entry.get("provider") in self.providers:
+            return entry
+        for name, spec in self.providers.items():
+            if any(marker in model_lower for marker in spec.get("match", ())):
+                return dict(entry or {}, provider=name)
+        return dict(entry or {}, provider=self.default_provider)
+
+    def resolve_provider(self, model: str) -> str:
+        return self.lookup(model)["provider"]
+
+    def provider_spec(self, provider: str) -> Dict[str, Any]:
+        self._ensure_loaded()
+        return self.providers[provider]
+
+    def tiers(self) -> Dict[str, List[str]]:
+        self._ensure_loaded()
+        return dict(self._tiers)
+
+    def cost(self, model: str, input_tokens: Optional[int], output_tokens: Optional[int],
+             cached_input_tokens: Optional[int] = None) -> Optional[float]:
+        """
+        Returns the USD cost of one call, or None if the model has no pricing.
+
+        Anthropic reports cached reads separately from input_tokens; OpenAI-compatible
+        vendors include them in prompt_tokens, so they are subtracted there.
+        """
+        entry = self.lookup(model)
+        pricing = entry.get("pricing")
+        if not pricing or (input_tokens is None and output_tokens is None):
+            return None
+        cached = cached_input_tokens or 0
+        uncached = input_tokens or 0
+        if self.providers[entry["provider"]].get("sdk") != "anthropic":
+            uncached = max(0, uncached - cached)
+        cost = (
+            uncached * pricing.get("input", 0.0)
+            + cached * pricing.get("cached_input", pricing.get("input", 0.0))
+            + (output_tokens or 0) * pricing.get("output", 0.0)
+        )
+        return cost / 1_000_000
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._ensure_loaded()
+        with self._lock:
+            return {
+                "path": self.path,
+                "providers": sorted(self.providers),
+                "models": len(self._models),
+                "resolved": len(self._resolved),
+                "tiers": dict(self._tiers),
+                "cascades": dict(self._cascades),
+            }
+
+
+registry = ModelRegistry()
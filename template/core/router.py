@@ -0,0 +1,252 @@
+"""
+Latency-Aware Model Router
+
+This module tracks the health of every provider endpoint and routes "tier" requests
+(groups of equivalent models) to the healthiest one.
+
+It handles:
+1. EWMA latency and EWMA error rate per provider
+2. Circuit breakers (closed -> open after repeated failures -> half-open probe)
+3. Tier routing, e.g. "tier:fast" -> glm-4-flash / qwen-turbo / deepseek-chat
+"""
+
+import time
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from .resilience import is_retryable
+
+T = TypeVar("T")
+
+# Equivalent-quality model groups; "tier:<name>" can be passed wherever a model name is expected
+DEFAULT_TIERS: Dict[str, List[str]] = {
+    "fast": ["glm-4-flash", "qwen-turbo", "deepseek-chat"],
+}
+
+TIER_PREFIX = "tier:"
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised when a provider's circuit breaker is open and the call is rejected.
+    """
+
+
+class ProviderHealth:
+    """
+    Health statistics and circuit breaker state for one provider endpoint.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.ewma_latency: Optional[float] = None
+        self.ewma_error_rate = 0.0
+        self.consecutive_failures = 0
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "ewma_latency": self.ewma_latency,
+            "ewma_error_rate": self.ewma_error_rate,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class ModelRouter:
+    """
+    Tracks provider health and picks the healthiest model of a tier.
+
+    Thread-safe; use the module-level `router` instance.
+    """
+
+    def __init__(
+        self,
+        tiers: Optional[Dict[str, List[str]]] = None,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        alpha: float = 0.2,
+        default_latency: float = 1.0,
+    ):
+        """
+        Args:
+            tiers: Tier name -> list of equivalent models
+            failure_threshold: Consecutive failures that open the breaker
+            cooldown: Seconds an open breaker waits before allowing a probe
+            alpha: EWMA smoothing factor (higher = reacts faster)
+            default_latency: Assumed latency (s) for endpoints without history
+        """
+        self.tiers = dict(tiers if tiers is not None else DEFAULT_TIERS)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self.default_latency = default_latency
+        self._health: Dict[str, ProviderHealth] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Health bookkeeping
+    # ------------------------------------------------------------------
+
+    def _get(self, provider: str) -> ProviderHealth:
+        health = self._health.get(provider)
+        if health is None:
+            health = self._health[provider] = ProviderHealth(self.alpha)
+        return health
+
+    def _available(self, health: ProviderHealth, now: float) -> bool:
+        if health.state == ProviderHealth.CLOSED:
+            return True
+        if health.state == ProviderHealth.OPEN and now - health.opened_at >= self.cooldown:
+            health.state = ProviderHealth.HALF_OPEN
+        return health.state == ProviderHealth.HALF_OPEN and not health.probe_in_flight
+
+    def acquire(self, provider: str) -> None:
+        """
+        Admits a call to provider or raises CircuitOpenError.
+        """
+        with self._lock:
+            health = self._get(provider)
+            if not self._available(health, time.monotonic()):
+                raise CircuitOpenError(f"Circuit open for provider '{provider}'")
+            if health.state == ProviderHealth.HALF_OPEN:
+                health.probe_in_flight = True
+
+    def record_success(self, provider: str, latency: float) -> None:
+        with self._lock:
+            health = self._get(provider)
+            a = self.alpha
+            health.ewma_latency = latency if health.ewma_latency is None else a * latency + (1 - a) * health.ewma_latency
+            health.ewma_error_rate = (1 - a) * health.ewma_error_rate
+            health.consecutive_failures = 0
+            health.state = ProviderHealth.CLOSED
+            health.probe_in_flight = False
+
+    def record_failure(self, provider: str) -> None:
+        with self._lock:
+            health = self._get(provider)
+            health.ewma_error_rate = self.alpha + (1 - self.alpha) * health.ewma_error_rate
+            health.consecutive_failures += 1
+            if health.state == ProviderHealth.HALF_OPEN or health.consecutive_failures >= self.failure_threshold:
+                health.state = ProviderHealth.OPEN
+                health.opened_at = time.monotonic()
+            health.probe_in_flight = False
+
+    def release(self, provider: str) -> None:
+        # A call that ended with a non-health error (e.g. 400) still frees the half-open probe slot
+        with self._lock:
+            self._get(provider).probe_in_flight = False
+
+    def _finish(self, provider: str, start: float, error: Optional[BaseException]) -> None:
+        if error is None:
+            self.record_success(provider, time.perf_counter() - start)
+        elif is_retryable(error):
+            self.record_failure(provider)
+        else:
+            self.release(provider)
+
+    def call(self, provider: str, fn: Callable[[], T]) -> T:
+        """
+        Runs fn() through provider's circuit breaker and records the outcome.
+        """
+        self.acquire(provider)
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(provider, start, e)
+            raise
+        self._finish(provider, start, None)
+        return result
+
+    async def acall(self, provider: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Async counterpart of call.
+        """
+        self.acquire(provider)
+        start = time.perf_counter()
+        try:
+            result = await fn()
+        except Exception as e:
+            self._finish(provider, start, e)
+            raise
+        except BaseException:
+            # Cancellation (e.g. a lost hedge) says nothing about provider health
+            self.release(provider)
+            raise
+        self._finish(provider, start, None)
+        return result
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def score(self, provider: str) -> float:
+        """
+        Lower is better: EWMA latency inflated by the EWMA error rate.
+        """
+        health = self._health.get(provider)
+        if health is None or health.ewma_latency is None:
+            latency = self.default_latency
+            error_rate = health.ewma_error_rate if health else 0.0
+        else:
+            latency, error_rate = health.ewma_latency, health.ewma_error_rate
+        return latency * (1 + 4 * error_rate)
+
+    def route(self, tier: str, resolve_provider: Callable[[str], str],
+              is_configured: Callable[[str], bool] = lambda provider: True) -> str:
+        """
+        Returns the healthiest model of a tier.
+
+        Args:
+            tier: Tier name (with or without the "tier:" prefix)
+            resolve_provider: Maps a model name to its provider key
+            is_configured: Filters out providers without credentials
+
+        Raises:
+            KeyError: Unknown tier
+            CircuitOpenError: Every candidate's breaker is open
+        """
+        name = tier[len(TIER_PREFIX):] if tier.startswith(TIER_PREFIX) else tier
+        candidates = [(m, resolve_provider(m)) for m in self.tiers[name]]
+        candidates = [(m, p) for m, p in candidates if is_configured(p)]
+
+        now = time.monotonic()
+        with self._lock:
+            healthy = [(m, p) for m, p in candidates if self._available(self._get(p), now)]
+        if not healthy:
+            raise CircuitOpenError(f"No healthy provider available for tier '{name}'")
+        return min(healthy, key=lambda mp: self.score(mp[1]))[0]
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns a snapshot of every tracked provider's health.
+        """
+        with self._lock:
+            return {provider: h.snapshot() for provider, h in self._health.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._health.clear()
+
+
+router = ModelRouter()
+
+
+def configure_tiers(tiers: Dict[str, List[str]], replace: bool = False) -> Dict[str, List[str]]:
+    """
+    Adds (or replaces) tier definitions on the shared router.
+
+    Examples:
+        >>> configure_tiers({"vision": ["glm-4v", "qwen-vl-plus"]})
+    """
+    if replace:
+        router.tiers = {}
+    router.tiers.update(tiers)
+    return router.tiers
@@ -0,0 +1,393 @@
+"""
+Semantic Response Cache
+
+Exact-match caching misses paraphrases ("北京今天天气怎么样" vs "北京今天的天气怎么样？").
+This module answers near-duplicate questions from earlier replies, fully offline.
+An undated "北京天气" deliberately does not reuse "北京今天天气怎么样": only one of
+them names a day, so the answers are not interchangeable (see exact_terms).
+
+It handles:
+1. Local embeddings: hashed character / word n-grams (no model download, works for
+   Chinese and English alike)
+2. Nearest-neighbour search over a NumPy matrix per namespace (pure-Python
+   fallback when NumPy is not installed)
+3. A similarity threshold plus per-namespace isolation, so different models,
+   system prompts, histories or agents never answer for each other
+4. Exact-match terms: numbers and temporal words (today / tomorrow / 明天 / 周五 /
+   March, ...) must be identical, so "weather tomorrow" never gets today's answer
+5. TTL (cache-wide or per entry) and per-namespace size limits (oldest entries go first)
+
+Only the question text is embedded; everything that must match exactly goes into
+the namespace. Disabled by default: call enable_semantic_cache() or set
+LLM_SEMANTIC_CACHE=1.
+
+Usage:
+    >>> cache = enable_semantic_cache(threshold=0.8)
+    >>> cache.set("react", "北京今天天气怎么样", "晴，25°C")
+    >>> cache.get("react", "北京今天的天气怎么样？")
+    '晴，25°C'
+"""
+
+import os
+import re
+import math
+import time
+import zlib
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Runs of CJK ideographs / kana / hangul (character n-grams) vs. other word characters
+_CJK_RUN_RE = re.compile("[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+# Filler that carries no meaning for "is this the same question" (longest first).
+# Temporal words are never filler: they are exact-match terms (see exact_terms).
+CJK_STOP_PHRASES = (
+    "我想知道", "告诉我", "请问", "帮我", "一下", "怎么样", "如何", "什么", "多少",
+    "的", "了", "吗", "呢", "吧", "啊", "呀", "是", "请", "个",
+)
+STOP_WORDS = frozenset(
+    "a an the is are was what whats s how about please tell me of in on for to do does can you".split()
+)
+_CJK_STOP_RE = re.compile("|".join(map(re.escape, CJK_STOP_PHRASES)))
+
+# Temporal words -> canonical term (Chinese and English share terms, so 明天 == tomorrow)
+_WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+_MONTHS = ("january", "february", "march", "april", "may", "june", "july", "august",
+           "september", "october", "november", "december")
+CJK_TEMPORAL = {
+    "今天": "today", "今日": "today", "明天": "tomorrow", "明日": "tomorrow", "后天": "day_after_tomorrow",
+    "昨天": "yesterday", "昨日": "yesterday", "前天": "day_before_yesterday", "今晚": "tonight",
+    "现在": "now", "目前": "now", "当前": "now", "此刻": "now",
+    "本周": "this_week", "这周": "this_week", "下周": "next_week", "上周": "last_week", "周末": "weekend",
+    "本月": "this_month", "这个月": "this_month", "下个月": "next_month", "上个月": "last_month",
+    "今年": "this_year", "明年": "next_year", "去年": "last_year",
+}
+CJK_TEMPORAL.update({
+    f"{prefix}{day}": _WEEKDAYS[i if i < 6 else 6]
+    for prefix in ("周", "星期", "礼拜") for i, day in enumerate("一二三四五六日天")
+})
+EN_TEMPORAL = {
+    "today": "today", "tonight": "tonight", "tomorrow": "tomorrow", "yesterday": "yesterday",
+    "now": "now", "current": "now", "currently": "now", "weekend": "weekend",
+    "this week": "this_week", "next week": "next_week", "last week": "last_week",
+    "this month": "this_month", "next month": "next_month", "last month": "last_month",
+    "this year": "this_year", "next year": "next_year", "last year": "last_year",
+}
+EN_TEMPORAL.update({name: name for name in _WEEKDAYS + _MONTHS})
+_CJK_TEMPORAL_RE = re.compile("|".join(map(re.escape, sorted(CJK_TEMPORAL, key=len, reverse=True))))
+_EN_TEMPORAL_RE = re.compile(r"\b(?:" + "|".join(sorted(EN_TEMPORAL, key=len, reverse=True)) + r")\b")
+
+
+def numbers_in(text: str) -> frozenset:
+    """
+    Numbers mentioned in text (dates included: 2024-05-01 -> 2024, 05, 01).
+    """
+    return frozenset(_NUMBER_RE.findall(text))
+
+
+def temporal_terms(text: str) -> frozenset:
+    """
+    Canonical temporal words in text: {"tomorrow"} for both "明天" and "tomorrow".
+    """
+    lowered = text.lower()
+    terms = {CJK_TEMPORAL[m] for m in _CJK_TEMPORAL_RE.findall(text)}
+    terms.update(EN_TEMPORAL[m] for m in _EN_TEMPORAL_RE.findall(lowered))
+    return frozenset(terms)
+
+
+def exact_terms(text: str) -> frozenset:
+    """
+    Terms two questions must share exactly to match: numbers, dates and temporal words.
+    """
+    return numbers_in(text) | {"t:" + term for term in temporal_terms(text)}
+
+
+class HashedNgramEmbedder:
+    """
+    Maps text to an L2-normalized vector of hashed n-gram counts (the hashing trick).
+
+    CJK runs contribute character unigrams and bigrams; other text contributes
+    lower-cased words and character trigrams within words. Filler phrases and
+    stop words are dropped first, so the remaining features are the question's content.
+    """
+
+    def __init__(self, dim: int = 2048):
+        self.dim = dim
+
+    def features(self, text: str) -> List[str]:
+        text = text.lower()
+        feats: List[str] = []
+        for run in _CJK_RUN_RE.findall(text):
+            for segment in _CJK_STOP_RE.split(run):
+                feats.extend(segment)
+                feats.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+        for word in _WORD_RE.findall(_CJK_RUN_RE.sub(" ", text).replace("'", "")):
+            if word in STOP_WORDS:
+                continue
+            feats.append("w:" + word)
+            padded = f"<{word}>"
+            feats.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return feats
+
+    def sparse(self, text: str) -> Dict[int, float]:
+        """
+        Returns {bucket: weight} with unit L2 norm (empty for text without features).
+        """
+        vec: Dict[int, float] = {}
+        for feat in self.features(text):
+            h = zlib.crc32(feat.encode("utf-8"))
+            bucket = h % self.dim
+            vec[bucket] = vec.get(bucket, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        return {k: v / norm for k, v in vec.items() if v} if norm else {}
+
+    def embed(self, text: str) -> Any:
+        """
+        Dense float32 NumPy vector (requires NumPy).
+        """
+        import numpy as np
+
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for bucket, weight in self.sparse(text).items():
+            vec[bucket] = weight
+        return vec
+
+
+def _numpy_available() -> bool:
+    try:
+        import numpy  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class _Namespace:
+    """
+    Entries of one namespace: a growable embedding matrix (or sparse vectors) plus values.
+    """
+
+    def __init__(self, dim: int, use_numpy: bool):
+        self.use_numpy = use_numpy
+        self.texts: List[str] = []
+        self.values: List[str] = []
+        self.exact: List[frozenset] = []
+        self.created: List[float] = []
+        self.expires: List[Optional[float]] = []
+        if use_numpy:
+            import numpy as np
+            self.matrix = np.zeros((16, dim), dtype=np.float32)
+        else:
+            self.vectors: List[Dict[int, float]] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def add(self, text: str, value: str, vector: Any, now: float, expires: Optional[float]) -> None:
+        n = len(self.values)
+        if self.use_numpy:
+            import numpy as np
+            if n == self.matrix.shape[0]:
+                self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+            self.matrix[n] = vector
+        else:
+            self.vectors.append(vector)
+        self.texts.append(text)
+        self.values.append(value)
+        self.exact.append(exact_terms(text))
+        self.created.append(now)
+        self.expires.append(expires)
+
+    def drop(self, count: int) -> None:
+        # Entries are appended in time order, so the oldest are at the front
+        if count <= 0:
+            return
+        n = len(self.values)
+        if self.use_numpy:
+            self.matrix[:n - count] = self.matrix[count:n]
+            self.matrix[n - count:n] = 0.0
+        else:
+            del self.vectors[:count]
+        del self.texts[:count], self.values[:count], self.exact[:count], self.created[:count], self.expires[:count]
+
+    def scores(self, vector: Any) -> List[float]:
+        n = len(self.values)
+        if self.use_numpy:
+            return (self.matrix[:n] @ vector).tolist()
+        return [sum(weight * other.get(bucket, 0.0) for bucket, weight in vector.items()) for other in self.vectors]
+
+    def nearest(self, vector: Any, exact: frozenset, threshold: float, now: float) -> Tuple[int, float]:
+        """
+        Best live entry above threshold with the same exact-match terms, or (-1, best score).
+        """
+        scores = self.scores(vector)
+        best_score = max(scores, default=0.0)
+        for i in sorted((i for i, s in enumerate(scores) if s >= threshold), key=scores.__getitem__, reverse=True):
+            if self.exact[i] == exact and (self.expires[i] is None or self.expires[i] > now):
+                return i, scores[i]
+        return -1, best_score
+
+
+class SemanticCache:
+    """
+    Threshold-based nearest-neighbour cache of question -> answer, per namespace.
+
+    Thread-safe; use enable_semantic_cache() / get_semantic_cache() for the shared instance.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        ttl_seconds: Optional[float] = 24 * 3600,
+        max_entries: int = 2048,
+        embedder: Optional[HashedNgramEmbedder] = None,
+        use_numpy: Optional[bool] = None,
+    ):
+        """
+        Args:
+            threshold: Minimum cosine similarity for a hit (1.0 = identical features)
+            ttl_seconds: Maximum entry age (None = never expire); keep it short for
+                time-sensitive questions such as weather or prices
+            max_entries: Entries kept per namespace (oldest evicted first)
+            embedder: Text -> vector model (default: HashedNgramEmbedder)
+            use_numpy: Force the NumPy / pure-Python index (default: NumPy if installed)
+        """
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.use_numpy = _numpy_available() if use_numpy is None else use_numpy
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _vector(self, text: str) -> Any:
+        return self.embedder.embed(text) if self.use_numpy else self.embedder.sparse(text)
+
+    def _expire(self, space: _Namespace, now: float) -> None:
+        if self.ttl_seconds is None:
+            return
+        stale = 0
+        while stale < len(space) and now - space.created[stale] > self.ttl_seconds:
+            stale += 1
+        space.drop(stale)
+
+    def lookup(self, namespace: str, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns {"value", "score", "matched"} for the closest entry above the threshold.
+        """
+        vector = self._vector(text)
+        now = time.time()
+        with self._lock:
+            space = self._namespaces.get(namespace)
+            if space is not None:
+                self._expire(space, now)
+            if space is None or not len(space):
+                self.misses += 1
+                return None
+            best, score = space.nearest(vector, exact_terms(text), self.threshold, now)
+            if best < 0:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {"value": space.values[best], "score": score, "matched": space.texts[best]}
+
+    def get(self, namespace: str, text: str) -> Optional[str]:
+        hit = self.lookup(namespace, text)
+        return hit["value"] if hit else None
+
+    def set(self, namespace: str, text: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Stores an answer; ttl_seconds gives this entry a shorter life than the
+        cache-wide TTL (use it for answers built from live tool results).
+        """
+        vector = self._vector(text)
+        now = time.time()
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires = now + ttl if ttl is not None else None
+        with self._lock:
+            space = self._namespaces.get(namespace)
+            if space is None:
+                space = self._namespaces[namespace] = _Namespace(self.embedder.dim, self.use_numpy)
+            self._expire(space, now)
+            space.drop(len(space) + 1 - self.max_entries)
+            space.add(text, value, vector, now, expires)
+
+    def get_or_compute(
+        self,
+        namespace: str,
+        text: str,
+        fn: Callable[[], Optional[str]],
+        ttl_seconds: Optional[float] = None,
+    ) -> Optional[str]:
+        """
+        Returns a cached answer for a near-duplicate question, or calls fn() and stores it.
+        Error strings and None are not stored.
+        """
+        cached = self.get(namespace, text)
+        if cached is not None:
+            return cached
+        value = fn()
+        if value is not None and not value.startswith("Error"):
+            self.set(namespace, text, value, ttl_seconds=ttl_seconds)
+        return value
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            if namespace is None:
+                self._namespaces.clear()
+            else:
+                self._namespaces.pop(namespace, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = {name: len(space) for name, space in self._namespaces.items()}
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "threshold": self.threshold,
+            "backend": "numpy" if self.use_numpy else "python",
+            "namespaces": entries,
+        }
+
+
+# ============================================================================
+# Shared Instance
+# ============================================================================
+
+_semantic_cache: Optional[SemanticCache] = None
+_from_env = True
+
+
+def enable_semantic_cache(threshold: Optional[float] = None, **kwargs: Any) -> SemanticCache:
+    """
+    Enables the shared semantic cache (threshold defaults to LLM_SEMANTIC_THRESHOLD or 0.8).
+    """
+    global _semantic_cache, _from_env
+    if threshold is None:
+        threshold = float(os.getenv("LLM_SEMANTIC_THRESHOLD", 0.8))
+    _semantic_cache = SemanticCache(threshold=threshold, **kwargs)
+    _from_env = False
+    return _semantic_cache
+
+
+def disable_semantic_cache() -> None:
+    global _semantic_cache, _from_env
+    _semantic_cache = None
+    _from_env = False
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Returns the shared semantic cache, or None if it is disabled.
+    """
+    global _from_env
+    if _semantic_cache is None and _from_env:
+        _from_env = False
+        if os.getenv("LLM_SEMANTIC_CACHE", "0").lower() in ("1", "true", "yes"):
+            enable_semantic_cache()
+    return _semantic_cache
@@ -0,0 +1,134 @@
+"""
+Single-Flight Request Coalescing
+
+If an identical deterministic request is already in flight, later callers wait for
+that call's result instead of sending another request to the provider.
+
+Works for both threads (SingleFlight.do) and asyncio tasks (SingleFlight.ado).
+"""
+
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share the same key.
+
+    Thread-safe; use the module-level `singleflight` instance.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[Tuple[int, str], Any] = {}  # (id(loop), key) -> Future
+        self.leaders = 0
+        self.saved_calls = 0
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        """
+        Runs fn() once per key among concurrent callers and shares the result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.saved_calls += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Async counterpart of do (coalesces tasks on the same event loop).
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+        with self._lock:
+            future = self._async_calls.get(slot)
+            if future is None:
+                future = self._async_calls[slot] = loop.create_future()
+                self.leaders += 1
+                leader = True
+            else:
+                self.saved_calls += 1
+                leader = False
+
+        if not leader:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # We were cancelled ourselves
+                # The leader was cancelled: fall back to our own request
+                return await fn()
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an error nobody awaited is not logged as "never retrieved"
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._async_calls.pop(slot, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns how many real calls were made (leaders) and how many were saved.
+        """
+        return {
+            "leaders": self.leaders,
+            "saved_calls": self.saved_calls,
+            "in_flight": self.in_flight(),
+        }
+
+    def reset_stats(self) -> None:
+        self.leaders = 0
+        self.saved_calls = 0
+
+
+singleflight = SingleFlight()
@@ -0,0 +1,155 @@
+"""
+Structured (JSON) Output Helpers
+
+get_response(..., schema=...) asks the provider for JSON natively where it can:
+1. "json_schema": OpenAI response_format with the schema
+2. "json_object": JSON mode of OpenAI-compatible vendors (schema described in the prompt)
+3. "tool":        Anthropic tool forcing (the schema becomes the tool's input_schema)
+4. "prompt":      No native support; schema described in the prompt only
+
+Every reply is validated locally against a practical subset of JSON Schema
+(type, enum, required, properties, additionalProperties, items), and parse /
+schema failures are counted per mode so the retries saved are visible.
+"""
+
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .safe_parsing import find_json
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def schema_instruction(schema: Dict[str, Any]) -> str:
+    """
+    Prompt suffix used when the provider cannot enforce the schema itself.
+    """
+    return (
+        "\n\nRespond with a single JSON object that matches this JSON schema. "
+        "Output the JSON only, without markdown fences or commentary.\n"
+        f"JSON schema:\n{json.dumps(schema, ensure_ascii=False)}"
+    )
+
+
+def extract_json_text(text: str) -> str:
+    """
+    Strips markdown fences and surrounding prose from a JSON reply.
+    
+    The first complete JSON value found by the balanced scanner wins (see
+    safe_parsing.find_json); otherwise the fence-stripped text is returned so
+    json.loads reports a meaningful error.
+    """
+    found = find_json(text)
+    if found is not None:
+        return text[found[1]:found[2]]
+    clean = text.strip()
+    match = _FENCE_RE.search(clean)
+    if match:
+        clean = match.group(1).strip()
+    if clean[:1] in ("{", "["):
+        return clean
+    start, end = clean.find("{"), clean.rfind("}")
+    return clean[start:end + 1] if start != -1 and end > start else clean
+
+
+def validate_schema(data: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """
+    Returns a list of violations (empty when data matches the schema).
+    """
+    errors: List[str] = []
+    expected = schema.get("type")
+    if expected is not None:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(_TYPE_CHECKS.get(t, lambda v: True)(data) for t in types):
+            return [f"{path}: expected {expected}, got {type(data).__name__}"]
+
+    if "enum" in schema and data not in schema["enum"]:
+        errors.append(f"{path}: {data!r} not in {schema['enum']}")
+
+    if isinstance(data, dict):
+        for key in schema.get("required", []):
+            if key not in data:
+                errors.append(f"{path}: missing required property '{key}'")
+        properties = schema.get("properties", {})
+        for key, value in data.items():
+            if key in properties:
+                errors.extend(validate_schema(value, properties[key], f"{path}.{key}"))
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}: unexpected property '{key}'")
+    elif isinstance(data, list) and isinstance(schema.get("items"), dict):
+        for i, item in enumerate(data):
+            errors.extend(validate_schema(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+
+def parse_structured(text: str, schema: Dict[str, Any]) -> Tuple[Optional[Any], Optional[str]]:
+    """
+    Parses and validates a JSON reply.
+
+    Returns:
+        (data, None) on success, (None, "parse_error: ...") if the text is not JSON,
+        (data, "schema_error: ...") if it is JSON but violates the schema.
+    """
+    try:
+        data = json.loads(extract_json_text(text))
+    except (json.JSONDecodeError, TypeError) as e:
+        return None, f"parse_error: {e}"
+    errors = validate_schema(data, schema)
+    if errors:
+        return data, "schema_error: " + "; ".join(errors[:5])
+    return data, None
+
+
+class StructuredStats:
+    """
+    Counts structured-output calls and failures per mode.
+
+    Use the module-level `structured_stats` instance.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, mode: str, error: Optional[str]) -> None:
+        status = "ok" if error is None else error.split(":", 1)[0]
+        with self._lock:
+            counts = self._counts.setdefault(mode, {"calls": 0, "ok": 0, "parse_error": 0, "schema_error": 0})
+            counts["calls"] += 1
+            counts[status] += 1
+
+    def failure_rate(self, mode: Optional[str] = None) -> float:
+        """
+        Share of structured calls whose reply failed to parse or validate.
+        """
+        with self._lock:
+            rows = [self._counts.get(mode)] if mode else list(self._counts.values())
+            calls = sum(r["calls"] for r in rows if r)
+            failed = sum(r["parse_error"] + r["schema_error"] for r in rows if r)
+        return failed / calls if calls else 0.0
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                mode: dict(counts, failure_rate=(counts["parse_error"] + counts["schema_error"]) / counts["calls"])
+                for mode, counts in self._counts.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+structured_stats = StructuredStats()
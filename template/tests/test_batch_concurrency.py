@@ -0,0 +1,85 @@
+"""
+Per-batch concurrency cap of get_responses / aget_responses (no SDK or network needed).
+
+Usage (from the template/ directory):
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import llm_client  # noqa: E402
+
+MODEL = "qwen-plus"
+
+
+class PeakCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def enter(self) -> None:
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def exit(self) -> None:
+        with self.lock:
+            self.current -= 1
+
+
+def test_aget_responses_caps_each_batch(monkeypatch):
+    counter = PeakCounter()
+
+    async def fake_aget_response(model, prompt, **kwargs):
+        counter.enter()
+        await asyncio.sleep(0.01)
+        counter.exit()
+        return f"echo:{prompt}"
+
+    monkeypatch.setattr(llm_client, "aget_response", fake_aget_response)
+    prompts = [f"p{i}" for i in range(20)]
+    batch = asyncio.run(llm_client.aget_responses(MODEL, prompts, max_concurrency=3))
+
+    assert batch["results"] == [f"echo:{p}" for p in prompts]
+    assert batch["stats"]["concurrency"] == 3
+    assert counter.peak == 3
+
+
+def test_aget_responses_defaults_to_provider_limit(monkeypatch):
+    counter = PeakCounter()
+    limit = llm_client.get_concurrency_limit(llm_client.resolve_provider(MODEL))
+
+    async def fake_aget_response(model, prompt, **kwargs):
+        counter.enter()
+        await asyncio.sleep(0.01)
+        counter.exit()
+        return prompt
+
+    monkeypatch.setattr(llm_client, "aget_response", fake_aget_response)
+    batch = asyncio.run(llm_client.aget_responses(MODEL, [f"p{i}" for i in range(limit * 3)]))
+
+    assert batch["stats"]["concurrency"] == limit
+    assert counter.peak == limit
+
+
+def test_get_responses_caps_each_batch(monkeypatch):
+    counter = PeakCounter()
+
+    def fake_get_response(model, prompt, **kwargs):
+        counter.enter()
+        time.sleep(0.01)
+        counter.exit()
+        return prompt
+
+    monkeypatch.setattr(llm_client, "get_response", fake_get_response)
+    batch = llm_client.get_responses(MODEL, [f"p{i}" for i in range(20)], max_concurrency=3)
+
+    assert batch["stats"]["failed"] == 0
+    assert counter.peak <= 3
@@ -0,0 +1,186 @@
+"""
+TTL / LRU eviction and thread safety of core.cache.ResponseCache (no SDK or network needed).
+
+Usage (from the template/ directory):
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import sqlite3
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.cache import ResponseCache, make_cache_key  # noqa: E402
+
+cache_module = importlib.import_module("core.cache")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache_module, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "llm_cache.sqlite")
+
+
+def disk_keys(path: str) -> set:
+    with sqlite3.connect(path) as conn:
+        return {row[0] for row in conn.execute("SELECT key FROM responses")}
+
+
+def test_cache_key_is_stable_and_parameter_sensitive():
+    messages = [{"role": "user", "content": "hi"}]
+    assert make_cache_key("m", messages, temperature=0, max_tokens=5) == \
+        make_cache_key("m", messages, max_tokens=5, temperature=0)
+    assert make_cache_key("m", messages, temperature=0) != make_cache_key("m", messages, temperature=0.7)
+    assert make_cache_key("m", messages) != make_cache_key("other", messages)
+
+
+# ============================================================================
+# TTL
+# ============================================================================
+
+def test_entries_expire_after_ttl(clock, db_path):
+    cache = ResponseCache(db_path, ttl_seconds=60)
+    cache.set("k", "v")
+
+    clock.now += 59
+    assert cache.get("k") == "v"  # served from the in-memory front
+
+    clock.now += 2
+    assert cache.get("k") is None  # the memory front honours the TTL too
+    assert cache.stats()["misses"] == 1
+
+    # Expired rows stay on disk until eviction runs
+    assert disk_keys(db_path) == {"k"}
+    assert cache.evict() == 1
+    assert disk_keys(db_path) == set()
+    cache.close()
+
+
+def test_expired_entry_is_not_revived_from_disk(clock, db_path):
+    writer = ResponseCache(db_path, ttl_seconds=60)
+    writer.set("k", "v")
+    writer.close()
+
+    reader = ResponseCache(db_path, ttl_seconds=60)
+    clock.now += 61
+    assert reader.get("k") is None
+    reader.close()
+
+
+def test_ttl_none_never_expires(clock, db_path):
+    cache = ResponseCache(db_path, ttl_seconds=None)
+    cache.set("k", "v")
+    clock.now += 10 * 365 * 24 * 3600
+    assert cache.get("k") == "v"
+    assert cache.evict() == 0
+    cache.close()
+
+
+# ============================================================================
+# Size-based (LRU) eviction
+# ============================================================================
+
+def test_max_entries_evicts_least_recently_used(clock, db_path):
+    cache = ResponseCache(db_path, max_entries=3, ttl_seconds=None)
+    for i in range(5):
+        clock.now += 1
+        cache.set(f"k{i}", f"v{i}")
+
+    # A memory-front hit must count as a use when rows are ranked on disk
+    clock.now += 1
+    assert cache.get("k0") == "v0"
+
+    assert cache.evict() == 2
+    assert disk_keys(db_path) == {"k0", "k3", "k4"}
+    assert cache.stats()["evictions"] == 2
+    cache.close()
+
+
+def test_memory_front_stays_in_sync_after_evict(clock, db_path):
+    cache = ResponseCache(db_path, max_entries=2, ttl_seconds=None, memory_entries=10)
+    for i in range(4):
+        clock.now += 1
+        cache.set(f"k{i}", f"v{i}")
+
+    cache.evict()
+    # Evicted rows must not be served from the memory front
+    assert cache.get("k0") is None
+    assert cache.get("k1") is None
+    assert cache.get("k2") == "v2"
+    assert cache.get("k3") == "v3"
+    cache.close()
+
+
+def test_memory_front_stays_in_sync_after_clear(clock, db_path):
+    cache = ResponseCache(db_path)
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+
+    cache.clear()
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["hits"] == 1  # counters survive clear()
+    cache.close()
+
+
+def test_periodic_eviction_on_write(clock, db_path):
+    cache = ResponseCache(db_path, max_entries=10, ttl_seconds=None)
+    for i in range(ResponseCache._EVICT_EVERY):
+        clock.now += 1
+        cache.set(f"k{i}", "v")
+    # Eviction ran on the N-th write without an explicit evict()
+    assert cache.stats()["entries"] == 10
+    cache.close()
+
+
+# ============================================================================
+# Concurrency
+# ============================================================================
+
+def test_concurrent_writers_from_a_thread_pool(db_path):
+    cache = ResponseCache(db_path, max_entries=10_000, memory_entries=16)
+    keys = [f"key-{i}" for i in range(400)]
+
+    def write_then_read(key: str) -> bool:
+        cache.set(key, f"value-{key}")
+        return cache.get(key) == f"value-{key}"
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        assert all(pool.map(write_then_read, keys))
+
+    stats = cache.stats()
+    assert stats["entries"] == len(keys)
+    assert stats["misses"] == 0
+    # Every value survived on disk, not just in the small memory front
+    assert disk_keys(db_path) == set(keys)
+    cache.close()
+
+
+def test_concurrent_writers_respect_max_entries(db_path):
+    cache = ResponseCache(db_path, max_entries=50, ttl_seconds=None)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: cache.set(f"k{i}", "v"), range(300)))
+
+    cache.evict()
+    assert cache.stats()["entries"] == 50
+    cache.close()
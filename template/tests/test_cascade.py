@@ -0,0 +1,139 @@
+"""
+Cheap-model-first escalation of core.cascade with a stubbed get_response (no SDK or network needed).
+
+Usage (from the template/ directory):
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import llm_client  # noqa: E402
+from core.cascade import acascade_response, cascade_response, cascade_stats, validate_plan  # noqa: E402
+
+STAGES = ["cheap-model", "mid-model", "strong-model"]
+GOOD_PLAN = '```python\n["Search the weather", "Summarize it"]\n```'
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats():
+    cascade_stats.reset()
+    yield
+    cascade_stats.reset()
+
+
+@pytest.fixture
+def replies(monkeypatch):
+    """
+    Maps model -> reply (a string, or an exception to raise) for stubbed get_response / aget_response.
+    """
+    table = {}
+    calls = []
+
+    def reply(model):
+        calls.append(model)
+        answer = table[model]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    def fake_get_response(model, prompt, **kwargs):
+        return reply(model)
+
+    async def fake_aget_response(model, prompt, **kwargs):
+        return reply(model)
+
+    monkeypatch.setattr(llm_client, "get_response", fake_get_response)
+    monkeypatch.setattr(llm_client, "aget_response", fake_aget_response)
+    table["calls"] = calls
+    return table
+
+
+def run(replies, asynchronous: bool, **kwargs):
+    if asynchronous:
+        return asyncio.run(acascade_response("plan this", validate_plan, models=STAGES, **kwargs))
+    return cascade_response("plan this", validate_plan, models=STAGES, **kwargs)
+
+
+@pytest.mark.parametrize("asynchronous", [False, True], ids=["sync", "async"])
+def test_first_passing_stage_stops_the_cascade(replies, asynchronous):
+    replies.update({"cheap-model": GOOD_PLAN, "mid-model": GOOD_PLAN, "strong-model": GOOD_PLAN})
+    result = run(replies, asynchronous)
+
+    assert result["model"] == "cheap-model"
+    assert result["value"] == ["Search the weather", "Summarize it"]
+    assert result["escalated"] is False
+    assert result["error"] is None
+    assert replies["calls"] == ["cheap-model"]
+
+
+@pytest.mark.parametrize("asynchronous", [False, True], ids=["sync", "async"])
+def test_escalates_when_validation_fails(replies, asynchronous):
+    replies.update({
+        "cheap-model": "I think we should search first.",  # no list at all
+        "mid-model": "[]",                                  # empty plan
+        "strong-model": GOOD_PLAN,
+    })
+    result = run(replies, asynchronous)
+
+    assert result["model"] == "strong-model"
+    assert result["escalated"] is True
+    assert replies["calls"] == STAGES
+    assert [a["model"] for a in result["attempts"]] == STAGES
+    assert result["attempts"][0]["error"].startswith("parse_error")
+    assert result["attempts"][1]["error"].startswith("schema_error")
+    assert result["attempts"][2]["error"] is None
+
+
+@pytest.mark.parametrize("asynchronous", [False, True], ids=["sync", "async"])
+def test_provider_errors_escalate(replies, asynchronous):
+    replies.update({
+        "cheap-model": RuntimeError("rate limited"),
+        "mid-model": "Error: connection reset",
+        "strong-model": GOOD_PLAN,
+    })
+    result = run(replies, asynchronous)
+
+    assert result["model"] == "strong-model"
+    assert result["attempts"][0]["error"] == "error: RuntimeError: rate limited"
+    assert result["attempts"][1]["error"] == "error: connection reset"
+
+
+@pytest.mark.parametrize("asynchronous", [False, True], ids=["sync", "async"])
+def test_every_stage_failing(replies, asynchronous):
+    replies.update({"cheap-model": "no plan", "mid-model": "still no plan", "strong-model": "[1, 2]"})
+    result = run(replies, asynchronous)
+
+    assert result["model"] is None
+    assert result["value"] is None
+    assert result["text"] == "[1, 2]"
+    assert result["error"] == "schema_error: expected a non-empty list of strings"
+    assert len(result["attempts"]) == 3
+    assert cascade_stats.snapshot()["default"]["failed"] == 1
+
+
+def test_escalation_rate(replies):
+    replies.update({"cheap-model": GOOD_PLAN})
+    cascade_response("a", validate_plan, models=STAGES, cascade="plans")
+    cascade_response("b", validate_plan, models=STAGES, cascade="plans")
+    cascade_response("c", validate_plan, models=STAGES, cascade="plans")
+
+    replies.update({"cheap-model": "no plan", "mid-model": GOOD_PLAN})
+    cascade_response("d", validate_plan, models=STAGES, cascade="plans")
+    cascade_response("e", validate_plan, models=STAGES, cascade="other")
+
+    assert cascade_stats.escalation_rate("plans") == pytest.approx(0.25)
+    assert cascade_stats.escalation_rate("other") == 1.0
+    assert cascade_stats.escalation_rate() == pytest.approx(2 / 5)
+    assert cascade_stats.escalation_rate("never-used") == 0.0
+
+    snapshot = cascade_stats.snapshot()["plans"]
+    assert snapshot["calls"] == 4
+    assert snapshot["escalations"] == 1
+    assert snapshot["served_by"] == {"cheap-model": 3, "mid-model": 1}
+    assert snapshot["escalation_rate"] == pytest.approx(0.25)
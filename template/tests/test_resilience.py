@@ -0,0 +1,177 @@
+"""
+Retry and hedging behaviour of core.resilience (no SDK or network needed).
+
+Usage (from the template/ directory):
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import resilience  # noqa: E402
+from core.resilience import RetryPolicy, ahedged_call, call_with_retry, hedge_stats, hedged_call  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse(status_code, headers)
+
+
+def wait_until(predicate, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+# ============================================================================
+# call_with_retry
+# ============================================================================
+
+def test_retry_after_header_wins_over_backoff(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(resilience.time, "sleep", sleeps.append)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise FakeAPIError(429, {"retry-after": "7"})
+        return "ok"
+
+    # Backoff alone would wait at most 0.1s
+    policy = RetryPolicy(max_retries=3, base_delay=0.1, max_delay=0.1)
+    assert call_with_retry(flaky, policy) == "ok"
+    assert len(attempts) == 2
+    assert sleeps == [7.0]
+
+
+def test_retry_after_is_capped(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(resilience.time, "sleep", sleeps.append)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise FakeAPIError(503, {"retry-after-ms": "900000"})
+        return "ok"
+
+    assert call_with_retry(flaky, RetryPolicy(max_retry_after=5)) == "ok"
+    assert sleeps == [5]
+
+
+def test_non_retryable_4xx_raises_immediately(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(resilience.time, "sleep", sleeps.append)
+    attempts = []
+
+    def bad_request():
+        attempts.append(1)
+        raise FakeAPIError(400)
+
+    with pytest.raises(FakeAPIError):
+        call_with_retry(bad_request, RetryPolicy(max_retries=3))
+    assert len(attempts) == 1
+    assert sleeps == []
+
+
+def test_retries_stop_after_max_retries(monkeypatch):
+    monkeypatch.setattr(resilience.time, "sleep", lambda _: None)
+    attempts = []
+
+    def overloaded():
+        attempts.append(1)
+        raise FakeAPIError(529)
+
+    with pytest.raises(FakeAPIError):
+        call_with_retry(overloaded, RetryPolicy(max_retries=2))
+    assert len(attempts) == 3
+
+
+# ============================================================================
+# hedged_call / ahedged_call
+# ============================================================================
+
+def test_hedged_call_abandons_and_counts_the_slow_loser():
+    before = dict(hedge_stats)
+    release = threading.Event()
+    calls = []
+    lock = threading.Lock()
+
+    def request():
+        with lock:
+            calls.append(1)
+            first = len(calls) == 1
+        if first:
+            # The primary hangs like a blocking SDK call that cannot be interrupted
+            release.wait(5)
+            return "primary"
+        return "backup"
+
+    try:
+        assert hedged_call(request, delay=0.05) == "backup"
+        assert len(calls) == 2
+        assert hedge_stats["hedged"] == before["hedged"] + 1
+        assert hedge_stats["hedge_won"] == before["hedge_won"] + 1
+        assert hedge_stats["hedge_abandoned"] == before["hedge_abandoned"] + 1
+        assert hedge_stats["hedge_abandoned_running"] == before["hedge_abandoned_running"] + 1
+    finally:
+        release.set()
+
+    # Once the abandoned request finishes it no longer counts as running
+    assert wait_until(lambda: hedge_stats["hedge_abandoned_running"] == before["hedge_abandoned_running"])
+    assert hedge_stats["hedge_abandoned"] == before["hedge_abandoned"] + 1
+
+
+def test_hedged_call_fast_primary_is_not_hedged():
+    before = dict(hedge_stats)
+    assert hedged_call(lambda: "fast", delay=1.0) == "fast"
+    assert hedge_stats == before
+
+
+def test_ahedged_call_cancels_the_loser():
+    before = dict(hedge_stats)
+    cancelled = []
+    calls = []
+
+    async def request():
+        calls.append(1)
+        if len(calls) == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return "primary"
+        return "backup"
+
+    async def main():
+        result = await ahedged_call(request, delay=0.05)
+        # Give the cancelled primary a chance to observe the cancellation
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == "backup"
+    assert cancelled == [True]
+    assert hedge_stats["hedged"] == before["hedged"] + 1
+    assert hedge_stats["hedge_won"] == before["hedge_won"] + 1
+    # Cancelled async losers are not abandoned
+    assert hedge_stats["hedge_abandoned"] == before["hedge_abandoned"]
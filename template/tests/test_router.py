@@ -0,0 +1,220 @@
+"""
+Circuit breakers and tier routing of core.router (no SDK or network needed).
+
+Usage (from the template/ directory):
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import asyncio
+import importlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.router import CircuitOpenError, ModelRouter, ProviderHealth  # noqa: E402
+
+# core re-exports the shared `router` instance under the submodule's name
+router_module = importlib.import_module("core.router")
+
+TIERS = {"fast": ["model-a", "model-b", "model-c"]}
+PROVIDERS = {"model-a": "a", "model-b": "b", "model-c": "c"}
+
+
+class FakeClock:
+    """
+    Stands in for the time module inside router.py so cooldowns need no sleeping.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+class ServiceUnavailable(Exception):
+    status_code = 503
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(router_module, "time", fake)
+    return fake
+
+
+def make_router(**kwargs) -> ModelRouter:
+    return ModelRouter(tiers=TIERS, failure_threshold=3, cooldown=30.0, **kwargs)
+
+
+def fail(provider_router: ModelRouter, provider: str, times: int, error=ServiceUnavailable) -> None:
+    def boom():
+        raise error("down")
+
+    for _ in range(times):
+        with pytest.raises(error):
+            provider_router.call(provider, boom)
+
+
+def route(provider_router: ModelRouter) -> str:
+    return provider_router.route("tier:fast", PROVIDERS.get)
+
+
+# ============================================================================
+# Circuit breaker
+# ============================================================================
+
+def test_breaker_opens_after_threshold_failures(clock):
+    r = make_router()
+    fail(r, "a", 2)
+    assert r.health()["a"]["state"] == ProviderHealth.CLOSED
+    assert r.call("a", lambda: "ok") == "ok"  # success resets the streak
+
+    fail(r, "a", 3)
+    assert r.health()["a"]["state"] == ProviderHealth.OPEN
+    with pytest.raises(CircuitOpenError):
+        r.call("a", lambda: "never called")
+
+
+def test_non_retryable_errors_do_not_open_the_breaker(clock):
+    r = make_router()
+    fail(r, "a", 5, error=BadRequest)
+    assert r.health()["a"]["state"] == ProviderHealth.CLOSED
+    assert r.health()["a"]["consecutive_failures"] == 0
+
+
+def test_half_open_probe_after_cooldown(clock):
+    r = make_router()
+    fail(r, "a", 3)
+
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        r.acquire("a")
+
+    clock.now += 1
+    r.acquire("a")  # the single half-open probe
+    assert r.health()["a"]["state"] == ProviderHealth.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        r.acquire("a")  # only one probe in flight
+
+    r.record_success("a", 0.2)
+    assert r.health()["a"]["state"] == ProviderHealth.CLOSED
+    assert r.call("a", lambda: "ok") == "ok"
+
+
+def test_failed_probe_reopens_the_breaker(clock):
+    r = make_router()
+    fail(r, "a", 3)
+    clock.now += 30
+    fail(r, "a", 1)
+    assert r.health()["a"]["state"] == ProviderHealth.OPEN
+
+    # A new cooldown starts from the failed probe
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        r.acquire("a")
+
+
+def test_probe_ending_in_client_error_frees_the_slot(clock):
+    r = make_router()
+    fail(r, "a", 3)
+    clock.now += 30
+    fail(r, "a", 1, error=BadRequest)
+    assert r.health()["a"]["state"] == ProviderHealth.HALF_OPEN
+    assert r.call("a", lambda: "ok") == "ok"
+
+
+# ============================================================================
+# Tier routing
+# ============================================================================
+
+def test_route_prefers_lowest_latency(clock):
+    r = make_router()
+    r.record_success("a", 2.0)
+    r.record_success("b", 0.3)
+    r.record_success("c", 0.9)
+    assert route(r) == "model-b"
+
+
+def test_route_fails_over_to_next_provider_in_tier(clock):
+    r = make_router()
+    r.record_success("a", 0.1)
+    r.record_success("b", 0.5)
+    r.record_success("c", 0.9)
+    assert route(r) == "model-a"
+
+    fail(r, "a", 3)
+    assert route(r) == "model-b"
+
+    fail(r, "b", 3)
+    assert route(r) == "model-c"
+
+    fail(r, "c", 3)
+    with pytest.raises(CircuitOpenError):
+        route(r)
+
+    # After the cooldown the fastest provider gets its probe again
+    clock.now += 30
+    assert route(r) == "model-a"
+
+
+def test_route_skips_unconfigured_providers(clock):
+    r = make_router()
+    r.record_success("a", 0.1)
+    assert r.route("fast", PROVIDERS.get, lambda provider: provider != "a") in ("model-b", "model-c")
+    with pytest.raises(KeyError):
+        r.route("tier:unknown", PROVIDERS.get)
+
+
+# ============================================================================
+# Async parity
+# ============================================================================
+
+def test_acall_matches_call(clock):
+    r = make_router()
+
+    async def ok():
+        return "ok"
+
+    async def boom():
+        raise ServiceUnavailable("down")
+
+    async def main():
+        assert await r.acall("a", ok) == "ok"
+        for _ in range(3):
+            with pytest.raises(ServiceUnavailable):
+                await r.acall("a", boom)
+        with pytest.raises(CircuitOpenError):
+            await r.acall("a", ok)
+
+    asyncio.run(main())
+    assert r.health()["a"]["state"] == ProviderHealth.OPEN
+    assert route(r) == "model-b"
+
+
+def test_cancelled_acall_releases_the_probe(clock):
+    r = make_router()
+    fail(r, "a", 3)
+    clock.now += 30
+
+    async def main():
+        task = asyncio.ensure_future(r.acall("a", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    # Cancellation says nothing about health: the breaker stays half-open with the slot free
+    assert r.health()["a"]["state"] == ProviderHealth.HALF_OPEN
+    assert r.call("a", lambda: "ok") == "ok"
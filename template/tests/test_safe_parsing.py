@@ -0,0 +1,101 @@
+"""
+Local JSON repair of malformed LLM replies (core.safe_parsing; no SDK or network needed).
+
+Usage (from the template/ directory):
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.safe_parsing import REPAIR_KINDS, RepairStats, extract_json_with_repair, repair_json, repair_stats  # noqa: E402
+
+
+# (reply, repaired value, fix expected among the reported fixes)
+REPAIRS = [
+    ('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3}, "trailing_commas"),
+    ("{'action': 'search', 'query': 'coffee'}", {"action": "search", "query": "coffee"}, "single_quotes"),
+    ('{"a": 1 "b": 2}', {"a": 1, "b": 2}, "missing_commas"),
+    ('{"a": [1, 2}', {"a": [1, 2]}, "mismatched_brackets"),
+    ('Answer: {"a": {"b": 1}', {"a": {"b": 1}}, "missing_closers"),
+    ('{"ok": True, "value": None, "done": False}', {"ok": True, "value": None, "done": False}, "python_literals"),
+    ('{"text": "line one\nline two"}', {"text": "line one\nline two"}, "control_chars"),
+    ('{name: "Search"}', {"name": "Search"}, "unquoted_keys"),
+]
+
+
+@pytest.mark.parametrize("reply, expected, kind", REPAIRS, ids=[kind for _, _, kind in REPAIRS])
+def test_repair_json_fixes_each_kind(reply, expected, kind):
+    assert kind in REPAIR_KINDS
+    value, fixes = repair_json(reply)
+    assert value == expected
+    assert kind in fixes
+
+
+@pytest.mark.parametrize("reply, expected, kind", REPAIRS, ids=[kind for _, _, kind in REPAIRS])
+def test_extract_json_with_repair_returns_repaired_value(reply, expected, kind):
+    value, _ = extract_json_with_repair(reply)
+    assert value == expected
+
+
+def test_valid_json_needs_no_fixes():
+    assert extract_json_with_repair('Action: {"tool": "search", "args": [1]}') == ({"tool": "search", "args": [1]}, [])
+
+
+@pytest.mark.parametrize("reply", [
+    '{"a": tru',        # half a literal is not guessed
+    '{"a": 1, "b"',     # cut off after a key
+    '{"a": 1, "b":',    # cut off after the colon
+    '{"a": {',          # cut off right after an opener
+])
+def test_truncated_inside_key_value_pair_gives_up(reply):
+    assert repair_json(reply) is None
+    assert extract_json_with_repair(reply) == (None, [])
+
+
+def test_expect_filters_repaired_values():
+    assert repair_json("['a', 'b',]", expect=dict) is None
+    assert repair_json("['a', 'b',]", expect=list)[0] == ["a", "b"]
+
+
+def test_repair_stats_counts_per_agent():
+    stats = RepairStats()
+    stats.record("react", True, [])
+    stats.record("react", True, ["trailing_commas", "single_quotes"])
+    stats.record("react", True, ["trailing_commas"])
+    stats.record("planner", False, [])
+
+    snapshot = stats.snapshot()
+    assert snapshot["react"] == {
+        "parsed": 3, "clean": 1, "repaired": 2, "failed": 0,
+        "fixes": {"trailing_commas": 2, "single_quotes": 1},
+        "round_trips_saved": 2,
+    }
+    assert snapshot["planner"]["failed"] == 1
+    assert snapshot["planner"]["round_trips_saved"] == 0
+
+    stats.reset()
+    assert stats.snapshot() == {}
+
+
+def test_extract_json_with_repair_records_under_agent_name():
+    repair_stats.reset()
+    try:
+        extract_json_with_repair('{"a": 1}', agent="agent-a")
+        extract_json_with_repair("{'a': 1,}", agent="agent-a")
+        extract_json_with_repair('{"a": tru', agent="agent-b")
+        extract_json_with_repair("{'a': 1}")  # no agent: not counted
+
+        snapshot = repair_stats.snapshot()
+        assert set(snapshot) == {"agent-a", "agent-b"}
+        assert snapshot["agent-a"]["parsed"] == 2
+        assert snapshot["agent-a"]["clean"] == 1
+        assert snapshot["agent-a"]["repaired"] == 1
+        assert snapshot["agent-a"]["fixes"] == {"single_quotes": 1, "trailing_commas": 1}
+        assert snapshot["agent-b"]["failed"] == 1
+    finally:
+        repair_stats.reset()
@@ -0,0 +1,177 @@
+"""
+Paraphrase matching, exact-match terms and TTLs of core.semantic_cache (no SDK or network needed).
+
+Runs against the pure-Python index, and against the NumPy index too when NumPy is installed.
+
+Usage (from the template/ directory):
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import importlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.semantic_cache import SemanticCache, exact_terms, temporal_terms  # noqa: E402
+
+semantic_cache_module = importlib.import_module("core.semantic_cache")
+HAS_NUMPY = semantic_cache_module._numpy_available()
+
+NS = "react:qwen-plus"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(semantic_cache_module, "time", fake)
+    return fake
+
+
+@pytest.fixture(params=[False, pytest.param(True, marks=pytest.mark.skipif(not HAS_NUMPY, reason="NumPy not installed"))],
+                ids=["python", "numpy"])
+def cache(request, clock):
+    return SemanticCache(threshold=0.8, ttl_seconds=3600, use_numpy=request.param)
+
+
+def hit(cache: SemanticCache, stored: str, asked: str) -> bool:
+    cache.clear()
+    cache.set(NS, stored, "cached answer")
+    return cache.get(NS, asked) == "cached answer"
+
+
+# ============================================================================
+# Paraphrases
+# ============================================================================
+
+@pytest.mark.parametrize("stored, asked", [
+    ("北京今天天气怎么样", "北京今天的天气怎么样？"),
+    ("北京今天天气怎么样", "今天北京天气"),
+    ("北京天气", "北京天气如何"),
+    ("weather in Beijing today", "what is the weather in Beijing today"),
+])
+def test_paraphrases_hit(cache, stored, asked):
+    assert hit(cache, stored, asked)
+
+
+def test_request_example_deliberately_misses(cache):
+    # The motivating pair "北京天气" vs "北京今天天气怎么样" is NOT served from the
+    # cache: only the second question names a day ("今天" -> t:today), so the two
+    # differ in an exact-match term. An undated question may be asked on another
+    # day, and an answer for "today" must not stand in for it (nor vice versa).
+    # Dated paraphrases of each other still hit (test_paraphrases_hit).
+    assert exact_terms("北京天气") == frozenset()
+    assert exact_terms("北京今天天气怎么样") == {"t:today"}
+    assert not hit(cache, "北京天气", "北京今天天气怎么样")
+    assert not hit(cache, "北京今天天气怎么样", "北京天气")
+
+
+def test_unrelated_questions_miss(cache):
+    assert not hit(cache, "上海天气", "北京天气")
+
+
+# ============================================================================
+# Exact-match terms
+# ============================================================================
+
+@pytest.mark.parametrize("stored, asked", [
+    ("北京今天天气怎么样", "北京明天天气怎么样"),
+    ("weather in Beijing today", "weather in Beijing tomorrow"),
+    ("北京周五天气", "北京周六天气"),
+    ("北京本周天气", "北京下周天气"),
+    ("sales in March", "sales in April"),
+])
+def test_different_temporal_terms_miss(cache, stored, asked):
+    assert not hit(cache, stored, asked)
+
+
+def test_temporal_terms_are_canonical_across_languages():
+    assert temporal_terms("明天") == temporal_terms("Tomorrow") == {"tomorrow"}
+    assert temporal_terms("周五") == temporal_terms("星期五") == temporal_terms("礼拜五") == {"friday"}
+    assert temporal_terms("星期天") == temporal_terms("周日") == {"sunday"}
+    assert temporal_terms("北京天气") == frozenset()
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("population of Beijing in 2020", "population of Beijing in 2021"),
+    ("what is 15 plus 27", "what is 15 plus 28"),
+    ("计算 10 除以 2", "计算 10 除以 5"),
+])
+def test_different_numbers_miss(cache, stored, asked):
+    assert not hit(cache, stored, asked)
+
+
+def test_same_numbers_hit(cache):
+    assert hit(cache, "population of Beijing in 2020", "what is the population of Beijing in 2020")
+
+
+# ============================================================================
+# Namespaces and TTL
+# ============================================================================
+
+def test_namespaces_are_isolated(cache):
+    cache.set("react:qwen-plus", "北京今天天气怎么样", "qwen answer")
+    assert cache.get("react:glm-4", "北京今天天气怎么样") is None
+    cache.set("react:glm-4", "北京今天天气怎么样", "glm answer")
+    assert cache.get("react:qwen-plus", "北京今天天气怎么样") == "qwen answer"
+    assert cache.get("react:glm-4", "北京今天天气怎么样") == "glm answer"
+
+
+def test_cache_wide_ttl(cache, clock):
+    cache.set(NS, "北京今天天气怎么样", "sunny")
+    clock.now += 3599
+    assert cache.get(NS, "北京今天天气怎么样") == "sunny"
+    clock.now += 2
+    assert cache.get(NS, "北京今天天气怎么样") is None
+    assert cache.stats()["namespaces"][NS] == 0
+
+
+def test_per_entry_ttl_is_shorter_than_cache_ttl(cache, clock):
+    cache.set(NS, "北京今天天气怎么样", "sunny", ttl_seconds=60)
+    cache.set(NS, "长城有多长", "about 21,000 km")
+    clock.now += 59
+    assert cache.get(NS, "北京今天天气怎么样") == "sunny"
+    clock.now += 2
+    # The live-data answer expired; the long-lived one did not
+    assert cache.get(NS, "北京今天天气怎么样") is None
+    assert cache.get(NS, "长城有多长") == "about 21,000 km"
+
+
+def test_per_entry_ttl_applies_per_namespace(cache, clock):
+    # Agents pass their own TTL for answers built from tool results
+    cache.set("react:qwen-plus", "北京今天天气怎么样", "short-lived", ttl_seconds=60)
+    cache.set("plan_and_solve:qwen-plus", "北京今天天气怎么样", "long-lived")
+    clock.now += 120
+    assert cache.get("react:qwen-plus", "北京今天天气怎么样") is None
+    assert cache.get("plan_and_solve:qwen-plus", "北京今天天气怎么样") == "long-lived"
+
+
+def test_expired_entry_does_not_block_a_fresh_one(cache, clock):
+    cache.set(NS, "北京今天天气怎么样", "old", ttl_seconds=60)
+    clock.now += 61
+    cache.set(NS, "北京今天天气怎么样", "new", ttl_seconds=60)
+    assert cache.get(NS, "北京今天天气怎么样") == "new"
+
+
+def test_get_or_compute_skips_errors(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return "Error: search failed"
+
+    assert cache.get_or_compute(NS, "北京今天天气怎么样", compute, ttl_seconds=60) == "Error: search failed"
+    assert cache.get_or_compute(NS, "北京今天天气怎么样", compute, ttl_seconds=60) == "Error: search failed"
+    assert len(calls) == 2
+    assert cache.get_or_compute(NS, "北京今天天气怎么样", lambda: "sunny", ttl_seconds=60) == "sunny"
+    assert cache.get_or_compute(NS, "北京今天的天气怎么样？", compute) == "sunny"
@@ -0,0 +1,178 @@
+"""
+Request coalescing of core.singleflight (no SDK or network needed).
+
+Usage (from the template/ directory):
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.singleflight import SingleFlight  # noqa: E402
+
+CALLERS = 8
+
+
+class ProviderDown(Exception):
+    pass
+
+
+def wait_until(predicate, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+def run_concurrently(sf: SingleFlight, fn, release: threading.Event):
+    """
+    Starts CALLERS identical do() calls, releases the leader once every other
+    caller is waiting on it, and returns each caller's result or exception.
+    """
+    def call():
+        try:
+            return sf.do("same-prompt", fn)
+        except ProviderDown as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=CALLERS) as pool:
+        futures = [pool.submit(call) for _ in range(CALLERS)]
+        assert wait_until(lambda: sf.saved_calls == CALLERS - 1)
+        release.set()
+        return [f.result(timeout=5) for f in futures]
+
+
+# ============================================================================
+# Threads
+# ============================================================================
+
+def test_concurrent_identical_calls_make_one_provider_call():
+    sf = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def provider():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    assert run_concurrently(sf, provider, release) == ["answer"] * CALLERS
+    assert len(calls) == 1
+    assert sf.stats() == {"leaders": 1, "saved_calls": CALLERS - 1, "in_flight": 0}
+
+
+def test_leader_exception_reaches_every_waiter():
+    sf = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def provider():
+        calls.append(1)
+        release.wait(5)
+        raise ProviderDown("503")
+
+    results = run_concurrently(sf, provider, release)
+    assert len(calls) == 1
+    assert all(isinstance(r, ProviderDown) for r in results)
+
+
+def test_key_is_released_after_failure():
+    sf = SingleFlight()
+
+    def failing():
+        raise ProviderDown("503")
+
+    with pytest.raises(ProviderDown):
+        sf.do("k", failing)
+    assert sf.in_flight() == 0
+
+    # A later call runs fresh instead of being served the failed result
+    assert sf.do("k", lambda: "recovered") == "recovered"
+    # ... and is not served the stale previous answer either
+    assert sf.do("k", lambda: "newer") == "newer"
+    assert sf.stats()["leaders"] == 3
+    assert sf.stats()["saved_calls"] == 0
+
+
+def test_different_keys_are_not_coalesced():
+    sf = SingleFlight()
+    assert sf.do("a", lambda: 1) == 1
+    assert sf.do("b", lambda: 2) == 2
+    assert sf.stats()["leaders"] == 2
+
+
+# ============================================================================
+# asyncio
+# ============================================================================
+
+def test_ado_coalesces_concurrent_tasks():
+    sf = SingleFlight()
+    calls = []
+
+    async def provider():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(sf.ado("same-prompt", provider) for _ in range(CALLERS)))
+
+    assert asyncio.run(main()) == ["answer"] * CALLERS
+    assert len(calls) == 1
+    assert sf.stats() == {"leaders": 1, "saved_calls": CALLERS - 1, "in_flight": 0}
+
+
+def test_ado_leader_exception_reaches_every_waiter_and_releases_key():
+    sf = SingleFlight()
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        raise ProviderDown("503")
+
+    async def fresh():
+        return "recovered"
+
+    async def main():
+        results = await asyncio.gather(*(sf.ado("k", failing) for _ in range(CALLERS)), return_exceptions=True)
+        assert sf.in_flight() == 0
+        return results, await sf.ado("k", fresh)
+
+    results, later = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(isinstance(r, ProviderDown) for r in results)
+    assert later == "recovered"
+
+
+def test_ado_waiters_fall_back_when_leader_is_cancelled():
+    sf = SingleFlight()
+    calls = []
+
+    async def provider():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        leader = asyncio.ensure_future(sf.ado("k", provider))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(sf.ado("k", provider))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await waiter
+
+    assert asyncio.run(main()) == "answer"
+    # The waiter sent its own request instead of inheriting the cancellation
+    assert len(calls) == 2
+    assert sf.in_flight() == 0